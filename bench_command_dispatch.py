@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+指令分派微基準測試
+驗證 CommandRegistry.get_command 的查找成本不隨註冊指令數量成長
+
+執行方式：python bench_command_dispatch.py
+"""
+
+import timeit
+from typing import Any, Dict, List, Optional
+
+from commands.base_command import BaseCommand
+from commands.command_registry import CommandRegistry
+
+COMMAND_COUNTS = [20, 100, 500, 1000]
+LOOKUPS = 20000
+
+
+class SyntheticCommand(BaseCommand):
+    """測試用命令"""
+
+    def __init__(self, index: int):
+        self._name = f"@cmd{index:04d}"
+        self._aliases = [f"@指令{index:04d}"]
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def aliases(self) -> List[str]:
+        return self._aliases
+
+    def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
+        return None
+
+
+def linear_get_command(commands: Dict[str, BaseCommand], text: str) -> Optional[BaseCommand]:
+    """舊版的線性 startswith 掃描（對照組）"""
+    for name, command in commands.items():
+        if text.startswith(name):
+            remaining = text[len(name):]
+            if remaining == "" or remaining.startswith(" "):
+                return command
+    return None
+
+
+def run():
+    registry = CommandRegistry()
+    print(f"{'指令數':>8} | {'雜湊/前綴樹 (µs)':>16} | {'線性掃描 (µs)':>14}")
+    print("-" * 46)
+
+    for count in COMMAND_COUNTS:
+        registry.clear()
+        registry.register_all([SyntheticCommand(i) for i in range(count)])
+        snapshot = dict(registry._commands)
+
+        # 最壞情況：最後註冊的指令、中文別名接參數、未知指令
+        texts = [
+            f"@cmd{count - 1:04d} arg1 arg2",
+            f"@指令{count - 1:04d}參數",
+            "@unknown_command foo",
+        ]
+
+        def hashed():
+            for text in texts:
+                registry.get_command(text)
+
+        def linear():
+            for text in texts:
+                linear_get_command(snapshot, text)
+
+        hashed_us = min(timeit.repeat(hashed, number=LOOKUPS, repeat=3)) / (LOOKUPS * len(texts)) * 1e6
+        linear_us = min(timeit.repeat(linear, number=LOOKUPS // 10, repeat=3)) / (LOOKUPS // 10 * len(texts)) * 1e6
+        print(f"{count:>8} | {hashed_us:>16.3f} | {linear_us:>14.3f}")
+
+    registry.clear()
+
+
+if __name__ == "__main__":
+    run()
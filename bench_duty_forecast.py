@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+值日預測基準測試
+比較 MemberService.forecast_duty（NumPy 向量運算）與逐一呼叫 get_current_day_member 的成本
+
+執行方式：python bench_duty_forecast.py
+"""
+
+import random
+import time
+from datetime import date, timedelta
+
+from services.member_service import MemberService
+from services.schedule_service import ScheduleService
+
+GROUP_COUNT = 10000
+WEEKS = 52
+DAY_SETS = ["mon,thu", "tue,fri", "mon,wed,fri", "sat", "sun,wed"]
+
+
+class MemoryRepository:
+    """只存在記憶體的資料存儲庫"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def load_data(self, data_type, default_value=None):
+        return self.data.get(data_type, default_value)
+
+    def save_data(self, data_type, data, group_id=None):
+        self.data[data_type] = data
+        return True
+
+
+def build_services(group_count: int):
+    rng = random.Random(42)
+    groups, schedules = {}, {}
+    for i in range(group_count):
+        gid = f"C{i:05d}"
+        groups[gid] = {
+            str(week): [f"成員{rng.randrange(30)}" for _ in range(rng.randint(1, 3))]
+            for week in range(1, rng.randint(2, 6))
+        }
+        schedules[gid] = {"days": rng.choice(DAY_SETS), "hour": 17, "minute": 10}
+
+    repository = MemoryRepository({"groups": groups, "group_schedules": schedules, "base_date": date(2024, 1, 1)})
+    schedule_service = ScheduleService(repository)
+    return MemberService(repository, schedule_service), list(groups)
+
+
+def run():
+    member_service, group_ids = build_services(GROUP_COUNT)
+    start = date(2025, 1, 6)
+    end = start + timedelta(weeks=WEEKS) - timedelta(days=1)
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    print(f"群組 {GROUP_COUNT} 個 × {WEEKS} 週（{len(dates)} 天）")
+
+    started = time.perf_counter()
+    for gid in group_ids:
+        member_service.get_rotation(gid)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    result = member_service.forecast_duty(start, end, group_ids)
+    vector_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    expected = [[member_service.get_current_day_member(gid, day) for day in dates] for gid in group_ids]
+    loop_ms = (time.perf_counter() - started) * 1000
+
+    # 抽樣比對結果
+    rng = random.Random(7)
+    for _ in range(2000):
+        row, col = rng.randrange(len(group_ids)), rng.randrange(len(dates))
+        assert result.member(group_ids[row], dates[col]) == expected[row][col]
+
+    duty_days = int((result.matrix >= 0).sum())
+    print(f"{'輪值表編譯':<14} | {compile_ms:>10.1f} ms")
+    print(f"{'向量運算預測':<14} | {vector_ms:>10.1f} ms | {result.matrix.nbytes / 1e6:.1f} MB 矩陣")
+    print(f"{'逐一查詢':<14} | {loop_ms:>10.1f} ms | {loop_ms / vector_ms:.1f}x")
+    print(f"值日格數: {duty_days}")
+
+
+if __name__ == "__main__":
+    run()
@@ -4,19 +4,25 @@
 """
 
 from commands.base_command import BaseCommand
+from commands.command_context import CommandContext
 from commands.command_registry import CommandRegistry, command_registry
+from commands.suggestion_index import SuggestionIndex, suggestion_index
+from commands.response_cache import ResponseCache, response_cache
 
 # 導入所有命令
 from commands.help_command import help_command, quickstart_command
 from commands.schedule_command import cron_command, time_command, day_command, schedule_command
 from commands.members_command import (
     members_command, week_command, add_member_command, 
-    remove_member_command, clear_week_command, clear_members_command
+    remove_member_command, clear_week_command, clear_members_command,
+    upcoming_command,
 )
 from commands.system_command import (
-    reset_all_command, reset_date_command, clear_groups_command, debug_env_command
+    reset_all_command, reset_date_command, clear_groups_command, debug_env_command,
+    plan_command, suspended_command,
 )
 from commands.message_command import message_command
+from commands.followup_command import followup_command, done_command
 
 # 所有命令列表
 all_commands = [
@@ -35,18 +41,29 @@ all_commands = [
     remove_member_command,
     clear_week_command,
     clear_members_command,
+    upcoming_command,
     # 系統
     reset_all_command,
     reset_date_command,
     clear_groups_command,
     debug_env_command,
+    plan_command,
+    suspended_command,
     # 訊息
     message_command,
+    # 追蹤提醒
+    followup_command,
+    done_command,
 ]
 
 __all__ = [
     'BaseCommand', 
+    'CommandContext',
     'CommandRegistry', 
     'command_registry',
+    'SuggestionIndex',
+    'suggestion_index',
+    'ResponseCache',
+    'response_cache',
     'all_commands',
 ]
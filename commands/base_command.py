@@ -61,6 +61,22 @@ class BaseCommand(ABC):
         """
         pass
     
+    def cache_key(self, text: str, context: Dict[str, Any]) -> Optional[tuple]:
+        """
+        唯讀命令的回應快取鍵
+        
+        回傳 None 表示不快取（預設）。鍵應包含會影響回應的所有狀態，
+        例如群組 ID 與 Service 的狀態版本號。
+        
+        Args:
+            text: 使用者輸入的完整文字（已標準化）
+            context: 執行上下文
+            
+        Returns:
+            Optional[tuple]: 快取鍵
+        """
+        return None
+    
     def can_handle(self, text: str) -> bool:
         """
         判斷是否可以處理此訊息
@@ -0,0 +1,142 @@
+"""
+命令執行上下文
+以 __slots__ 儲存欄位，資料與服務方法在命令實際讀取時才解析
+"""
+
+from typing import Any, Callable, Dict, FrozenSet, Iterator
+
+
+def _member(attr: str, default=None) -> Callable[["CommandContext"], Any]:
+    """從 member_service 取得屬性"""
+    def resolve(ctx: "CommandContext"):
+        service = ctx.peek('member_service')
+        return getattr(service, attr) if service else default
+    return resolve
+
+
+def _schedule(attr: str, default=None) -> Callable[["CommandContext"], Any]:
+    """從 schedule_service 取得屬性"""
+    def resolve(ctx: "CommandContext"):
+        service = ctx.peek('schedule_service')
+        return getattr(service, attr) if service else default
+    return resolve
+
+
+def _member_setter(attr: str) -> Callable[["CommandContext"], Any]:
+    """產生設定 member_service 屬性的回調"""
+    def resolve(ctx: "CommandContext"):
+        service = ctx.peek('member_service')
+        return lambda value: setattr(service, attr, value) if service else None
+    return resolve
+
+
+class CommandContext:
+    """
+    命令執行上下文
+
+    - 與 dict 相容：支援 context.get('key')、context['key']、'key' in context
+    - 建立時只保存傳入的值；groups、group_schedules 等資料在命令讀取時才向 Service 取得
+    - 記錄命令讀取過的欄位，用於觀察各命令的資料相依性
+    """
+
+    FIELDS = (
+        'event', 'group_id',
+        # 服務
+        'member_service', 'schedule_service', 'firebase_service', 'send_planner',
+        'followup_service', 'delivery_health',
+        # 資料
+        'groups', 'group_schedules', 'group_messages', 'base_date',
+        # 回調函數
+        'reminder_callback', 'update_schedule', 'update_member_schedule',
+        'get_member_schedule_summary', 'get_schedule_summary', 'get_system_status',
+        'add_member_to_week', 'remove_member_from_week', 'clear_week_members',
+        'clear_all_members', 'clear_all_group_ids', 'reset_all_data',
+        'save_base_date', 'save_group_messages',
+    )
+
+    # 未傳入時的解析方式；不在表中的欄位預設為 None
+    RESOLVERS: Dict[str, Callable[["CommandContext"], Any]] = {
+        'groups': _member('groups', {}),
+        'group_schedules': _schedule('group_schedules', {}),
+        'group_messages': _member('group_messages', {}),
+        'base_date': _member('base_date'),
+        'update_member_schedule': _member('update_member_schedule'),
+        'get_member_schedule_summary': _member('get_member_schedule_summary'),
+        'get_schedule_summary': _schedule('get_schedule_summary'),
+        'add_member_to_week': _member('add_member_to_week'),
+        'remove_member_from_week': _member('remove_member_from_week'),
+        'clear_week_members': _member('clear_week_members'),
+        'clear_all_members': _member('clear_all_members'),
+        'clear_all_group_ids': _member('clear_all_group_ids'),
+        'save_base_date': _member_setter('base_date'),
+        'save_group_messages': _member_setter('group_messages'),
+    }
+
+    __slots__ = FIELDS + ('_touched', '_extra')
+
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, **values):
+        self._touched = set()
+        self._extra = {}
+        for key, value in values.items():
+            if value is not None:
+                self[key] = value
+
+    def peek(self, key: str, default=None) -> Any:
+        """取得欄位值（必要時解析），不記錄為已讀取"""
+        if key not in self._FIELD_SET:
+            return self._extra.get(key, default)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            resolver = self.RESOLVERS.get(key)
+            value = resolver(self) if resolver else None
+            setattr(self, key, value)
+            return value
+
+    @property
+    def touched_fields(self) -> FrozenSet[str]:
+        """命令讀取過的欄位"""
+        return frozenset(self._touched)
+
+    # ===== dict 相容介面 =====
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._FIELD_SET and key not in self._extra:
+            raise KeyError(key)
+        self._touched.add(key)
+        return self.peek(key)
+
+    def get(self, key: str, default=None) -> Any:
+        if key not in self._FIELD_SET and key not in self._extra:
+            return default
+        return self[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._FIELD_SET:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._FIELD_SET or key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.FIELDS
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self.FIELDS) + len(self._extra)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __repr__(self) -> str:
+        resolved = [key for key in self.FIELDS if hasattr(self, key)]
+        return f"CommandContext(resolved={resolved}, touched={sorted(self._touched)})"
@@ -3,7 +3,7 @@
 管理所有命令的註冊和查找
 """
 
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List
 from commands.base_command import BaseCommand
 
 
@@ -13,20 +13,27 @@ class CommandRegistry:
     
     負責管理所有命令的註冊、查找和執行。
     使用單例模式確保全局只有一個註冊器實例。
+    
+    查找方式：
+    - 以第一個空白前的 token 做雜湊查找（與註冊數量無關）
+    - 結尾為中文的別名另外編入前綴樹，支援別名後直接接參數（例如「@幫助排程」）
     """
     
     _instance = None
+    _END = ""  # 前綴樹的終止節點鍵
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._commands = {}
+            cls._instance._prefix_trie = {}
             cls._instance._initialized = False
         return cls._instance
     
     def __init__(self):
         if not self._initialized:
             self._commands: Dict[str, BaseCommand] = {}
+            self._prefix_trie: Dict[str, Any] = {}
             self._initialized = True
     
     def register(self, command: BaseCommand) -> None:
@@ -36,12 +43,18 @@ class CommandRegistry:
         Args:
             command: 命令實例
         """
-        # 註冊主命令名稱
-        self._commands[command.name] = command
-        
-        # 註冊所有別名
-        for alias in command.aliases:
-            self._commands[alias] = command
+        # 註冊主命令名稱與所有別名
+        for name in [command.name] + command.aliases:
+            self._commands[name] = command
+            if not name.isascii():
+                self._insert_prefix(name, command)
+    
+    def _insert_prefix(self, name: str, command: BaseCommand) -> None:
+        """將中文別名加入前綴樹"""
+        node = self._prefix_trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[self._END] = command
     
     def register_all(self, commands: List[BaseCommand]) -> None:
         """
@@ -63,14 +76,25 @@ class CommandRegistry:
         Returns:
             Optional[BaseCommand]: 找到的命令，如果沒有則返回 None
         """
-        # 先檢查完全匹配
-        for name, command in self._commands.items():
-            if text.startswith(name):
-                # 確保是完整的命令（後面是空格或結束）
-                remaining = text[len(name):]
-                if remaining == "" or remaining.startswith(" "):
-                    return command
-        return None
+        # 完整的命令必須以空格或結尾分隔，因此第一個 token 即為命令名稱
+        head = text.split(" ", 1)[0]
+        command = self._commands.get(head)
+        if command is not None or head.isascii():
+            return command
+        
+        # 中文別名可直接接參數，取最長的前綴匹配
+        return self._match_prefix(head)
+    
+    def _match_prefix(self, head: str) -> Optional[BaseCommand]:
+        """在前綴樹中查找最長的中文別名前綴"""
+        node = self._prefix_trie
+        matched = None
+        for char in head:
+            node = node.get(char)
+            if node is None:
+                break
+            matched = node.get(self._END, matched)
+        return matched
     
     def get_all_commands(self) -> List[BaseCommand]:
         """
@@ -100,6 +124,7 @@ class CommandRegistry:
     def clear(self) -> None:
         """清除所有已註冊的命令"""
         self._commands.clear()
+        self._prefix_trie.clear()
 
 
 # 創建全域註冊器實例
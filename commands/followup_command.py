@@ -0,0 +1,104 @@
+"""
+追蹤提醒命令處理器
+處理 @followup, @done 指令
+"""
+
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+import pytz
+
+from commands.base_command import BaseCommand
+
+
+class FollowupCommand(BaseCommand):
+    """
+    追蹤提醒設定命令
+    提醒後若沒有人回報完成，過幾分鐘再提醒一次
+    """
+
+    @property
+    def name(self) -> str:
+        return "@followup"
+
+    @property
+    def aliases(self) -> List[str]:
+        return ["@追蹤提醒"]
+
+    @property
+    def description(self) -> str:
+        return "設定未回報完成時的追蹤提醒"
+
+    def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
+        """執行追蹤提醒設定命令"""
+        group_id = context.get('group_id')
+        if not group_id:
+            return "❌ 只能在群組中設定追蹤提醒"
+
+        schedule_service = context.get('schedule_service')
+        if not schedule_service:
+            return "❌ 排程服務未啟用"
+
+        args = self.parse_args(text)
+        if not args:
+            return self._get_status(group_id, schedule_service, context.get('followup_service'))
+
+        value = args[0].lower()
+        if value in ("off", "關閉"):
+            minutes = 0
+        elif value.isdigit():
+            minutes = int(value)
+        else:
+            return "❌ 格式錯誤\n\n💡 用法：\n• @followup 120 - 提醒後 120 分鐘沒有人回報就再提醒\n• @followup off - 關閉追蹤提醒"
+
+        result = schedule_service.set_followup_minutes(group_id, minutes)
+        if not result["success"]:
+            return f"❌ {result['message']}"
+        if not minutes:
+            return "✅ 已關閉追蹤提醒"
+        return f"✅ 追蹤提醒已設定！\n\n⏰ 提醒後 {minutes} 分鐘內沒有人輸入 @done，會再提醒一次"
+
+    def _get_status(self, group_id: str, schedule_service, followup_service) -> str:
+        minutes = schedule_service.get_followup_minutes(group_id)
+        lines = ["⏰ 追蹤提醒設定",
+                 f"📌 目前：提醒後 {minutes} 分鐘" if minutes else "📌 目前：未啟用"]
+        due_at = followup_service.pending(group_id) if followup_service else None
+        if due_at is not None:
+            lines.append(f"⏳ 下一次追蹤提醒：{datetime.fromtimestamp(due_at, pytz.timezone('Asia/Taipei')).strftime('%H:%M')}")
+        lines.append("\n💡 @followup [分鐘] 設定，@followup off 關閉")
+        return "\n".join(lines)
+
+
+class DoneCommand(BaseCommand):
+    """
+    回報完成命令
+    取消待觸發的追蹤提醒
+    """
+
+    @property
+    def name(self) -> str:
+        return "@done"
+
+    @property
+    def aliases(self) -> List[str]:
+        return ["@完成"]
+
+    @property
+    def description(self) -> str:
+        return "回報今天的輪值已完成"
+
+    def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
+        """執行回報完成命令"""
+        group_id = context.get('group_id')
+        if not group_id:
+            return "❌ 只能在群組中回報完成"
+
+        followup_service = context.get('followup_service')
+        if followup_service and followup_service.acknowledge(group_id):
+            return "✅ 辛苦了！已取消追蹤提醒"
+        return "✅ 辛苦了！"
+
+
+# 導出命令實例
+followup_command = FollowupCommand()
+done_command = DoneCommand()
@@ -3,15 +3,24 @@
 負責初始化和執行命令
 """
 
-from typing import Dict, Any, Optional
-from commands import all_commands, command_registry
+import threading
+from typing import Dict, Any, List, Optional, Set
+from commands import all_commands, command_registry, suggestion_index
+from commands.command_context import CommandContext
+from commands.response_cache import response_cache
+
+# 各命令實際讀取過的上下文欄位
+context_dependencies: Dict[str, Set[str]] = {}
+# webhook 佇列模式下多個 worker 會同時更新，讀取時需取得一致的副本
+_dependencies_lock = threading.Lock()
 
 
 def initialize_commands():
-    """初始化所有命令到註冊器"""
+    """初始化所有命令到註冊器，並建立指令建議索引"""
     command_registry.clear()
     for cmd in all_commands:
         command_registry.register(cmd)
+    suggestion_index.build([cmd.name for cmd in command_registry.get_all_commands()])
     print(f"✅ 已註冊 {len(all_commands)} 個命令（{len(command_registry.get_command_names())} 個名稱/別名）")
 
 
@@ -22,6 +31,9 @@ def create_command_context(
     member_service=None,
     schedule_service=None,
     firebase_service=None,
+    send_planner=None,
+    followup_service=None,
+    delivery_health=None,
     # 資料 (兼容舊代碼，但在新架構中建議直接從 Service 獲取)
     groups: dict = None,
     group_schedules: dict = None,
@@ -42,40 +54,43 @@ def create_command_context(
     reset_all_data=None,
     save_base_date=None,
     save_group_messages=None,
-) -> Dict[str, Any]:
+) -> CommandContext:
     """
     建立命令執行上下文
     
-    包含命令執行所需的所有資料和服務
+    只保存傳入的值，其餘資料與服務方法在命令讀取時才從 Service 解析
     """
-    return {
-        'event': event,
-        'group_id': group_id,
+    return CommandContext(
+        event=event,
+        group_id=group_id,
         # 服務
-        'member_service': member_service,
-        'schedule_service': schedule_service,
-        'firebase_service': firebase_service,
-        # 資料 - 優先使用傳入的，否則從 Service 獲取
-        'groups': groups if groups is not None else (member_service.groups if member_service else {}),
-        'group_schedules': group_schedules if group_schedules is not None else (schedule_service.group_schedules if schedule_service else {}),
-        'group_messages': group_messages if group_messages is not None else (member_service.group_messages if member_service else {}),
-        'base_date': base_date if base_date is not None else (member_service.base_date if member_service else None),
-        # 回調函數 - 優先使用傳入的，否則從 Service 獲取
-        'reminder_callback': reminder_callback,
-        'update_schedule': update_schedule,
-        'update_member_schedule': update_member_schedule if update_member_schedule else (member_service.update_member_schedule if member_service else None),
-        'get_member_schedule_summary': get_member_schedule_summary if get_member_schedule_summary else (member_service.get_member_schedule_summary if member_service else None),
-        'get_schedule_summary': get_schedule_summary if get_schedule_summary else (schedule_service.get_schedule_summary if schedule_service else None),
-        'get_system_status': get_system_status,
-        'add_member_to_week': add_member_to_week if add_member_to_week else (member_service.add_member_to_week if member_service else None),
-        'remove_member_from_week': remove_member_from_week if remove_member_from_week else (member_service.remove_member_from_week if member_service else None),
-        'clear_week_members': clear_week_members if clear_week_members else (member_service.clear_week_members if member_service else None),
-        'clear_all_members': clear_all_members if clear_all_members else (member_service.clear_all_members if member_service else None),
-        'clear_all_group_ids': clear_all_group_ids if clear_all_group_ids else (member_service.clear_all_group_ids if member_service else None),
-        'reset_all_data': reset_all_data,
-        'save_base_date': save_base_date if save_base_date else (lambda d: setattr(member_service, 'base_date', d) if member_service else None),
-        'save_group_messages': save_group_messages if save_group_messages else (lambda d: setattr(member_service, 'group_messages', d) if member_service else None),
-    }
+        member_service=member_service,
+        schedule_service=schedule_service,
+        firebase_service=firebase_service,
+        send_planner=send_planner,
+        followup_service=followup_service,
+        delivery_health=delivery_health,
+        # 資料
+        groups=groups,
+        group_schedules=group_schedules,
+        group_messages=group_messages,
+        base_date=base_date,
+        # 回調函數
+        reminder_callback=reminder_callback,
+        update_schedule=update_schedule,
+        update_member_schedule=update_member_schedule,
+        get_member_schedule_summary=get_member_schedule_summary,
+        get_schedule_summary=get_schedule_summary,
+        get_system_status=get_system_status,
+        add_member_to_week=add_member_to_week,
+        remove_member_from_week=remove_member_from_week,
+        clear_week_members=clear_week_members,
+        clear_all_members=clear_all_members,
+        clear_all_group_ids=clear_all_group_ids,
+        reset_all_data=reset_all_data,
+        save_base_date=save_base_date,
+        save_group_messages=save_group_messages,
+    )
 
 
 def handle_command(text: str, context: Dict[str, Any]) -> Optional[str]:
@@ -95,9 +110,13 @@ def handle_command(text: str, context: Dict[str, Any]) -> Optional[str]:
     if command is None:
         return None  # 沒有找到對應的命令
     
+    is_lazy = isinstance(context, CommandContext)
     try:
         # 執行命令
-        event = context.get('event')
+        event = context.peek('event') if is_lazy else context.get('event')
+        key = command.cache_key(text, context)
+        if key is not None:
+            return response_cache.get_or_compute(key, lambda: command.execute(event, text, context))
         response = command.execute(event, text, context)
         return response
     except Exception as e:
@@ -105,6 +124,23 @@ def handle_command(text: str, context: Dict[str, Any]) -> Optional[str]:
         import traceback
         traceback.print_exc()
         return f"❌ 指令執行發生錯誤: {str(e)}"
+    finally:
+        if is_lazy:
+            touched = set(context.touched_fields)
+            with _dependencies_lock:
+                context_dependencies.setdefault(command.name, set()).update(touched)
+
+
+def get_context_dependencies() -> Dict[str, List[str]]:
+    """
+    取得各命令讀取過的上下文欄位
+    
+    Returns:
+        Dict[str, List[str]]: 命令名稱 -> 欄位列表
+    """
+    with _dependencies_lock:
+        snapshot = {name: set(fields) for name, fields in context_dependencies.items()}
+    return {name: sorted(fields) for name, fields in snapshot.items()}
 
 
 def is_known_command(text: str) -> bool:
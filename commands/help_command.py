@@ -25,6 +25,10 @@ class HelpCommand(BaseCommand):
     def description(self) -> str:
         return "顯示指令說明"
     
+    def cache_key(self, text: str, context: Dict[str, Any]) -> Optional[tuple]:
+        """說明內容固定，只依參數區分"""
+        return (self.name, tuple(self.parse_args(text)))
+    
     def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
         """執行幫助命令"""
         args = self.parse_args(text)
@@ -62,17 +66,23 @@ class HelpCommand(BaseCommand):
 • @time [時間] - 只修改推播時間
 • @day [星期] - 只修改推播星期
 • @schedule - 查看排程設定
+• @plan - 查看今天的推播計畫
+• @suspended - 查看本群組是否因推播失敗而暫停
 
 👥 成員管理
 • @week [週數] [成員] - 設定週輪值成員
 • @addmember [週數] [成員] - 添加成員
 • @removemember [週數] [成員] - 移除成員
 • @members - 查看成員輪值表
+• @upcoming [成員] [筆數] - 查詢之後的值日
 
 📝 文案設定
 • @message [文案] - 設定自訂文案
 • @message reset - 恢復預設文案
 
+⏰ 追蹤提醒
+• @followup [分鐘] - 沒有人回報完成時再提醒一次
+• @done - 回報完成，取消追蹤提醒
 
 🔄 重置功能
 • @reset_date - 重置基準日期
@@ -252,6 +262,7 @@ class QuickstartCommand(BaseCommand):
 💡 您可以：
 • 查看排程：@schedule
 • 查看成員：@members
+• 下次值日：@upcoming [成員]
 • 修改時間：@time 18:30
 • 修改星期：@day mon,thu
 • 設定文案：@message 自訂文案"""
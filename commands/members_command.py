@@ -1,10 +1,14 @@
 """
 成員命令處理器
-處理 @members, @week, @addmember, @removemember 指令
+處理 @members, @week, @addmember, @removemember, @upcoming 指令
 """
 
 from typing import Dict, Any, Optional, List
+from datetime import datetime
 import re
+
+import pytz
+
 from commands.base_command import BaseCommand
 
 
@@ -26,6 +30,15 @@ class MembersCommand(BaseCommand):
     def description(self) -> str:
         return "查看成員輪值表"
     
+    def cache_key(self, text: str, context: Dict[str, Any]) -> Optional[tuple]:
+        """成員表依群組資料版本與台北日期（本週標記）快取"""
+        member_service = context.get('member_service')
+        if not member_service:
+            return None
+        group_id = context.get('group_id')
+        return (self.name, group_id, member_service.get_state_version(group_id),
+                datetime.now(pytz.timezone('Asia/Taipei')).date())
+    
     def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
         """執行查看成員命令"""
         group_id = context.get('group_id')
@@ -309,6 +322,62 @@ class ClearMembersCommand(BaseCommand):
         return f"{'✅' if result['success'] else '❌'} {result['message']}"
 
 
+class UpcomingCommand(BaseCommand):
+    """
+    查詢之後的值日命令
+    依實際推播時間列出之後輪到誰
+    """
+    
+    # 單次最多列出幾筆
+    MAX_RESULTS = 20
+    WEEKDAY_CHINESE = ('一', '二', '三', '四', '五', '六', '日')
+    
+    @property
+    def name(self) -> str:
+        return "@upcoming"
+    
+    @property
+    def aliases(self) -> List[str]:
+        return ["@下次值日", "@接下來"]
+    
+    @property
+    def description(self) -> str:
+        return "查詢之後的值日（可指定成員）"
+    
+    def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
+        """執行查詢之後的值日命令"""
+        group_id = context.get('group_id')
+        if not group_id:
+            return "❌ 只能在群組中查詢值日\n💡 請在群組中使用此指令"
+        
+        member_service = context.get('member_service')
+        if not member_service:
+            return "❌ 成員服務未啟用"
+        
+        # @upcoming [成員] [筆數]：最後一個參數是數字時視為筆數
+        args = self.parse_args(text)
+        limit = 5
+        if args and args[-1].isdigit():
+            limit = max(1, min(int(args.pop()), self.MAX_RESULTS))
+        name = " ".join(args) or None
+        
+        duties = member_service.get_upcoming_duties(group_id, name, limit)
+        if not duties:
+            schedule_service = context.get('schedule_service')
+            if schedule_service and (schedule_service.group_schedules.get(group_id) or {}).get('suspended'):
+                return "⏸️ 此群組因推播失敗暫停排程，目前不會提醒\n💡 使用 @suspended revive 恢復排程"
+            if name:
+                return f"📭 找不到 {name} 之後的值日\n💡 請確認成員名稱，或使用 @members 查看輪值表"
+            return "📭 目前沒有之後的值日\n💡 請先使用 @cron 設定排程、@week 設定成員"
+        
+        title = f"📅 {name} 接下來的值日" if name else "📅 接下來的值日"
+        lines = [title]
+        for fire_time, member in duties:
+            when = f"{fire_time.strftime('%m/%d')} (週{self.WEEKDAY_CHINESE[fire_time.weekday()]}) {fire_time.strftime('%H:%M')}"
+            lines.append(f"• {when} {member}" if not name else f"• {when}")
+        return "\n".join(lines)
+
+
 # 導出命令實例
 members_command = MembersCommand()
 week_command = WeekCommand()
@@ -316,3 +385,4 @@ add_member_command = AddMemberCommand()
 remove_member_command = RemoveMemberCommand()
 clear_week_command = ClearWeekCommand()
 clear_members_command = ClearMembersCommand()
+upcoming_command = UpcomingCommand()
@@ -32,7 +32,8 @@ class MessageCommand(BaseCommand):
         if not group_id:
             return "❌ 只能在群組中設定自訂文案"
         
-        group_messages = context.get('group_messages', {})
+        member_service = context.get('member_service')
+        group_messages = member_service.group_messages if member_service else context.get('group_messages', {})
         save_group_messages = context.get('save_group_messages')
         
         # 取得 @message 後面的內容
@@ -45,17 +46,24 @@ class MessageCommand(BaseCommand):
             # 檢查是否要重置為預設
             if custom_message.lower() == "reset":
                 if group_id in group_messages:
-                    del group_messages[group_id]
-                    if save_group_messages:
-                        save_group_messages(group_messages)
+                    # 只更新並儲存此群組，其他群組的推播計畫與快取不受影響
+                    if member_service:
+                        member_service.clear_group_message_template(group_id)
+                    else:
+                        del group_messages[group_id]
+                        if save_group_messages:
+                            save_group_messages(group_messages)
                     return "✅ 已恢復為預設的垃圾收集文案！\n\n🗑️ 預設格式：\n今天 {date} ({weekday}) 輪到 {name} 收垃圾！"
                 else:
                     return "💡 目前就是使用預設文案"
             
             # 設定自訂文案
-            group_messages[group_id] = custom_message
-            if save_group_messages:
-                save_group_messages(group_messages)
+            if member_service:
+                member_service.set_group_message_template(group_id, custom_message)
+            else:
+                group_messages[group_id] = custom_message
+                if save_group_messages:
+                    save_group_messages(group_messages)
             
             return f"""✅ 自訂文案設定成功！
 
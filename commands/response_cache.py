@@ -0,0 +1,77 @@
+"""
+唯讀指令回應快取
+以「群組 + 狀態版本 + 日期」為鍵，資料未變更時直接回傳上次的回應
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class ResponseCache:
+    """
+    回應快取（LRU）
+
+    鍵由命令的 cache_key() 產生，內含 Service 的狀態版本號，
+    資料一變更版本號就遞增，舊的項目自然不再命中，不需主動清除。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        初始化回應快取
+
+        Args:
+            max_entries: 最多保留的回應數量
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        取得快取的回應，未命中時計算並存入
+
+        Args:
+            key: 快取鍵
+            compute: 產生回應的函數
+
+        Returns:
+            Optional[str]: 回應內容
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        response = compute()
+        if response is not None:
+            with self._lock:
+                self._entries[key] = response
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return response
+
+    def clear(self) -> None:
+        """清除所有快取"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# 創建全域回應快取實例
+response_cache = ResponseCache()
@@ -371,6 +371,16 @@ class ScheduleCommand(BaseCommand):
     def description(self) -> str:
         return "查看推播排程設定"
     
+    def cache_key(self, text: str, context: Dict[str, Any]) -> Optional[tuple]:
+        """排程摘要依排程版本與下次執行時間快取"""
+        schedule_service = context.get('schedule_service')
+        group_id = context.get('group_id')
+        if not schedule_service or not group_id:
+            return None
+        job = schedule_service.group_jobs.get(group_id)
+        next_run = getattr(job, 'next_run_time', None)
+        return (self.name, group_id, schedule_service.get_state_version(group_id), next_run)
+    
     def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
         """執行查看排程命令"""
         group_id = context.get('group_id')
@@ -0,0 +1,125 @@
+"""
+指令建議索引
+預先建立字元倒排索引，未知指令時只對可能進入前幾名的指令計算相似度
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple
+
+
+class SuggestionIndex:
+    """
+    指令建議索引
+
+    相似度與 difflib.SequenceMatcher.ratio() 相同。
+    ratio 的上界為 2 * 共同字元數 / 總長度（即 quick_ratio），
+    先以倒排索引算出每個指令的上界並排序，依序計算實際相似度，
+    一旦上界低於目前第 k 名即停止，結果與全部計算後排序一致。
+    """
+
+    def __init__(self, cache_size: int = 256):
+        """
+        初始化建議索引
+
+        Args:
+            cache_size: 最近查詢結果的快取數量
+        """
+        self.cache_size = cache_size
+        self._names: List[str] = []
+        self._lowered: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._cache: "OrderedDict[Tuple[str, int, float], List[Tuple[str, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, names: List[str]) -> None:
+        """
+        建立索引（清除快取）
+
+        Args:
+            names: 指令名稱，順序即同分時的排序順序
+        """
+        lowered = [name.lower() for name in names]
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for position, name in enumerate(lowered):
+            for char, count in Counter(name).items():
+                postings.setdefault(char, []).append((position, count))
+
+        with self._lock:
+            self._names = list(names)
+            self._lowered = lowered
+            self._postings = postings
+            self._cache.clear()
+
+    def top_matches(self, query: str, k: int = 3, min_ratio: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        取得最相似的指令
+
+        Args:
+            query: 使用者輸入的指令
+            k: 最多回傳幾筆
+            min_ratio: 相似度上界低於此值的指令不計算
+
+        Returns:
+            List[Tuple[str, float]]: (指令, 相似度)，依相似度由高到低、同分依註冊順序
+        """
+        key = (query.lower(), k, min_ratio)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(cached)
+            self.misses += 1
+            names, lowered, postings = self._names, self._lowered, self._postings
+
+        result = self._rank(key[0], k, min_ratio, names, lowered, postings)
+
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return list(result)
+
+    @staticmethod
+    def _rank(query, k, min_ratio, names, lowered, postings) -> List[Tuple[str, float]]:
+        # 每個指令與輸入的共同字元數
+        overlap = [0] * len(names)
+        for char, query_count in Counter(query).items():
+            for position, count in postings.get(char, ()):
+                overlap[position] += min(query_count, count)
+
+        bounds = []
+        for position, name in enumerate(lowered):
+            total = len(query) + len(name)
+            upper = 2.0 * overlap[position] / total if total else 1.0
+            if upper >= min_ratio:
+                bounds.append((upper, position))
+        bounds.sort(key=lambda item: (-item[0], item[1]))
+
+        scored = []
+        for upper, position in bounds:
+            if len(scored) >= k and upper < scored[k - 1][0]:
+                break
+            ratio = SequenceMatcher(None, query, lowered[position]).ratio()
+            scored.append((ratio, position))
+            scored.sort(key=lambda item: (-item[0], item[1]))
+
+        return [(names[position], ratio) for ratio, position in scored[:k]]
+
+    def get_stats(self) -> Dict[str, int]:
+        """取得快取統計"""
+        with self._lock:
+            return {
+                "commands": len(self._names),
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 創建全域建議索引實例
+suggestion_index = SuggestionIndex()
@@ -1,6 +1,6 @@
 """
 系統命令處理器
-處理 @status, @firebase, @backup, @reset_all, @reset_date 等指令
+處理 @status, @firebase, @backup, @reset_all, @reset_date, @plan 等指令
 """
 
 from typing import Dict, Any, Optional, List
@@ -179,8 +179,84 @@ class DebugEnvCommand(BaseCommand):
 • 時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
 
 
+class PlanCommand(BaseCommand):
+    """推播計畫查詢命令"""
+    
+    @property
+    def name(self) -> str:
+        return "@plan"
+    
+    @property
+    def aliases(self) -> List[str]:
+        return ["@推播計畫"]
+    
+    @property
+    def description(self) -> str:
+        return "查看今天預先產生的推播計畫"
+    
+    def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
+        """執行推播計畫查詢命令"""
+        send_planner = context.get('send_planner')
+        if not send_planner:
+            return "❌ 推播計畫未啟用"
+        return send_planner.describe(context.get('group_id'))
+
+
+class SuspendedCommand(BaseCommand):
+    """暫停群組管理命令（只作用於目前的群組，所有群組的暫停狀態見 /status）"""
+    
+    @property
+    def name(self) -> str:
+        return "@suspended"
+    
+    @property
+    def aliases(self) -> List[str]:
+        return ["@暫停群組"]
+    
+    @property
+    def description(self) -> str:
+        return "查看或恢復本群組因推播失敗而暫停的排程"
+    
+    def execute(self, event, text: str, context: Dict[str, Any]) -> Optional[str]:
+        """執行暫停群組管理命令"""
+        delivery_health = context.get('delivery_health')
+        if not delivery_health:
+            return "❌ 推播健康度追蹤未啟用"
+        
+        group_id = context.get('group_id')
+        if not group_id:
+            return "❌ 只能在群組中查詢暫停狀態\n💡 請在群組中使用此指令"
+        
+        args = self.parse_args(text)
+        if args and args[0].lower() in ("revive", "恢復"):
+            # 只能恢復目前的群組，不接受其他群組的 ID
+            if len(args) > 1 and args[1] != group_id:
+                return "❌ 只能恢復目前群組的排程\n💡 請在該群組中使用 @suspended revive"
+            if delivery_health.revive(group_id):
+                return "▶️ 已恢復本群組的排程"
+            return "💡 本群組沒有被暫停"
+        
+        info = delivery_health.get_suspension(group_id)
+        if not info:
+            return "✅ 本群組的排程沒有被暫停"
+        
+        if info.get("gave_up"):
+            state = "已停止探測"
+        elif info.get("probing"):
+            state = "探測中"
+        else:
+            state = f"已探測 {info.get('probes', 0)} 次"
+        return (
+            "⏸️ 本群組的排程因推播持續無法送達而暫停\n"
+            f"• 狀態碼 {info.get('status')} | 自 {info.get('since')} | {state}\n"
+            "\n💡 @suspended revive 恢復排程"
+        )
+
+
 # 導出命令實例
 reset_all_command = ResetAllCommand()
 reset_date_command = ResetDateCommand()
 clear_groups_command = ClearGroupsCommand()
 debug_env_command = DebugEnvCommand()
+plan_command = PlanCommand()
+suspended_command = SuspendedCommand()
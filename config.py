@@ -14,6 +14,53 @@ class Config:
     LINE_GROUP_ID: List[str] = []
     PORT: int = 8000
     DEBUG: bool = False
+    # Webhook 處理模式："sync" 於請求內處理，"queue" 先回應 200 再交由背景 worker 處理
+    WEBHOOK_MODE: str = "sync"
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_WORKERS: int = 4
+    # 佇列滿時的策略：drop_newest / drop_oldest / block / inline
+    WEBHOOK_QUEUE_FULL_POLICY: str = "drop_oldest"
+    # 以原始 JSON 預先過濾非指令訊息，略過 SDK 模型建構
+    WEBHOOK_PREFILTER: bool = True
+    # Firestore 儲存格式："legacy" 全部群組一份文件，"per_group" 每個群組一份文件
+    FIRESTORE_LAYOUT: str = "legacy"
+    # 延遲寫入：合併短時間內的多次寫入，由背景執行緒寫入 Firestore
+    WRITE_BEHIND: bool = False
+    WRITE_BEHIND_DEBOUNCE_MS: int = 500
+    WRITE_BEHIND_MAX_PENDING: int = 500
+    # 提醒推播：並行 worker 數量（每秒推播上限見 OUTBOUND_RATE_PER_SECOND）
+    REMINDER_WORKERS: int = 8
+    # LINE API 共用連線池大小
+    LINE_CONNECTION_POOL_SIZE: int = 100
+    # 推播發送佇列：限速、重試與本機日誌
+    OUTBOUND_RATE_PER_SECOND: float = 100
+    OUTBOUND_WORKERS: int = 4
+    OUTBOUND_MAX_RETRIES: int = 5
+    OUTBOUND_JOURNAL_PATH: str = "data/outbound_queue.jsonl"
+    # 提醒發送紀錄：避免重啟或補發時重複推播
+    REMINDER_LEDGER_PATH: str = "data/reminder_ledger.jsonl"
+    REMINDER_LEDGER_KEEP_DAYS: int = 7
+    # 錯過的提醒：排程器延遲容許秒數、啟動時補發的時間窗與群組數上限
+    REMINDER_MISFIRE_GRACE_SECONDS: int = 300
+    REMINDER_CATCHUP_GRACE_MINUTES: int = 30
+    REMINDER_CATCHUP_MAX_GROUPS: int = 200
+    # 排程主節點選舉："none" 單一副本，"file" 本機檔案鎖，"firestore" Firestore 租約
+    LEADER_ELECTION: str = "none"
+    LEADER_LEASE_TTL_SECONDS: int = 30
+    LEADER_RENEW_SECONDS: int = 10
+    LEADER_LOCK_PATH: str = "data/scheduler.lock"
+    # 多副本時重新讀取其他副本寫入的群組資料與排程的間隔（秒，0 表示停用）
+    STATE_SYNC_SECONDS: int = 60
+    # 追蹤提醒計時器（時間輪）
+    TIMER_TICK_SECONDS: float = 1.0
+    TIMER_JOURNAL_PATH: str = "data/timers.jsonl"
+    # 孤兒群組狀態回收間隔（分鐘，0 表示停用）；預設只回報不刪除
+    GROUP_SWEEP_MINUTES: int = 60
+    GROUP_SWEEP_RECLAIM: bool = False
+    # 推播持續無法送達時暫停群組排程
+    SUSPEND_AFTER_FAILURES: int = 3
+    SUSPEND_PROBE_BASE_HOURS: float = 24.0
+    SUSPEND_MAX_PROBES: int = 4
     
     @classmethod
     def load(cls):
@@ -27,6 +74,39 @@ class Config:
         
         cls.PORT = int(os.environ.get("PORT", 8000))
         
+        cls.WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "sync").strip().lower()
+        cls.WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+        cls.WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+        cls.WEBHOOK_QUEUE_FULL_POLICY = os.getenv("WEBHOOK_QUEUE_FULL_POLICY", "drop_oldest").strip().lower()
+        cls.WEBHOOK_PREFILTER = os.getenv("WEBHOOK_PREFILTER", "true").strip().lower() not in ("0", "false", "no")
+        cls.FIRESTORE_LAYOUT = os.getenv("FIRESTORE_LAYOUT", "legacy").strip().lower()
+        cls.WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").strip().lower() in ("1", "true", "yes")
+        cls.WRITE_BEHIND_DEBOUNCE_MS = int(os.getenv("WRITE_BEHIND_DEBOUNCE_MS", 500))
+        cls.WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 500))
+        cls.REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", 8))
+        cls.LINE_CONNECTION_POOL_SIZE = int(os.getenv("LINE_CONNECTION_POOL_SIZE", 100))
+        cls.OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", 100))
+        cls.OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", 4))
+        cls.OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 5))
+        cls.OUTBOUND_JOURNAL_PATH = os.getenv("OUTBOUND_JOURNAL_PATH", "data/outbound_queue.jsonl")
+        cls.REMINDER_LEDGER_PATH = os.getenv("REMINDER_LEDGER_PATH", "data/reminder_ledger.jsonl")
+        cls.REMINDER_LEDGER_KEEP_DAYS = int(os.getenv("REMINDER_LEDGER_KEEP_DAYS", 7))
+        cls.REMINDER_MISFIRE_GRACE_SECONDS = int(os.getenv("REMINDER_MISFIRE_GRACE_SECONDS", 300))
+        cls.REMINDER_CATCHUP_GRACE_MINUTES = int(os.getenv("REMINDER_CATCHUP_GRACE_MINUTES", 30))
+        cls.REMINDER_CATCHUP_MAX_GROUPS = int(os.getenv("REMINDER_CATCHUP_MAX_GROUPS", 200))
+        cls.LEADER_ELECTION = os.getenv("LEADER_ELECTION", "none").strip().lower()
+        cls.LEADER_LEASE_TTL_SECONDS = int(os.getenv("LEADER_LEASE_TTL_SECONDS", 30))
+        cls.LEADER_RENEW_SECONDS = int(os.getenv("LEADER_RENEW_SECONDS", 10))
+        cls.LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", "data/scheduler.lock")
+        cls.STATE_SYNC_SECONDS = int(os.getenv("STATE_SYNC_SECONDS", 60))
+        cls.TIMER_TICK_SECONDS = float(os.getenv("TIMER_TICK_SECONDS", 1.0))
+        cls.TIMER_JOURNAL_PATH = os.getenv("TIMER_JOURNAL_PATH", "data/timers.jsonl")
+        cls.GROUP_SWEEP_MINUTES = int(os.getenv("GROUP_SWEEP_MINUTES", 60))
+        cls.GROUP_SWEEP_RECLAIM = os.getenv("GROUP_SWEEP_RECLAIM", "false").strip().lower() in ("1", "true", "yes")
+        cls.SUSPEND_AFTER_FAILURES = int(os.getenv("SUSPEND_AFTER_FAILURES", 3))
+        cls.SUSPEND_PROBE_BASE_HOURS = float(os.getenv("SUSPEND_PROBE_BASE_HOURS", 24))
+        cls.SUSPEND_MAX_PROBES = int(os.getenv("SUSPEND_MAX_PROBES", 4))
+        
         # 檢查是否為測試模式（可選，根據需要）
         if not cls.LINE_CHANNEL_ACCESS_TOKEN:
             print("警告：LINE_CHANNEL_ACCESS_TOKEN 未設定，使用 Dummy Token 進行測試")
@@ -1,6 +1,18 @@
+from config import Config
 from repositories.firebase_repository import FirebaseRepository
 from services.member_service import MemberService
 from services.schedule_service import ScheduleService
+from services.reminder_fanout import ReminderFanout
+from services.line_client import LineClient
+from services.outbound_queue import OutboundQueue
+from services.send_plan import SendPlanner
+from services.reminder_ledger import ReminderLedger
+from services.timing_wheel import TimingWheel
+from services.followup_service import FollowUpService
+from services.group_lifecycle import GroupLifecycle
+from services.delivery_health import DeliveryHealth
+from services.leader_election import FileLease, FirestoreLease, WorkerSlot, default_holder_id
+from services.state_sync import StateSync
 import firebase_service
 
 class AppContainer:
@@ -9,23 +21,103 @@ class AppContainer:
     Holds singleton instances of services and repositories.
     """
     def __init__(self, scheduler=None, group_jobs=None):
-        self.firebase_repository = FirebaseRepository()
+        self.firebase_repository = FirebaseRepository(layout=Config.FIRESTORE_LAYOUT)
+        if Config.WRITE_BEHIND:
+            self.firebase_repository.enable_write_behind(
+                debounce_seconds=Config.WRITE_BEHIND_DEBOUNCE_MS / 1000,
+                max_pending=Config.WRITE_BEHIND_MAX_PENDING,
+            )
         
         # Initialize Services
         self.member_service = MemberService(self.firebase_repository)
         self.schedule_service = None
+        self.reminder_fanout = None
+        self.worker_slot = None
+        self.state_sync = None
         
         self.firebase_service = firebase_service.firebase_service_instance
+        
+        # Shared LINE client: one event loop and connection pool for replies and pushes
+        self.line_client = LineClient(Config.LINE_CHANNEL_ACCESS_TOKEN, pool_size=Config.LINE_CONNECTION_POOL_SIZE)
 
         if scheduler and group_jobs is not None:
              self.init_scheduler(scheduler, group_jobs)
 
     def init_scheduler(self, scheduler, group_jobs):
         """Initialize services that require scheduler"""
-        self.schedule_service = ScheduleService(self.firebase_repository, scheduler, group_jobs)
+        # Workers sharing a host ("file" election) each keep their own local journals
+        self.worker_slot = WorkerSlot(Config.LEADER_LOCK_PATH) if Config.LEADER_ELECTION == "file" else None
+        # Reminders of the same slot are pushed concurrently; the outbound queue enforces the rate limit
+        self.reminder_fanout = ReminderFanout(workers=Config.REMINDER_WORKERS)
+        self.schedule_service = ScheduleService(
+            self.firebase_repository, scheduler, group_jobs,
+            fanout=self.reminder_fanout,
+            misfire_grace_time=Config.REMINDER_MISFIRE_GRACE_SECONDS,
+        )
         # Injection ScheduleService into MemberService if needed (circular dependency resolution)
         self.member_service.schedule_service = self.schedule_service
         
         # Initialize NotificationService
         from services.notification_service import NotificationService
-        self.notification_service = NotificationService(self.member_service, self.schedule_service)
+        self.notification_service = NotificationService(self.member_service, self.schedule_service, line_client=self.line_client)
+        # Pushes go through a rate-limited, journaled queue with retries; workers submit to the
+        # LineClient event loop without waiting, so in-flight pushes are bounded by the rate and pool size
+        self.outbound_queue = OutboundQueue(
+            self.notification_service.submit_push,
+            journal_path=self.local_path(Config.OUTBOUND_JOURNAL_PATH),
+            rate_per_second=Config.OUTBOUND_RATE_PER_SECOND,
+            workers=Config.OUTBOUND_WORKERS,
+            max_retries=Config.OUTBOUND_MAX_RETRIES,
+        )
+        self.notification_service.outbound_queue = self.outbound_queue
+        # Reminder texts are rendered ahead of fire time
+        self.send_planner = SendPlanner(self.member_service, self.schedule_service, self.notification_service.build_reminder_text)
+        self.notification_service.send_planner = self.send_planner
+        # Records sent reminders so restarts and catch-up never double-send
+        self.reminder_ledger = ReminderLedger(self.local_path(Config.REMINDER_LEDGER_PATH), keep_days=Config.REMINDER_LEDGER_KEEP_DAYS)
+        self.notification_service.reminder_ledger = self.reminder_ledger
+        # One-shot follow-up reminders share a single timing wheel instead of one job each
+        self.timing_wheel = TimingWheel(tick_seconds=Config.TIMER_TICK_SECONDS, journal_path=self.local_path(Config.TIMER_JOURNAL_PATH))
+        self.followup_service = FollowUpService(
+            self.timing_wheel, self.schedule_service, self.member_service,
+            self.notification_service.enqueue_push,
+        )
+        self.notification_service.followups = self.followup_service
+        # Groups whose pushes keep failing are suspended and probed with growing intervals
+        self.delivery_health = DeliveryHealth(
+            self.schedule_service, self.timing_wheel, self.notification_service.send_group_reminder,
+            threshold=Config.SUSPEND_AFTER_FAILURES,
+            probe_base_seconds=Config.SUSPEND_PROBE_BASE_HOURS * 3600,
+            max_probes=Config.SUSPEND_MAX_PROBES,
+        )
+        self.notification_service.delivery_health = self.delivery_health
+        # Tears down all per-group state on leave; the periodic sweep only reports unless reclaim is enabled
+        self.group_lifecycle = GroupLifecycle(
+            self.member_service, self.schedule_service,
+            send_planner=self.send_planner, followup_service=self.followup_service,
+            reclaim=Config.GROUP_SWEEP_RECLAIM,
+        )
+
+    def refresh_state(self):
+        """Re-read state written by other replicas; only changed groups are invalidated and re-registered"""
+        groups = self.member_service.refresh_data()
+        schedules = self.schedule_service.refresh_jobs(self.notification_service.send_group_reminder)
+        return {"groups": len(groups), "schedules": len(schedules)}
+
+    def init_state_sync(self):
+        """Replicas share one store but keep their own in-memory copies; poll it so every replica converges"""
+        self.state_sync = StateSync(self.refresh_state, interval=Config.STATE_SYNC_SECONDS)
+        return self.state_sync
+
+    def local_path(self, path):
+        """Per-worker path for a local journal (unchanged when workers do not share a host)"""
+        return self.worker_slot.path_for(path) if self.worker_slot is not None else path
+
+    def create_lease(self, backend):
+        """Lease used by the scheduler leader election ("file" or "firestore")"""
+        holder_id = default_holder_id()
+        if backend == "file":
+            return FileLease(Config.LEADER_LOCK_PATH, holder_id)
+        if backend == "firestore":
+            return FirestoreLease(self.firebase_service, holder_id, ttl_seconds=Config.LEADER_LEASE_TTL_SECONDS)
+        raise ValueError(f"Unknown LEADER_ELECTION backend: {backend}")
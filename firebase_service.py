@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
 from typing import Dict, List, Optional, Any
 
 logger = logging.getLogger(__name__)
@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 try:
     import firebase_admin
     from firebase_admin import credentials, firestore
+    from google.cloud.firestore_v1.field_path import FieldPath
     FIREBASE_AVAILABLE = True
 except ImportError:
     FIREBASE_AVAILABLE = False
@@ -171,6 +172,224 @@ class FirebaseService:
             logger.error(f"Firebase 儲存排程設定失敗: {e}")
             return False
     
+    def load_group_messages(self):
+        if not self.is_available():
+            return {}
+        try:
+            doc_ref = self.db.collection('bot_config').document('group_messages')
+            doc = doc_ref.get()
+            if doc.exists:
+                data = doc.to_dict()
+                return data.get('messages', {})
+            return {}
+        except Exception as e:
+            logger.error(f"Firebase 載入自訂文案失敗: {e}")
+            return {}
+    
+    def save_group_messages(self, messages):
+        if not self.is_available():
+            return False
+        try:
+            doc_ref = self.db.collection('bot_config').document('group_messages')
+            data = {'messages': messages, 'updated_at': firestore.SERVER_TIMESTAMP}
+            doc_ref.set(data)
+            return True
+        except Exception as e:
+            logger.error(f"Firebase 儲存自訂文案失敗: {e}")
+            return False
+    
+    # ===== 部分更新：只送出變更的欄位 =====
+    
+    def update_document_fields(self, collection, document, updates, deletes=()):
+        """
+        以欄位路徑部分更新文件
+        
+        Args:
+            collection: 集合名稱
+            document: 文件 ID
+            updates: {欄位路徑 tuple: 值}
+            deletes: 要刪除的欄位路徑 tuple 列表
+            
+        Returns:
+            bool: 是否成功（文件不存在時為 False）
+        """
+        if not self.is_available():
+            return False
+        try:
+            data = {FieldPath(*path).to_api_repr(): value for path, value in updates.items()}
+            for path in deletes:
+                data[FieldPath(*path).to_api_repr()] = firestore.DELETE_FIELD
+            data['updated_at'] = firestore.SERVER_TIMESTAMP
+            self.db.collection(collection).document(document).update(data)
+            return True
+        except Exception as e:
+            logger.warning(f"Firebase 部分更新 {collection}/{document} 失敗: {e}")
+            return False
+    
+    def update_group_ids(self, added, removed):
+        """以 ArrayUnion / ArrayRemove 增減群組 ID"""
+        if not self.is_available():
+            return False
+        try:
+            doc_ref = self.db.collection('bot_config').document('group_ids')
+            # 同一欄位一次只能有一個轉換，分開送出
+            if added:
+                doc_ref.update({'group_ids': firestore.ArrayUnion(added), 'updated_at': firestore.SERVER_TIMESTAMP})
+            if removed:
+                doc_ref.update({'group_ids': firestore.ArrayRemove(removed), 'updated_at': firestore.SERVER_TIMESTAMP})
+            return True
+        except Exception as e:
+            logger.warning(f"Firebase 增減群組 ID 失敗: {e}")
+            return False
+    
+    # ===== 每個群組一份文件：groups/{group_id} =====
+    # 欄位：rotation（輪值表）、schedule（推播排程）、message（自訂文案）
+    
+    def load_group_documents(self):
+        if not self.is_available():
+            return {}
+        try:
+            docs = self.db.collection('groups').stream()
+            return {doc.id: doc.to_dict() or {} for doc in docs}
+        except Exception as e:
+            logger.error(f"Firebase 載入群組文件失敗: {e}")
+            return {}
+    
+    def save_group_document(self, group_id, fields):
+        """合併寫入單一群組文件，值為 None 的欄位會被刪除"""
+        if not self.is_available():
+            return False
+        try:
+            doc_ref = self.db.collection('groups').document(group_id)
+            data = {
+                key: (firestore.DELETE_FIELD if value is None else value)
+                for key, value in fields.items()
+            }
+            data['updated_at'] = firestore.SERVER_TIMESTAMP
+            doc_ref.set(data, merge=True)
+            return True
+        except Exception as e:
+            logger.error(f"Firebase 儲存群組 {group_id} 文件失敗: {e}")
+            return False
+    
+    def delete_group_document(self, group_id):
+        if not self.is_available():
+            return False
+        try:
+            self.db.collection('groups').document(group_id).delete()
+            return True
+        except Exception as e:
+            logger.error(f"Firebase 刪除群組 {group_id} 文件失敗: {e}")
+            return False
+    
+    def migrate_to_group_documents(self):
+        """
+        將 bot_config 下的整包資料拆成每個群組一份文件
+        
+        可重複執行：完成前服務仍讀寫 bot_config，因此每次都以 bot_config 為準，
+        只略過帶有 legacy_migrated 標記且內容相同的群組文件，並刪除已不存在於 bot_config 的搬移文件。
+        全部完成後在 bot_config/group_documents_migration 記錄完成，之後直接返回。
+        舊文件保持不變，以便回退。
+        """
+        if not self.is_available():
+            return {'completed': False, 'error': 'Firebase 未初始化或不可用'}
+        try:
+            state_ref = self.db.collection('bot_config').document('group_documents_migration')
+            state = state_ref.get()
+            if state.exists and (state.to_dict() or {}).get('completed'):
+                return {'completed': True, 'migrated': 0, 'skipped': 0}
+            
+            groups = self.load_groups()
+            schedules = self.load_group_schedules()
+            messages = self.load_group_messages()
+            existing = self.load_group_documents()
+            legacy_ids = set(groups) | set(schedules) | set(messages)
+            
+            migrated = 0
+            skipped = 0
+            for group_id in legacy_ids:
+                fields = {
+                    'rotation': groups.get(group_id),
+                    'schedule': schedules.get(group_id),
+                    'message': messages.get(group_id),
+                }
+                document = existing.get(group_id, {})
+                if document.get('legacy_migrated') and all(document.get(k) == v for k, v in fields.items()):
+                    skipped += 1
+                    continue
+                # 值為 None 的欄位會被刪除，上次搬移後在 bot_config 移除的資料不會殘留
+                fields['legacy_migrated'] = True
+                if not self.save_group_document(group_id, fields):
+                    return {'completed': False, 'migrated': migrated, 'skipped': skipped}
+                migrated += 1
+            
+            for group_id, document in existing.items():
+                if document.get('legacy_migrated') and group_id not in legacy_ids:
+                    if not self.delete_group_document(group_id):
+                        return {'completed': False, 'migrated': migrated, 'skipped': skipped}
+            
+            state_ref.set({'completed': True, 'completed_at': firestore.SERVER_TIMESTAMP})
+            return {'completed': True, 'migrated': migrated, 'skipped': skipped}
+        except Exception as e:
+            logger.error(f"群組文件遷移失敗: {e}")
+            return {'completed': False, 'error': str(e)}
+    
+    # ===== 租約：bot_config/lease_{name} =====
+    
+    def acquire_lease(self, name, holder, ttl_seconds):
+        """
+        以交易取得或續約租約
+        
+        租約不存在、已過期或原本就由 holder 持有時寫入新的到期時間
+        
+        Returns:
+            bool: 是否持有租約
+        """
+        if not self.is_available():
+            return False
+        doc_ref = self.db.collection('bot_config').document(f'lease_{name}')
+        
+        @firestore.transactional
+        def claim(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            now = datetime.now(timezone.utc)
+            expires_at = data.get('expires_at')
+            if data.get('holder') not in (None, holder) and expires_at is not None and expires_at > now:
+                return False
+            transaction.set(doc_ref, {
+                'holder': holder,
+                'expires_at': now + timedelta(seconds=ttl_seconds),
+                'renewed_at': firestore.SERVER_TIMESTAMP,
+            })
+            return True
+        
+        try:
+            return claim(self.db.transaction())
+        except Exception as e:
+            logger.warning(f"取得租約 {name} 失敗: {e}")
+            return False
+    
+    def release_lease(self, name, holder):
+        """釋放自己持有的租約"""
+        if not self.is_available():
+            return False
+        doc_ref = self.db.collection('bot_config').document(f'lease_{name}')
+        
+        @firestore.transactional
+        def release(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            if snapshot.exists and (snapshot.to_dict() or {}).get('holder') == holder:
+                transaction.delete(doc_ref)
+                return True
+            return False
+        
+        try:
+            return release(self.db.transaction())
+        except Exception as e:
+            logger.warning(f"釋放租約 {name} 失敗: {e}")
+            return False
+    
     def create_backup(self):
         if not self.is_available():
             return None
@@ -197,7 +416,7 @@ class FirebaseService:
             return {'firebase_available': False, 'error': 'Firebase 未初始化或不可用'}
         try:
             stats = {'firebase_available': True, 'collections': {}, 'total_documents': 0}
-            collections = ['bot_config', 'backups']
+            collections = ['bot_config', 'groups', 'backups']
             for collection_name in collections:
                 try:
                     collection_ref = self.db.collection(collection_name)
@@ -5,8 +5,11 @@
 from handlers.message_handler import (
     MessageHandler, 
     normalize_command, 
-    suggest_commands
+    suggest_commands,
+    reload_aliases
 )
+from handlers.webhook_queue import WebhookEventQueue
+from handlers.webhook_prefilter import WebhookPrefilter
 
-__all__ = ['MessageHandler', 'normalize_command', 'suggest_commands']
+__all__ = ['MessageHandler', 'normalize_command', 'suggest_commands', 'reload_aliases', 'WebhookEventQueue', 'WebhookPrefilter']
 
@@ -3,40 +3,105 @@
 新版的訊息處理邏輯，使用 Command Pattern
 """
 
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from commands.handler import handle_command, create_command_context, is_known_command
 from config import COMMAND_ALIASES, AVAILABLE_COMMANDS, ERROR_TEMPLATES, get_command_description
 
 
-def normalize_command(text: str) -> str:
+class AliasNormalizer:
     """
-    標準化指令：將中文別名轉換為英文指令
+    編譯後的指令別名表
+    
+    將 config.COMMAND_ALIASES 與各命令的 aliases 編譯成前綴樹，
+    標準化時只需沿著輸入開頭走一次，取最長匹配的別名。
     """
-    text = text.strip()
     
-    for alias, target in COMMAND_ALIASES.items():
-        if text.startswith(alias):
-            return target + text[len(alias):]
+    _END = ""  # 前綴樹的終止節點鍵
+    
+    def __init__(self):
+        self._trie: Dict[str, Any] = {}
+        self._size = 0
+    
+    def compile(self, aliases: Dict[str, str], commands: List[Any] = ()) -> int:
+        """
+        編譯別名表，完成後一次替換，處理中的訊息不受影響
+        
+        Args:
+            aliases: 別名 -> 英文指令（優先）
+            commands: 命令實例列表，其 aliases 對應到命令名稱
+            
+        Returns:
+            int: 別名數量
+        """
+        mapping = {}
+        for command in commands:
+            for alias in command.aliases:
+                mapping[alias] = command.name
+        mapping.update(aliases)
+        
+        trie: Dict[str, Any] = {}
+        for alias, target in mapping.items():
+            if alias == target:
+                continue
+            node = trie
+            for char in alias:
+                node = node.setdefault(char, {})
+            node[self._END] = target
+        
+        self._trie = trie
+        self._size = len(mapping)
+        return self._size
+    
+    def normalize(self, text: str) -> str:
+        """將開頭的別名替換為英文指令"""
+        text = text.strip()
+        node = self._trie
+        target, end = None, 0
+        for index, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node:
+                target, end = node[self._END], index + 1
+        
+        if target is None:
+            return text
+        
+        rest = text[end:]
+        # 中文別名後直接接參數（例如「@幫助排程」）時補上空格
+        if rest and not rest[0].isspace() and not text[end - 1].isascii():
+            rest = " " + rest
+        return target + rest
+
+
+_alias_normalizer = AliasNormalizer()
+
+
+def reload_aliases() -> int:
+    """重新編譯別名表（不需重啟）"""
+    import config
+    from commands import command_registry
     
-    return text
+    count = _alias_normalizer.compile(config.COMMAND_ALIASES, command_registry.get_all_commands())
+    print(f"✅ 已編譯 {count} 個指令別名")
+    return count
+
+
+def normalize_command(text: str) -> str:
+    """
+    標準化指令：將中文別名轉換為英文指令
+    """
+    return _alias_normalizer.normalize(text)
 
 
 def suggest_commands(input_command: str, max_suggestions: int = 3) -> str:
     """
     根據輸入的錯誤指令，建議相似的正確指令
     """
-    from difflib import SequenceMatcher
-    from commands import command_registry
+    from commands import suggestion_index
     
-    available_commands = [cmd.name for cmd in command_registry.get_all_commands()]
-    
-    similarities = []
-    for cmd in available_commands:
-        ratio = SequenceMatcher(None, input_command.lower(), cmd.lower()).ratio()
-        similarities.append((cmd, ratio))
-    
-    similarities.sort(key=lambda x: x[1], reverse=True)
-    top_suggestions = similarities[:max_suggestions]
+    # 相似度低於 0.2 的指令不會出現在建議中，索引直接略過
+    top_suggestions = suggestion_index.top_matches(input_command, max_suggestions, min_ratio=0.2)
     
     if not top_suggestions or top_suggestions[0][1] < 0.2:
         return "💡 試試看：@help 查看所有可用指令"
@@ -174,3 +239,7 @@ class MessageHandler:
             messages=[TextMessage(text=message)]
         )
         self.messaging_api.reply_message(req)
+
+
+# 模組載入時編譯別名表
+reload_aliases()
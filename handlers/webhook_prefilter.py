@@ -0,0 +1,122 @@
+"""
+Webhook 原始內容預先過濾
+在建立 SDK 事件模型之前，直接掃描原始 JSON 排除一般聊天訊息
+"""
+
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhook import SignatureValidator
+from linebot.v3.webhooks import Event
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookPrefilter:
+    """
+    Webhook 預先過濾器
+
+    只有「可能是指令」的文字訊息與指定的事件類型才會被轉成 SDK 模型並分派，
+    其餘事件（一般聊天、貼圖、圖片等）直接略過，不做任何模型建構。
+    略過的事件仍會回報來源群組（on_group_seen），群組即使只有一般聊天也會被登記。
+    """
+
+    def __init__(self, channel_secret: str, normalize: Callable[[str], str],
+                 handled_event_types: Iterable[str] = ('join', 'leave'),
+                 on_group_seen: Optional[Callable[[str], Any]] = None):
+        """
+        初始化預先過濾器
+
+        Args:
+            channel_secret: LINE Channel Secret，用於簽章驗證
+            normalize: 指令標準化函數（中文別名 -> 英文指令）
+            handled_event_types: 除文字訊息外需要處理的事件類型
+            on_group_seen: 每個請求中出現的群組 ID 各呼叫一次（離開事件除外）
+        """
+        self.signature_validator = SignatureValidator(channel_secret)
+        self.normalize = normalize
+        self.handled_event_types = set(handled_event_types)
+        self.on_group_seen = on_group_seen
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._skipped_requests = 0
+        self._events = 0
+        self._short_circuited = 0
+
+    def parse(self, body: str, signature: str) -> List[Any]:
+        """
+        驗證簽章並只為需要處理的事件建立模型
+
+        Args:
+            body: Webhook 原始內容
+            signature: X-Line-Signature 標頭
+
+        Returns:
+            List: 需要分派的事件模型（可能為空）
+        """
+        if not self.signature_validator.validate(body, signature):
+            raise InvalidSignatureError('Invalid signature. signature=' + signature)
+
+        raw_events = json.loads(body).get('events', [])
+        candidates = [raw for raw in raw_events if self.is_candidate(raw)]
+        self._report_groups(raw_events)
+
+        with self._lock:
+            self._requests += 1
+            self._events += len(raw_events)
+            self._short_circuited += len(raw_events) - len(candidates)
+            if not candidates:
+                self._skipped_requests += 1
+
+        events = []
+        for raw in candidates:
+            try:
+                events.append(Event.from_dict(raw))
+            except ValueError:
+                logger.info(f"未知的事件類型: {raw.get('type')}")
+        return events
+
+    def _report_groups(self, raw_events: List[Dict[str, Any]]):
+        """回報事件來源的群組（Bot 離開的事件不算群組仍存在）"""
+        if self.on_group_seen is None:
+            return
+        group_ids = {
+            (raw.get('source') or {}).get('groupId') for raw in raw_events
+            if raw.get('type') != 'leave'
+        }
+        group_ids.discard(None)
+        for group_id in group_ids:
+            try:
+                self.on_group_seen(group_id)
+            except Exception as e:
+                logger.warning(f"登記群組 {group_id} 失敗: {e}")
+
+    def is_candidate(self, raw_event: Dict[str, Any]) -> bool:
+        """判斷原始事件是否需要建立模型並分派"""
+        event_type = raw_event.get('type')
+        if event_type in self.handled_event_types:
+            return True
+        if event_type != 'message':
+            return False
+
+        message = raw_event.get('message') or {}
+        if message.get('type') != 'text':
+            return False
+
+        text = message.get('text') or ''
+        return self.normalize(text.strip()).startswith('@')
+
+    def get_stats(self) -> Dict[str, int]:
+        """取得過濾統計"""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "skipped_requests": self._skipped_requests,
+                "events": self._events,
+                "short_circuited_events": self._short_circuited,
+                "dispatched_events": self._events - self._short_circuited,
+            }
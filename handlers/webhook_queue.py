@@ -0,0 +1,208 @@
+"""
+Webhook 事件佇列
+/callback 驗證簽章後先回應 200，事件交由背景 worker 處理
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Iterable
+
+from services.latency_stats import summarize
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookEventQueue:
+    """
+    有界的 Webhook 事件工作佇列
+
+    負責：
+    - 以固定數量的 worker 執行事件處理函數
+    - 佇列滿時依設定的策略處理新事件
+    - 統計佇列深度與每個事件的處理延遲
+    """
+
+    # 佇列滿時的處理策略
+    POLICY_DROP_NEWEST = "drop_newest"   # 丟棄新進事件
+    POLICY_DROP_OLDEST = "drop_oldest"   # 丟棄最舊的待處理事件
+    POLICY_BLOCK = "block"               # 阻塞等待空位（逾時後丟棄）
+    POLICY_INLINE = "inline"             # 直接在請求執行緒中處理
+
+    VALID_POLICIES = {POLICY_DROP_NEWEST, POLICY_DROP_OLDEST, POLICY_BLOCK, POLICY_INLINE}
+
+    def __init__(self, process_event: Callable[[Any], None], maxsize: int = 1000, workers: int = 4,
+                 full_policy: str = POLICY_DROP_OLDEST, block_timeout: float = 1.0,
+                 latency_window: int = 1000):
+        """
+        初始化事件佇列
+
+        Args:
+            process_event: 處理單一事件的函數
+            maxsize: 佇列容量上限
+            workers: worker 執行緒數量
+            full_policy: 佇列滿時的策略
+            block_timeout: block 策略的最長等待秒數
+            latency_window: 保留最近多少筆延遲紀錄
+        """
+        if full_policy not in self.VALID_POLICIES:
+            logger.warning(f"未知的佇列滿載策略 {full_policy}，改用 {self.POLICY_DROP_OLDEST}")
+            full_policy = self.POLICY_DROP_OLDEST
+
+        self.process_event = process_event
+        self.maxsize = max(1, maxsize)
+        self.worker_count = max(1, workers)
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._workers = []
+        self._running = False
+        self._lock = threading.Lock()
+
+        # 統計資料
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._inline = 0
+        self._wait_ms = deque(maxlen=latency_window)
+        self._process_ms = deque(maxlen=latency_window)
+
+    def start(self):
+        """啟動 worker 執行緒"""
+        if self._running:
+            return
+        self._running = True
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"webhook-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        print(f"✅ Webhook 佇列啟動 | worker: {self.worker_count} | 容量: {self.maxsize} | 滿載策略: {self.full_policy}")
+
+    def stop(self, timeout: float = 5.0):
+        """停止 worker，等待已在佇列中的事件處理完成"""
+        if not self._running:
+            return
+        self._running = False
+        for _ in self._workers:
+            # None 作為停止訊號，排在既有事件之後
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def submit(self, events: Iterable[Any]) -> int:
+        """
+        將事件放入佇列
+
+        Args:
+            events: 已驗證簽章並解析完成的事件
+
+        Returns:
+            int: 成功排入（或直接處理）的事件數
+        """
+        accepted = 0
+        for event in events:
+            if self._put(event):
+                accepted += 1
+        return accepted
+
+    def _put(self, event) -> bool:
+        item = (time.monotonic(), event)
+        try:
+            self._queue.put_nowait(item)
+            self._count('_enqueued')
+            return True
+        except queue.Full:
+            pass
+
+        if self.full_policy == self.POLICY_INLINE:
+            self._count('_inline')
+            self._process(item)
+            return True
+
+        if self.full_policy == self.POLICY_BLOCK:
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+                self._count('_enqueued')
+                return True
+            except queue.Full:
+                self._count('_dropped')
+                logger.warning("Webhook 佇列已滿，等待逾時後丟棄事件")
+                return False
+
+        if self.full_policy == self.POLICY_DROP_OLDEST:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count('_dropped')
+                logger.warning("Webhook 佇列已滿，丟棄最舊的事件")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+                self._count('_enqueued')
+                return True
+            except queue.Full:
+                pass
+
+        self._count('_dropped')
+        logger.warning("Webhook 佇列已滿，丟棄新進事件")
+        return False
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._process(item)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, item):
+        enqueued_at, event = item
+        started = time.monotonic()
+        try:
+            self.process_event(event)
+            self._count('_processed')
+        except Exception as e:
+            self._count('_failed')
+            logger.error(f"Webhook 事件處理失敗: {e}")
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._wait_ms.append((started - enqueued_at) * 1000)
+                self._process_ms.append((finished - started) * 1000)
+
+    def _count(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得佇列統計資料"""
+        with self._lock:
+            wait_ms = list(self._wait_ms)
+            process_ms = list(self._process_ms)
+            stats = {
+                "running": self._running,
+                "depth": self._queue.qsize(),
+                "maxsize": self.maxsize,
+                "workers": self.worker_count,
+                "full_policy": self.full_policy,
+                "enqueued": self._enqueued,
+                "processed": self._processed,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "inline": self._inline,
+            }
+        stats["queue_wait_ms"] = summarize(wait_ms)
+        stats["process_ms"] = summarize(process_ms)
+        return stats
+
@@ -1,35 +1,54 @@
-from flask import Flask, request, abort
+from flask import Flask, request, abort, jsonify
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
-from linebot.v3.messaging import MessagingApi, Configuration, ApiClient
 from linebot.v3.webhook import WebhookHandler, MessageEvent
 from linebot.v3.messaging.models import ReplyMessageRequest, TextMessage
 from linebot.v3.webhooks import JoinEvent, LeaveEvent
+from linebot.v3.exceptions import InvalidSignatureError
+import atexit
 import os
+import time
 import pytz
 
-from handlers import normalize_command, suggest_commands
-from commands.handler import handle_command, create_command_context
+from handlers import normalize_command, suggest_commands, WebhookEventQueue, WebhookPrefilter
+from commands.handler import handle_command, create_command_context, get_context_dependencies
+from commands import response_cache
 from config import Config, ERROR_TEMPLATES
 
 # ===== Container =====
 from container import AppContainer
+from services.leader_election import LeaderElector
+
+# 啟動各階段耗時（秒）
+startup_timings = {}
+_phase_started = time.perf_counter()
+
+def _end_phase(name):
+    """記錄啟動階段耗時"""
+    global _phase_started
+    now = time.perf_counter()
+    startup_timings[name] = round(now - _phase_started, 3)
+    _phase_started = now
 
 # 1. 載入設定
 Config.load()
 
 # 2. 初始化容器與服務
 container = AppContainer()
+# per_group 格式下先完成舊資料搬移（可中斷後重跑）
+container.firebase_repository.migrate_layout_if_needed()
 member_service = container.member_service
 # 補充載入環境變數中的群組
 for gid in Config.LINE_GROUP_ID:
     member_service.add_group(gid)
+_end_phase("services")
 
 # 3. 初始化 Flask 與 LINE Bot
 app = Flask(__name__)
-configuration = Configuration(access_token=Config.LINE_CHANNEL_ACCESS_TOKEN)
-api_client = ApiClient(configuration)
-messaging_api = MessagingApi(api_client)
+# 回覆與推播共用同一個非同步客戶端（同步介面與 MessagingApi 相同）
+messaging_api = container.line_client
+messaging_api.start()
+atexit.register(messaging_api.close)
 handler = WebhookHandler(Config.LINE_CHANNEL_SECRET)
 
 # 4. 初始化排程器
@@ -39,14 +58,99 @@ container.init_scheduler(scheduler, group_jobs)
 schedule_service = container.schedule_service
 notification_service = container.notification_service
 
-# 初始化任務並確保預設排程
-schedule_service.initialize_jobs(notification_service.send_group_reminder)
-schedule_service.ensure_default_schedules(member_service.group_ids, notification_service.send_group_reminder)
+# 初始化任務並確保預設排程（只註冊時段，有新增預設排程時才寫入一次）
+print(f"📅 已載入 {len(schedule_service.group_schedules)} 個群組排程")
+_end_phase("load_schedules")
+registered_jobs = schedule_service.initialize_jobs(notification_service.send_group_reminder)
+# 暫停中的群組恢復探測計時器
+suspended_groups = container.delivery_health.restore()
+_end_phase("register_jobs")
+default_schedules = schedule_service.ensure_default_schedules(member_service.group_ids, notification_service.send_group_reminder)
+_end_phase("default_schedules")
+print(f"📅 註冊 {registered_jobs} 個群組排程 | 新增預設排程 {default_schedules} 個 | 暫停中 {suspended_groups} 個")
+
+# 產生今天的推播計畫，之後每天 23:50 產生隔天的計畫
+send_planner = container.send_planner
+send_planner.build(send_planner.today())
+send_planner.schedule_daily(scheduler)
+container.reminder_ledger.prune(send_planner.today())
+if Config.GROUP_SWEEP_MINUTES > 0:
+    container.group_lifecycle.schedule_sweep(scheduler, Config.GROUP_SWEEP_MINUTES)
+atexit.register(container.reminder_ledger.close)
+_end_phase("send_plan")
 
-# 啟動排程
+# 啟動排程（啟用主節點選舉時先暫停，成為主節點後才執行提醒）
+leader_elector = None
 if not scheduler.running:
-    scheduler.start()
+    scheduler.start(paused=Config.LEADER_ELECTION != "none")
+container.outbound_queue.start()
+atexit.register(container.outbound_queue.stop)
+container.reminder_fanout.start()
+atexit.register(container.reminder_fanout.stop)
+container.timing_wheel.start()
+atexit.register(container.timing_wheel.stop)
+_end_phase("scheduler_start")
+
+
+def run_catch_up():
+    """補發停機期間錯過的提醒（時間窗與數量有上限，已發送的會略過）"""
+    global catch_up_result
+    catch_up_result = schedule_service.dispatcher.catch_up(
+        Config.REMINDER_CATCHUP_GRACE_MINUTES * 60,
+        Config.REMINDER_CATCHUP_MAX_GROUPS,
+        was_sent=container.reminder_ledger.was_sent,
+    )
 
+
+def on_elected():
+    """成為主節點：以共用資料存儲庫的最新狀態重建排程後恢復，並補發前一個主節點停止後錯過的提醒"""
+    if state_sync is not None:
+        state_sync.sync_now()
+    scheduler.resume()
+    run_catch_up()
+
+
+catch_up_result = None
+state_sync = None
+if Config.LEADER_ELECTION == "none":
+    run_catch_up()
+else:
+    # 每個副本都處理 Webhook 並保有自己的記憶體資料，定期同步其他副本寫入的變更
+    state_sync = container.init_state_sync()
+    if Config.STATE_SYNC_SECONDS > 0:
+        state_sync.start()
+        atexit.register(state_sync.stop)
+    leader_elector = LeaderElector(
+        container.create_lease(Config.LEADER_ELECTION),
+        Config.LEADER_ELECTION,
+        on_elected=on_elected,
+        on_demoted=scheduler.pause,
+        renew_interval=Config.LEADER_RENEW_SECONDS,
+    )
+    leader_elector.start()
+    atexit.register(leader_elector.stop)
+_end_phase("catch_up")
+
+# 5. Webhook 佇列模式：先回應 200，事件交由背景 worker 處理
+webhook_queue = None
+if Config.WEBHOOK_MODE == "queue":
+    webhook_queue = WebhookEventQueue(
+        lambda event: dispatch_event(event),
+        maxsize=Config.WEBHOOK_QUEUE_SIZE,
+        workers=Config.WEBHOOK_WORKERS,
+        full_policy=Config.WEBHOOK_QUEUE_FULL_POLICY,
+    )
+    webhook_queue.start()
+    atexit.register(webhook_queue.stop)
+
+# 6. 原始內容預先過濾：一般聊天訊息不建立 SDK 模型、不分派
+# 略過的一般聊天仍登記群組 ID（群組回收只刪除有離開或無法送達證據的群組）
+webhook_prefilter = WebhookPrefilter(
+    Config.LINE_CHANNEL_SECRET, normalize_command, on_group_seen=member_service.add_group,
+) if Config.WEBHOOK_PREFILTER else None
+
+_end_phase("webhook")
+print(f"⏱️ 啟動耗時 | " + " | ".join(f"{name}: {seconds:.3f}s" for name, seconds in startup_timings.items()))
 print(f"✅ Bot 啟動成功 | 排程任務: {len(group_jobs)} | 環境: {os.getenv('RAILWAY_ENVIRONMENT_NAME', 'Local')}")
 
 
@@ -59,12 +163,58 @@ def callback():
     signature = request.headers["X-Line-Signature"]
     body = request.get_data(as_text=True)
     try:
-        handler.handle(body, signature)
+        if webhook_prefilter is not None:
+            # 只為可能是指令的訊息與加入/離開事件建立模型
+            events = webhook_prefilter.parse(body, signature)
+        elif webhook_queue is not None:
+            events = handler.parser.parse(body, signature)
+        else:
+            handler.handle(body, signature)
+            return "OK"
+
+        if webhook_queue is not None:
+            # 處理交給 worker，立即回應
+            webhook_queue.submit(events)
+        else:
+            for event in events:
+                dispatch_event(event)
+    except InvalidSignatureError as e:
+        print("Invalid signature:", e)
+        abort(400)
     except Exception as e:
         print("Error:", e)
         abort(400)
     return "OK"
 
+@app.route("/status")
+def status():
+    """執行狀態（佇列深度、處理延遲等）"""
+    return jsonify({
+        "scheduled_jobs": len(group_jobs),
+        "startup_timings": startup_timings,
+        "reminder_slots": schedule_service.dispatcher.get_stats() if schedule_service.dispatcher else None,
+        "reminder_fanout": container.reminder_fanout.get_stats(),
+        "line_client": messaging_api.get_stats(),
+        "outbound_queue": container.outbound_queue.get_stats(),
+        "send_plan": send_planner.get_stats(),
+        "rotations": member_service.get_rotation_stats(),
+        "reminder_ledger": container.reminder_ledger.get_stats(),
+        "catch_up": catch_up_result,
+        "followups": container.followup_service.get_stats(),
+        "group_lifecycle": container.group_lifecycle.get_stats(),
+        "delivery_health": container.delivery_health.get_stats(),
+        "suspended_groups": container.delivery_health.list_suspended(),
+        "leader_election": leader_elector.get_stats() if leader_elector is not None else None,
+        "state_sync": state_sync.get_stats() if state_sync is not None else None,
+        "webhook_mode": Config.WEBHOOK_MODE,
+        "webhook_queue": webhook_queue.get_stats() if webhook_queue is not None else None,
+        "webhook_prefilter": webhook_prefilter.get_stats() if webhook_prefilter is not None else None,
+        "context_dependencies": get_context_dependencies(),
+        "response_cache": response_cache.get_stats(),
+        "write_behind": container.firebase_repository.get_write_behind_stats(),
+        "firestore_writes": container.firebase_repository.get_write_stats(),
+    })
+
 # ===== 事件處理器 =====
 def get_group_id_from_event(event):
     """提取群組 ID"""
@@ -75,6 +225,11 @@ def get_group_id_from_event(event):
 @handler.add(MessageEvent)
 def handle_message(event):
     """處理 LINE 訊息事件"""
+    group_id = get_group_id_from_event(event)
+    if group_id:
+        # 任何群組訊息都代表群組仍存在（群組 ID 已登記時不會寫入）
+        member_service.add_group(group_id)
+
     if not hasattr(event.message, 'text'):
         return
     
@@ -83,8 +238,6 @@ def handle_message(event):
     
     if not normalized_text.startswith('@'):
         return
-    
-    group_id = get_group_id_from_event(event)
 
     # 建立精簡化的命令上下文 (由 Service 提供資料)
     context = create_command_context(
@@ -93,6 +246,9 @@ def handle_message(event):
         member_service=member_service,
         schedule_service=schedule_service,
         firebase_service=container.firebase_service,
+        send_planner=send_planner,
+        followup_service=container.followup_service,
+        delivery_health=container.delivery_health,
         # 為了相容性，傳入必要回調
         reminder_callback=notification_service.send_group_reminder,
         update_schedule=lambda gid, d, h, m: schedule_service.update_schedule(gid, d, h, m, reminder_callback=notification_service.send_group_reminder)
@@ -128,8 +284,23 @@ def handle_join(event):
 def handle_leave(event):
     """Bot 離開群組"""
     group_id = event.source.group_id
-    if member_service.remove_group(group_id):
+    # 一次清除群組的資料、排程、推播計畫與追蹤提醒，不再推播到已離開的群組
+    freed = container.group_lifecycle.teardown(group_id)
+    if freed.get("group_ids"):
         print(f"➖ 離開群組: {group_id}")
 
+# 佇列模式與預先過濾模式下依事件類型分派
+EVENT_HANDLERS = {
+    MessageEvent: handle_message,
+    JoinEvent: handle_join,
+    LeaveEvent: handle_leave,
+}
+
+def dispatch_event(event):
+    """將單一事件分派給對應的處理器"""
+    event_handler = EVENT_HANDLERS.get(type(event))
+    if event_handler:
+        event_handler(event)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=Config.PORT, debug=Config.DEBUG)
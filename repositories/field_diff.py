@@ -0,0 +1,62 @@
+"""
+欄位差異計算
+比對上次寫入的快照與新資料，產生只包含變更欄位的更新內容
+"""
+
+from typing import Any, Dict, List, Tuple
+
+FieldPathParts = Tuple[str, ...]
+
+
+def diff_fields(old: Any, new: Any, prefix: FieldPathParts = ()) -> Tuple[Dict[FieldPathParts, Any], List[FieldPathParts]]:
+    """
+    計算兩份資料的欄位差異
+
+    dict 會逐層比對；list 與其他值視為單一欄位，有變動時整個替換。
+
+    Args:
+        old: 上次寫入的資料
+        new: 新資料
+        prefix: 欄位路徑前綴
+
+    Returns:
+        Tuple: (要設定的欄位 {路徑: 值}, 要刪除的欄位路徑列表)
+    """
+    updates: Dict[FieldPathParts, Any] = {}
+    deletes: List[FieldPathParts] = []
+
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        if old != new:
+            updates[prefix] = new
+        return updates, deletes
+
+    for key, value in new.items():
+        path = prefix + (str(key),)
+        if key not in old:
+            updates[path] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            child_updates, child_deletes = diff_fields(old[key], value, path)
+            updates.update(child_updates)
+            deletes.extend(child_deletes)
+        elif old[key] != value:
+            updates[path] = value
+
+    for key in old:
+        if key not in new:
+            deletes.append(prefix + (str(key),))
+
+    return updates, deletes
+
+
+def diff_list(old: List[Any], new: List[Any]) -> Tuple[List[Any], List[Any]]:
+    """
+    計算集合型 list 的增減（不保留順序）
+
+    Returns:
+        Tuple: (新增的項目, 移除的項目)
+    """
+    old_set = set(old)
+    new_set = set(new)
+    added = [item for item in new if item not in old_set]
+    removed = [item for item in old if item not in new_set]
+    return added, removed
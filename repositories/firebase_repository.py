@@ -1,6 +1,11 @@
 
+import atexit
+import copy
 import logging
+import threading
 import firebase_service
+from repositories.field_diff import diff_fields, diff_list
+from repositories.write_behind import WriteBehindBuffer
 
 logger = logging.getLogger(__name__)
 
@@ -9,10 +14,91 @@ class FirebaseRepository:
     Firebase 資料存儲庫
     
     負責處理所有與 Firebase 的資料交互，取代原有的 DataManager
+    
+    儲存格式：
+    - legacy：bot_config 下每種資料一份文件（所有群組在同一份文件）
+    - per_group：輪值表、排程、文案存放在 groups/{group_id}，只寫入變更的群組
+    
+    寫入時與上次讀取/寫入的快照比對，只以 update() 送出變更的欄位；
+    沒有快照或部分更新失敗時退回整份 set()。
     """
     
-    def __init__(self):
+    LAYOUT_LEGACY = 'legacy'
+    LAYOUT_PER_GROUP = 'per_group'
+    
+    # 資料類型 -> 群組文件中的欄位
+    GROUP_DOCUMENT_FIELDS = {
+        'groups': 'rotation',
+        'group_schedules': 'schedule',
+        'group_messages': 'message',
+    }
+    
+    # legacy 格式：資料類型 -> (bot_config 文件, 欄位)
+    LEGACY_DOCUMENT_FIELDS = {
+        'groups': ('groups', 'groups'),
+        'group_schedules': ('group_schedules', 'schedules'),
+        'group_messages': ('group_messages', 'messages'),
+    }
+    
+    def __init__(self, layout: str = LAYOUT_LEGACY):
         self.firebase_service = firebase_service.firebase_service_instance
+        self.layout = layout if layout in (self.LAYOUT_LEGACY, self.LAYOUT_PER_GROUP) else self.LAYOUT_LEGACY
+        # 已知存在群組文件的群組，整批寫入時用來判斷需要刪除的欄位
+        self._group_document_ids = set()
+        # 延遲寫入緩衝區（預設關閉）
+        self.write_behind = None
+        # 上次讀取/寫入成功的資料快照：legacy 以資料類型為鍵，per_group 以 (資料類型, 群組) 為鍵
+        self._snapshots = {}
+        self._snapshot_lock = threading.RLock()
+        self.partial_writes = 0
+        self.full_writes = 0
+        self.skipped_writes = 0
+    
+    def enable_write_behind(self, debounce_seconds: float = 0.5, max_pending: int = 500):
+        """
+        啟用延遲寫入：save_data 只標記待寫入，由背景執行緒合併後寫入
+        
+        Args:
+            debounce_seconds: 合併寫入的防抖時間
+            max_pending: 未寫入項目的上限，超過時立即寫入
+        """
+        if self.write_behind is not None:
+            return
+        self.write_behind = WriteBehindBuffer(self._write, debounce_seconds, max_pending)
+        self.write_behind.start()
+        atexit.register(self.write_behind.stop)
+        print(f"✅ 延遲寫入啟用 | 防抖: {int(debounce_seconds * 1000)}ms | 上限: {max_pending} 筆")
+    
+    def flush(self) -> int:
+        """立即寫入所有延遲寫入的資料"""
+        if self.write_behind is None:
+            return 0
+        return self.write_behind.flush()
+    
+    def get_write_behind_stats(self):
+        """取得延遲寫入統計（未啟用時為 None）"""
+        return self.write_behind.get_stats() if self.write_behind is not None else None
+    
+    def uses_group_documents(self, data_type) -> bool:
+        """此資料類型是否存放在每個群組的文件中"""
+        return self.layout == self.LAYOUT_PER_GROUP and data_type in self.GROUP_DOCUMENT_FIELDS
+    
+    def migrate_layout_if_needed(self):
+        """
+        per_group 格式下，將舊的 bot_config 資料搬移到群組文件（可重複執行）
+        
+        遷移未完成時本次啟動改用 legacy 格式：群組文件在完成前不提供讀寫，
+        bot_config 仍是唯一的資料來源，下次啟動再以它為準繼續搬移
+        """
+        if self.layout != self.LAYOUT_PER_GROUP or not self.is_available():
+            return None
+        result = self.firebase_service.migrate_to_group_documents()
+        if result.get('completed'):
+            print(f"✅ 群組文件格式就緒 | 本次搬移 {result.get('migrated', 0)} 個群組")
+        else:
+            self.layout = self.LAYOUT_LEGACY
+            print(f"⚠️ 群組文件遷移未完成，本次沿用 legacy 格式，下次啟動將繼續: {result}")
+        return result
     
     def is_available(self):
         """檢查 Firebase 服務是否可用"""
@@ -24,8 +110,14 @@ class FirebaseRepository:
             print(f"⚠️ Firebase 未連接，無法載入 {data_type}")
             return default_value if default_value is not None else ([] if data_type in ['group_ids'] else {})
         
+        # 讀取前先寫入尚未持久化的同類資料
+        if self.write_behind is not None and self.write_behind.has_pending(lambda key: key[0] == data_type):
+            self.write_behind.flush()
+        
         try:
-            if data_type == 'group_ids':
+            if self.uses_group_documents(data_type):
+                firebase_data = self._load_from_group_documents(data_type)
+            elif data_type == 'group_ids':
                 firebase_data = self.firebase_service.load_group_ids()
             elif data_type == 'groups':
                 firebase_data = self.firebase_service.load_groups()
@@ -44,6 +136,8 @@ class FirebaseRepository:
                 firebase_data = None
             
             if firebase_data is not None:
+                if not self.uses_group_documents(data_type):
+                    self._remember(data_type, firebase_data)
                 return firebase_data
         except Exception as e:
             logger.error(f"從 Firebase 載入 {data_type} 失敗: {e}")
@@ -51,12 +145,104 @@ class FirebaseRepository:
         
         return default_value if default_value is not None else ([] if data_type in ['group_ids'] else {})
     
-    def save_data(self, data_type, data):
-        """儲存資料到 Firebase"""
+    def _load_from_group_documents(self, data_type):
+        """從每個群組的文件組合出 {group_id: 值}"""
+        field = self.GROUP_DOCUMENT_FIELDS[data_type]
+        documents = self.firebase_service.load_group_documents()
+        self._group_document_ids.update(documents.keys())
+        for group_id, document in documents.items():
+            self._remember((data_type, group_id), document.get(field))
+        return {
+            group_id: document[field]
+            for group_id, document in documents.items()
+            if field in document
+        }
+    
+    def save_data(self, data_type, data, group_id=None):
+        """
+        儲存資料到 Firebase
+        
+        Args:
+            data_type: 資料類型
+            data: 完整資料
+            group_id: 變更的群組；per_group 格式下只寫入該群組的文件
+        """
         if not self.is_available():
             print(f"⚠️ Firebase 未連接，無法儲存 {data_type}")
             return False
         
+        if self.write_behind is not None:
+            return self._mark_dirty(data_type, data, group_id)
+        return self._write(data_type, data, group_id)
+    
+    def _mark_dirty(self, data_type, data, group_id=None):
+        """標記待寫入；per_group 格式下以群組為單位合併"""
+        if self.uses_group_documents(data_type) and group_id is not None:
+            return self.write_behind.mark((data_type, group_id), data_type, {group_id: (data or {}).get(group_id)}, group_id)
+        if self.uses_group_documents(data_type):
+            # 整批寫入取代同類型的群組寫入
+            self.write_behind.discard(lambda key: key[0] == data_type)
+        return self.write_behind.mark((data_type, None), data_type, data)
+    
+    def _remember(self, key, data):
+        """記錄已持久化的資料快照"""
+        with self._snapshot_lock:
+            self._snapshots[key] = copy.deepcopy(data)
+    
+    def get_write_stats(self):
+        """取得部分更新統計"""
+        return {
+            "partial_writes": self.partial_writes,
+            "full_writes": self.full_writes,
+            "skipped_writes": self.skipped_writes,
+        }
+    
+    def _write(self, data_type, data, group_id=None):
+        """實際寫入 Firebase：優先部分更新，失敗時整份寫入"""
+        with self._snapshot_lock:
+            if self.uses_group_documents(data_type):
+                return self._save_to_group_documents(data_type, data, group_id)
+            
+            partial = self._write_partial(data_type, data)
+            if partial is None:
+                self.full_writes += 1
+                partial = self._write_full(data_type, data)
+            if partial:
+                self._remember(data_type, data)
+            return partial
+    
+    def _write_partial(self, data_type, data):
+        """
+        與快照比對後只更新變更的欄位
+        
+        Returns:
+            True 表示已寫入（或無需寫入），None 表示需要整份寫入
+        """
+        if data_type not in self._snapshots:
+            return None
+        old = self._snapshots[data_type]
+        if old == data:
+            self.skipped_writes += 1
+            return True
+        
+        if data_type == 'group_ids':
+            added, removed = diff_list(old or [], data or [])
+            if not self.firebase_service.update_group_ids(added, removed):
+                return None
+        elif data_type in self.LEGACY_DOCUMENT_FIELDS:
+            document, field = self.LEGACY_DOCUMENT_FIELDS[data_type]
+            updates, deletes = diff_fields(old or {}, data or {}, (field,))
+            if not self.firebase_service.update_document_fields('bot_config', document, updates, deletes):
+                return None
+        else:
+            # base_date 只有一個值，變更時直接整份寫入
+            return None
+        
+        self.partial_writes += 1
+        return True
+    
+    def _write_full(self, data_type, data):
+        """整份寫入 Firebase"""
         try:
             if data_type == 'group_ids':
                 return self.firebase_service.save_group_ids(data)
@@ -79,6 +265,45 @@ class FirebaseRepository:
         
         return False
     
+    def _save_to_group_documents(self, data_type, data, group_id=None):
+        """寫入群組文件；未指定群組時寫入全部，並刪除已不存在群組的欄位"""
+        data = data or {}
+        group_ids = [group_id] if group_id is not None else set(data) | self._group_document_ids
+        
+        success = True
+        for gid in group_ids:
+            success = self._save_group_field(data_type, gid, data.get(gid)) and success
+            self._group_document_ids.add(gid)
+        return success
+    
+    def _save_group_field(self, data_type, group_id, value):
+        """寫入單一群組文件的欄位，與快照比對後只更新變更的子欄位"""
+        field = self.GROUP_DOCUMENT_FIELDS[data_type]
+        key = (data_type, group_id)
+        
+        try:
+            if key in self._snapshots:
+                old = self._snapshots[key]
+                if old == value:
+                    self.skipped_writes += 1
+                    return True
+                # 欄位已存在於文件中才能部分更新；新欄位或刪除整個欄位用 set(merge)
+                if isinstance(old, dict) and isinstance(value, dict):
+                    updates, deletes = diff_fields(old, value, (field,))
+                    if self.firebase_service.update_document_fields('groups', group_id, updates, deletes):
+                        self.partial_writes += 1
+                        self._remember(key, value)
+                        return True
+            
+            self.full_writes += 1
+            if self.firebase_service.save_group_document(group_id, {field: value}):
+                self._remember(key, value)
+                return True
+        except Exception as e:
+            logger.error(f"儲存群組 {group_id} 的 {data_type} 失敗: {e}")
+            print(f"⚠️ 儲存群組 {group_id} 的 {data_type} 失敗: {e}")
+        return False
+    
     def delete_data(self, data_type):
         """從 Firebase 刪除資料"""
         if not self.is_available():
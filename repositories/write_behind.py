@@ -0,0 +1,242 @@
+"""
+延遲寫入緩衝區
+將短時間內的多次寫入合併為一次，由背景執行緒寫入 Firebase
+"""
+
+import copy
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    延遲寫入緩衝區
+
+    - 同一個鍵（資料類型 + 群組）在防抖時間內的多次寫入只保留最後一次
+    - 背景執行緒在第一次標記後經過防抖時間即寫入
+    - 待寫入的項目達到上限時，由呼叫端同步寫入（背壓）
+    - 提供 flush() 供關閉程式或需要立即持久化時使用
+    - 寫入失敗的項目重新標記（期間已有較新的值則以新值為準），
+      背景執行緒以指數退避重試，超過 max_retries 次才放棄
+    """
+
+    def __init__(self, writer: Callable[[str, Any, Optional[str]], bool],
+                 debounce_seconds: float = 0.5, max_pending: int = 500,
+                 retry_base_seconds: float = 1.0, max_backoff_seconds: float = 60.0, max_retries: int = 10):
+        """
+        初始化延遲寫入緩衝區
+
+        Args:
+            writer: 實際寫入函數 writer(data_type, data, group_id) -> bool
+            debounce_seconds: 防抖時間（秒）
+            max_pending: 未寫入項目的上限
+            retry_base_seconds: 第一次重試前的等待秒數，之後每次加倍
+            max_backoff_seconds: 重試等待的上限
+            max_retries: 同一個鍵連續失敗幾次後放棄
+        """
+        self.writer = writer
+        self.debounce_seconds = debounce_seconds
+        self.max_pending = max(1, max_pending)
+        self.retry_base_seconds = retry_base_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_retries = max(1, max_retries)
+
+        self._pending: Dict[Hashable, Tuple[str, Any, Optional[str]]] = {}
+        self._first_marked_at: Optional[float] = None
+        # 重試狀態：鍵 -> 連續失敗次數；退避期間背景執行緒不寫入
+        self._attempts: Dict[Hashable, int] = {}
+        self._retry_after: Optional[float] = None
+        # 寫入期間被 discard() 取代的條件，失敗的舊項目不再重新標記
+        self._superseded = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        # 統計資料
+        self._requested = 0
+        self._written = 0
+        self._failed = 0
+        self._retried = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """啟動背景寫入執行緒"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景執行緒並寫入所有待寫入資料"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        if self.has_pending():
+            logger.error(f"延遲寫入停止時仍有 {len(self._pending)} 筆資料寫入失敗")
+
+    def mark(self, key: Hashable, data_type: str, data: Any, group_id: Optional[str] = None) -> bool:
+        """
+        標記資料待寫入
+
+        Args:
+            key: 合併用的鍵，相同鍵只保留最後一次
+            data_type: 資料類型
+            data: 要寫入的資料（會複製一份，避免寫入前被修改）
+            group_id: 變更的群組
+
+        Returns:
+            bool: 是否已接受
+        """
+        snapshot = copy.deepcopy(data)
+        with self._condition:
+            self._requested += 1
+            self._pending[key] = (data_type, snapshot, group_id)
+            if self._first_marked_at is None:
+                self._first_marked_at = time.monotonic()
+            overflow = len(self._pending) >= self.max_pending
+            self._condition.notify_all()
+
+        if overflow:
+            logger.warning(f"延遲寫入項目達上限 {self.max_pending}，立即寫入")
+            self.flush()
+        return True
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> None:
+        """移除符合條件的待寫入項目（已被整批寫入取代時使用）"""
+        with self._condition:
+            for key in [key for key in self._pending if predicate(key)]:
+                del self._pending[key]
+            self._superseded.append(predicate)
+
+    def has_pending(self, predicate: Callable[[Hashable], bool] = None) -> bool:
+        """是否有（符合條件的）待寫入項目"""
+        with self._condition:
+            if predicate is None:
+                return bool(self._pending)
+            return any(predicate(key) for key in self._pending)
+
+    def flush(self) -> int:
+        """
+        立即寫入所有待寫入資料
+
+        Returns:
+            int: 實際寫入的次數
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch = self._pending
+                self._pending = {}
+                self._first_marked_at = None
+                self._retry_after = None
+                self._superseded = []
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            written = 0
+            failures = {}
+            for key, item in batch.items():
+                data_type, data, group_id = item
+                try:
+                    ok = self.writer(data_type, data, group_id)
+                except Exception as e:
+                    logger.error(f"延遲寫入 {data_type} 失敗: {e}")
+                    ok = False
+                if ok:
+                    written += 1
+                else:
+                    failures[key] = item
+            elapsed_ms = (time.monotonic() - started) * 1000
+
+            with self._condition:
+                for key in batch:
+                    if key not in failures:
+                        self._attempts.pop(key, None)
+                self._requeue(failures)
+                self._written += written
+                self._failed += len(failures)
+                self._flushes += 1
+                self._last_flush_ms = elapsed_ms
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+            return written
+
+    def _requeue(self, failures: Dict[Hashable, Tuple[str, Any, Optional[str]]]):
+        """重新標記寫入失敗的項目並安排退避（呼叫端需持有 _condition）"""
+        longest = 0
+        for key, item in failures.items():
+            attempts = self._attempts.get(key, 0) + 1
+            if key in self._pending:
+                # 已有較新的值待寫入，失敗的舊值不再重試（失敗次數沿用以計算退避）
+                self._attempts[key] = attempts
+                continue
+            if any(predicate(key) for predicate in self._superseded):
+                self._attempts.pop(key, None)
+                continue
+            if attempts >= self.max_retries:
+                self._attempts.pop(key, None)
+                self._dropped += 1
+                logger.error(f"延遲寫入 {item[0]} 連續失敗 {attempts} 次，放棄寫入")
+                continue
+            self._attempts[key] = attempts
+            self._pending[key] = item
+            self._retried += 1
+            longest = max(longest, attempts)
+
+        if longest:
+            now = time.monotonic()
+            delay = min(self.retry_base_seconds * (2 ** (longest - 1)), self.max_backoff_seconds)
+            self._retry_after = now + delay
+            if self._first_marked_at is None:
+                self._first_marked_at = now
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._first_marked_at is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                due = self._first_marked_at + self.debounce_seconds
+                if self._retry_after is not None:
+                    due = max(due, self._retry_after)
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得寫入統計"""
+        with self._condition:
+            issued = self._written + self._failed
+            return {
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "debounce_ms": int(self.debounce_seconds * 1000),
+                "requested": self._requested,
+                "written": self._written,
+                "failed": self._failed,
+                "retried": self._retried,
+                "dropped": self._dropped,
+                "flushes": self._flushes,
+                "coalescing_ratio": round(self._requested / issued, 2) if issued else 0.0,
+                "last_flush_ms": round(self._last_flush_ms, 2),
+                "avg_flush_ms": round(self._total_flush_ms / self._flushes, 2) if self._flushes else 0.0,
+                "max_flush_ms": round(self._max_flush_ms, 2),
+            }
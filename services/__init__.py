@@ -5,5 +5,7 @@
 
 from services.member_service import MemberService
 from services.schedule_service import ScheduleService
+from services.slot_dispatcher import SlotDispatcher
+from services.timing_wheel import TimingWheel
 
-__all__ = ['MemberService', 'ScheduleService']
+__all__ = ['MemberService', 'ScheduleService', 'SlotDispatcher', 'TimingWheel']
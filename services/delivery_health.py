@@ -0,0 +1,242 @@
+"""
+推播健康度
+追蹤每個群組連續推播失敗的次數，無法送達的群組自動暫停排程，並以指數間隔探測是否恢復
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 群組已刪除或 Bot 被踢出
+UNREACHABLE_STATUSES = frozenset({403, 404})
+
+
+def _names_recipient(body) -> bool:
+    """LINE 的 400 錯誤內容是否指出收件者（to）無效，而不是訊息內容本身有問題"""
+    if not body:
+        return False
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        error = json.loads(body)
+    except ValueError:
+        return False
+    if not isinstance(error, dict):
+        return False
+    if any(isinstance(detail, dict) and detail.get("property") == "to" for detail in error.get("details") or []):
+        return True
+    return "'to'" in str(error.get("message", ""))
+
+
+def classify_status(status: Optional[int], body=None) -> str:
+    """
+    分類 LINE 推播失敗的狀態碼
+
+    Args:
+        status: HTTP 狀態碼（連線錯誤為 None）
+        body: LINE 回傳的錯誤內容，用來判斷 400 是否因為收件者無效
+
+    Returns:
+        "transient"：429、5xx、連線錯誤，與群組無關，不計入失敗次數
+        "auth"：401，Channel Token 問題會影響所有群組，不計入
+        "unreachable"：403/404，或錯誤內容指出收件者無效的 400，群組無法送達，計入失敗次數
+        "rejected"：其他 4xx（例如訊息內容或文字長度不符規定），不計入
+    """
+    if status is None or status == 429 or status >= 500:
+        return "transient"
+    if status == 401:
+        return "auth"
+    if status in UNREACHABLE_STATUSES or (status == 400 and _names_recipient(body)):
+        return "unreachable"
+    return "rejected"
+
+
+class DeliveryHealth:
+    """
+    推播健康度
+
+    - 排程提醒推播後呼叫 record()；連續 threshold 次無法送達時暫停該群組的排程任務
+    - 暫停狀態寫在群組排程設定的 suspended 欄位，重啟後不會重新註冊
+    - 暫停後以時間輪計時器探測：到期時重新註冊排程，下一次提醒成功即恢復，
+      失敗則再暫停並加倍間隔；探測 max_probes 次仍失敗就不再探測，需手動恢復
+    """
+
+    PROBE_KIND = "delivery-probe"
+
+    def __init__(self, schedule_service, wheel, reminder_callback: Callable,
+                 threshold: int = 3, probe_base_seconds: float = 24 * 3600, max_probes: int = 4):
+        """
+        初始化推播健康度
+
+        Args:
+            schedule_service: ScheduleService 實例
+            wheel: TimingWheel 實例（探測計時器）
+            reminder_callback: 重新註冊排程時使用的提醒回調
+            threshold: 連續失敗幾次後暫停
+            probe_base_seconds: 第一次探測的間隔，之後每次加倍
+            max_probes: 最多探測次數
+        """
+        self.schedule_service = schedule_service
+        self.wheel = wheel
+        self.reminder_callback = reminder_callback
+        self.threshold = max(1, threshold)
+        self.probe_base_seconds = probe_base_seconds
+        self.max_probes = max_probes
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        # 統計資料
+        self.suspended_total = 0
+        self.revived_total = 0
+        self.failures_by_class: Dict[str, int] = {}
+        wheel.register_handler(self.PROBE_KIND, self._probe)
+
+    @staticmethod
+    def _timer_id(group_id: str) -> str:
+        return f"probe:{group_id}"
+
+    def _suspension(self, group_id: str) -> Optional[Dict[str, Any]]:
+        return (self.schedule_service.group_schedules.get(group_id) or {}).get("suspended")
+
+    # ===== 記錄推播結果 =====
+
+    def record(self, group_id: str, sent: bool, status: Optional[int] = None, body=None):
+        """記錄一次排程提醒的推播結果（body 為失敗時 LINE 回傳的錯誤內容）"""
+        if sent:
+            self._record_success(group_id)
+            return
+
+        category = classify_status(status, body)
+        with self._lock:
+            self.failures_by_class[category] = self.failures_by_class.get(category, 0) + 1
+            if category != "unreachable":
+                return
+            failures = self._failures.get(group_id, 0) + 1
+            self._failures[group_id] = failures
+            suspension = self._suspension(group_id)
+
+            if suspension is not None:
+                self._probe_failed(group_id, suspension, status)
+            elif failures >= self.threshold:
+                self._suspend(group_id, status, failures)
+
+    def _record_success(self, group_id: str):
+        with self._lock:
+            self._failures.pop(group_id, None)
+            if self._suspension(group_id) is None:
+                return
+            # 探測成功：排程已註冊，只需清除暫停狀態
+            self.schedule_service.set_suspension(group_id, None)
+            self.revived_total += 1
+        print(f"✅ 群組 {group_id} 推播恢復，解除暫停")
+
+    def _suspend(self, group_id: str, status: Optional[int], failures: int):
+        """暫停群組排程並安排第一次探測（呼叫端需持有鎖）"""
+        delay = self.probe_base_seconds
+        self.schedule_service.suspend_group(group_id, {
+            "since": datetime.now().isoformat(timespec="seconds"),
+            "status": status,
+            "failures": failures,
+            "probes": 0,
+            "next_probe_at": time.time() + delay,
+        })
+        self.wheel.schedule(self._timer_id(group_id), delay, self.PROBE_KIND, {"g": group_id})
+        self.suspended_total += 1
+        print(f"⏸️ 群組 {group_id} 連續 {failures} 次無法送達（{status}），暫停排程")
+
+    def _probe_failed(self, group_id: str, suspension: Dict[str, Any], status: Optional[int]):
+        """探測失敗：再次暫停並加倍間隔，超過次數後放棄（呼叫端需持有鎖）"""
+        probes = suspension.get("probes", 0) + 1
+        info = dict(suspension, probes=probes, status=status, probing=False)
+        if probes >= self.max_probes:
+            info.update(gave_up=True, next_probe_at=None)
+            print(f"🛑 群組 {group_id} 探測 {probes} 次仍無法送達，停止探測（可用 @suspended revive 恢復）")
+        else:
+            delay = self.probe_base_seconds * (2 ** probes)
+            info["next_probe_at"] = time.time() + delay
+            self.wheel.schedule(self._timer_id(group_id), delay, self.PROBE_KIND, {"g": group_id})
+        self.schedule_service.suspend_group(group_id, info)
+
+    def _probe(self, payload: Dict[str, Any]):
+        """探測時間到：重新註冊排程，讓下一次提醒嘗試推播"""
+        group_id = payload["g"]
+        with self._lock:
+            suspension = self._suspension(group_id)
+            if suspension is None or suspension.get("gave_up"):
+                return
+            self.schedule_service.set_suspension(group_id, dict(suspension, probing=True))
+            self.schedule_service.register_group(group_id, self.reminder_callback)
+        print(f"🔎 群組 {group_id} 第 {suspension.get('probes', 0) + 1} 次探測，恢復排程等待下一次提醒")
+
+    # ===== 查詢與管理 =====
+
+    def restore(self) -> int:
+        """
+        啟動時恢復探測：暫停中的群組重新安排探測計時器（已有計時器的略過）
+
+        Returns:
+            int: 暫停中的群組數量
+        """
+        suspended = 0
+        for group_id, config in list(self.schedule_service.group_schedules.items()):
+            suspension = (config or {}).get("suspended")
+            if not suspension:
+                continue
+            suspended += 1
+            if suspension.get("probing"):
+                # 探測中重啟：重新註冊排程
+                self.schedule_service.register_group(group_id, self.reminder_callback)
+            elif not suspension.get("gave_up") and self.wheel.get(self._timer_id(group_id)) is None:
+                delay = max(1.0, (suspension.get("next_probe_at") or 0) - time.time())
+                self.wheel.schedule(self._timer_id(group_id), delay, self.PROBE_KIND, {"g": group_id})
+        return suspended
+
+    def get_suspension(self, group_id: str) -> Optional[Dict[str, Any]]:
+        """取得群組的暫停資訊（未暫停時為 None）"""
+        suspension = self._suspension(group_id)
+        return dict(suspension, group_id=group_id) if suspension else None
+
+    def list_suspended(self) -> List[Dict[str, Any]]:
+        """列出暫停中的群組"""
+        return [
+            dict(config["suspended"], group_id=group_id)
+            for group_id, config in sorted(self.schedule_service.group_schedules.items())
+            if (config or {}).get("suspended")
+        ]
+
+    def revive(self, group_id: str) -> bool:
+        """
+        手動恢復群組排程
+
+        Returns:
+            bool: 群組是否原本為暫停中
+        """
+        with self._lock:
+            if self._suspension(group_id) is None:
+                return False
+            self.wheel.cancel(self._timer_id(group_id))
+            self._failures.pop(group_id, None)
+            self.schedule_service.set_suspension(group_id, None)
+            self.schedule_service.register_group(group_id, self.reminder_callback)
+            self.revived_total += 1
+        print(f"▶️ 群組 {group_id} 已手動恢復排程")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得推播健康度統計"""
+        with self._lock:
+            failing = sum(1 for count in self._failures.values() if count)
+            failures_by_class = dict(self.failures_by_class)
+        return {
+            "suspended": len(self.list_suspended()),
+            "failing_groups": failing,
+            "failures_by_class": failures_by_class,
+            "suspended_total": self.suspended_total,
+            "revived_total": self.revived_total,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,123 @@
+"""
+值日預測
+以 NumPy 向量運算一次算出多個群組在一段日期內每天的負責成員
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from services.rotation import CompiledRotation
+
+# 矩陣中「沒有負責成員」（不是推播日、當週沒有成員或群組沒有輪值表）
+NO_DUTY = -1
+
+
+class DutyForecast:
+    """
+    值日預測結果
+
+    - matrix[群組, 日期]：成員在該群組成員表中的索引，NO_DUTY 表示當天沒有人值日
+    - members[群組]：該群組的成員表（與 CompiledRotation.members 相同）
+    """
+
+    __slots__ = ('group_ids', 'dates', 'matrix', 'members', '_rows')
+
+    def __init__(self, group_ids: List[str], dates: List[date], matrix, members: List[Tuple[str, ...]]):
+        self.group_ids = group_ids
+        self.dates = dates
+        self.matrix = matrix
+        self.members = members
+        self._rows = {group_id: row for row, group_id in enumerate(group_ids)}
+
+    def member(self, group_id: str, target_date: date) -> Optional[str]:
+        """
+        查詢群組在某天的負責成員
+
+        Raises:
+            KeyError: 群組不在預測範圍內
+            ValueError: 日期不在 [dates[0], dates[-1]] 內（避免負索引取到區間尾端的結果）
+        """
+        row = self._rows[group_id]
+        if not self.dates or not self.dates[0] <= target_date <= self.dates[-1]:
+            raise ValueError(f"{target_date} 不在預測範圍內")
+        index = int(self.matrix[row, (target_date - self.dates[0]).days])
+        return self.members[row][index] if index != NO_DUTY else None
+
+    def to_dict(self) -> Dict[str, Dict[str, str]]:
+        """轉為 {群組: {日期: 成員}}，只包含有人值日的日期（給儀表板或 JSON 使用）"""
+        result = {}
+        for row, group_id in enumerate(self.group_ids):
+            members = self.members[row]
+            days = np.flatnonzero(self.matrix[row] != NO_DUTY)
+            result[group_id] = {
+                self.dates[col].isoformat(): members[self.matrix[row, col]] for col in days.tolist()
+            }
+        return result
+
+
+def forecast(rotations: Sequence[Optional[CompiledRotation]], group_ids: List[str],
+             start: date, end: date) -> DutyForecast:
+    """
+    計算多個群組在 [start, end] 每天的負責成員
+
+    每個群組的輪值表先整理成定長陣列（週數、每週成員、推播日順序），
+    之後以 (群組 × 日期) 的向量運算完成：週對齊、週數取餘、推播日查表與週內輪替
+
+    Args:
+        rotations: 每個群組編譯後的輪值表（None 表示沒有輪值資料）
+        group_ids: 與 rotations 對應的群組 ID
+        start: 開始日期（含）
+        end: 結束日期（含）
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("此環境未安裝 numpy，無法計算值日預測")
+    if end < start:
+        raise ValueError("結束日期不可早於開始日期")
+
+    group_count = len(rotations)
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    # ===== 每個群組的輪值表轉為定長陣列 =====
+    max_weeks = max((len(r.weeks) for r in rotations if r is not None), default=1)
+    max_members = max((len(week) for r in rotations if r is not None for week in r.weeks), default=1) or 1
+
+    present = np.zeros(group_count, dtype=bool)
+    base_monday = np.zeros(group_count, dtype=np.int64)
+    week_count = np.ones(group_count, dtype=np.int64)
+    day_index = np.full((group_count, 7), -1, dtype=np.int64)
+    week_length = np.zeros((group_count, max_weeks), dtype=np.int64)
+    week_members = np.full((group_count, max_weeks, max_members), NO_DUTY, dtype=np.int32)
+
+    for row, rotation in enumerate(rotations):
+        if rotation is None:
+            continue
+        present[row] = True
+        base_monday[row] = rotation.base_monday
+        week_count[row] = len(rotation.weeks)
+        day_index[row] = rotation.day_index
+        for slot, week in enumerate(rotation.weeks):
+            week_length[row, slot] = len(week)
+            week_members[row, slot, :len(week)] = week
+
+    # ===== 向量運算 =====
+    ordinals = np.arange(start.toordinal(), end.toordinal() + 1, dtype=np.int64)
+    weekdays = (ordinals - 1) % 7          # date.fromordinal(1) 是星期一
+    mondays = ordinals - weekdays
+
+    rows = np.arange(group_count)[:, None]
+    slots = ((mondays[None, :] - base_monday[:, None]) // 7) % week_count[:, None]
+    positions = day_index[:, weekdays]
+    lengths = week_length[rows, slots]
+    picks = positions % np.maximum(lengths, 1)
+
+    valid = present[:, None] & (positions >= 0) & (lengths > 0)
+    matrix = np.where(valid, week_members[rows, slots, picks], NO_DUTY).astype(np.int32)
+
+    members = [rotation.members if rotation is not None else () for rotation in rotations]
+    return DutyForecast(list(group_ids), dates, matrix, members)
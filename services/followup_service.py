@@ -0,0 +1,115 @@
+"""
+追蹤提醒服務
+提醒發送後若沒有人以 @done 回報完成，在設定的分鐘數後再提醒一次
+"""
+
+import logging
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+from services.reminder_ledger import reminder_retry_key
+
+logger = logging.getLogger(__name__)
+
+
+class FollowUpService:
+    """
+    追蹤提醒
+
+    - 每個群組最多一個待觸發的追蹤提醒（timer_id = followup:{群組}），由時間輪管理
+    - 追蹤分鐘數存放在群組排程設定的 followup_minutes，0 或未設定表示停用
+    - 計時器在時間輪的單一執行緒觸發，推播只排入發送佇列不等待結果，
+      不會延遲其他計時器（例如推播健康度探測）
+    """
+
+    KIND = "followup"
+
+    def __init__(self, wheel, schedule_service, member_service,
+                 push: Callable[..., Optional[bool]]):
+        """
+        初始化追蹤提醒服務
+
+        Args:
+            wheel: TimingWheel 實例
+            schedule_service: ScheduleService 實例（讀取追蹤分鐘數）
+            member_service: MemberService 實例（取得負責成員）
+            push: 推播函數 push(group_id, text, retry_key=..., on_complete=...)，
+                  排入佇列時回傳 None 並在完成後以 on_complete(是否成功) 通知
+        """
+        self.wheel = wheel
+        self.schedule_service = schedule_service
+        self.member_service = member_service
+        self.push = push
+        self.armed = 0
+        self.acknowledged = 0
+        self.sent = 0
+        wheel.register_handler(self.KIND, self._fire)
+
+    @staticmethod
+    def timer_id(group_id: str) -> str:
+        return f"followup:{group_id}"
+
+    def arm(self, group_id: str, target_date: date, slot: str) -> bool:
+        """
+        提醒發送後安排追蹤提醒
+
+        Returns:
+            bool: 是否已安排（群組未啟用時為 False）
+        """
+        minutes = self.schedule_service.get_followup_minutes(group_id)
+        if not minutes:
+            return False
+        self.wheel.schedule(self.timer_id(group_id), minutes * 60, self.KIND,
+                            {"g": group_id, "d": target_date.isoformat(), "s": slot})
+        self.armed += 1
+        return True
+
+    def acknowledge(self, group_id: str) -> bool:
+        """
+        回報完成，取消待觸發的追蹤提醒
+
+        Returns:
+            bool: 是否有待觸發的追蹤提醒
+        """
+        if not self.wheel.cancel(self.timer_id(group_id)):
+            return False
+        self.acknowledged += 1
+        return True
+
+    def pending(self, group_id: str) -> Optional[float]:
+        """待觸發追蹤提醒的到期時間（epoch 秒）；沒有時為 None"""
+        timer = self.wheel.get(self.timer_id(group_id))
+        return timer.due_at if timer is not None else None
+
+    def build_text(self, group_id: str, target_date: date) -> str:
+        """產生追蹤提醒文字"""
+        member = self.member_service.get_current_day_member(group_id, target_date)
+        lines = [f"⏰ 再次提醒：{target_date.strftime('%m/%d')} 的輪值還沒有人回報完成喔！"]
+        if member:
+            lines.append(f"👤 負責：{member}")
+        lines.append("✅ 完成後請輸入 @done")
+        return "\n".join(lines)
+
+    def _fire(self, payload: Dict[str, Any]):
+        group_id = payload["g"]
+        target_date = date.fromisoformat(payload["d"])
+        # 與原提醒不同的固定 Retry-Key，重啟後重送也只會送達一次
+        retry_key = reminder_retry_key(group_id, target_date, f"{payload['s']}+followup")
+        def completed(sent: bool):
+            if sent:
+                self.sent += 1
+            else:
+                logger.warning(f"群組 {group_id} 的追蹤提醒發送失敗")
+
+        sent = self.push(group_id, self.build_text(group_id, target_date), retry_key=retry_key, on_complete=completed)
+        if sent is not None:
+            completed(sent)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得追蹤提醒統計"""
+        return {
+            "armed": self.armed,
+            "acknowledged": self.acknowledged,
+            "sent": self.sent,
+            "wheel": self.wheel.get_stats(),
+        }
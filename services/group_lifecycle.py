@@ -0,0 +1,181 @@
+"""
+群組生命週期
+Bot 離開群組時一次清除該群組的所有資料與排程，並定期回收確定已不存在的群組殘留的狀態
+"""
+
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 舊版單一群組模式的資料鍵，不屬於任何群組 ID
+RESERVED_KEYS = frozenset({"legacy"})
+
+
+class GroupLifecycle:
+    """
+    群組生命週期管理
+
+    - teardown()：移除群組 ID、輪值表、排程設定、自訂文案、排程任務、推播計畫與追蹤提醒
+    - sweep()：回收持久化資料只依據明確的證據——收到離開事件的群組，或推播健康度探測後
+      判定無法送達（suspended.gave_up）的群組；連續兩次掃描都符合才刪除。
+      group_ids 在加入群組、設定 LINE_GROUP_ID 或收到群組的任何事件時寫入（預先過濾略過的聊天也會登記），
+      長期沒有訊息的群組可能仍不在其中，這些群組只列為「未確認」，不會被刪除。
+      reclaim=False（預設）時只回報可回收的群組，不實際刪除；沒有排程設定的排程任務一律移除
+    """
+
+    def __init__(self, member_service, schedule_service, send_planner=None, followup_service=None,
+                 reclaim: bool = False):
+        """
+        初始化群組生命週期管理
+
+        Args:
+            member_service: MemberService 實例
+            schedule_service: ScheduleService 實例
+            send_planner: SendPlanner 實例（選用）
+            followup_service: FollowUpService 實例（選用）
+            reclaim: 定期回收是否實際刪除資料（False 時只回報）
+        """
+        self.member_service = member_service
+        self.schedule_service = schedule_service
+        self.send_planner = send_planner
+        self.followup_service = followup_service
+        self.reclaim = reclaim
+        self._suspects: Set[str] = set()
+        # 收到離開事件的群組（之後又出現的殘留資料可以回收）
+        self._departed: Set[str] = set()
+        self._lock = threading.Lock()
+
+        # 統計資料
+        self.teardowns = 0
+        self.sweeps = 0
+        self.freed_total: Counter = Counter()
+        self.last_sweep: Optional[Dict[str, Any]] = None
+
+    def teardown(self, group_id: str) -> Dict[str, int]:
+        """
+        清除群組的所有資料與排程
+
+        Returns:
+            Dict[str, int]: 各項實際移除的數量
+        """
+        with self._lock:
+            freed = self._teardown(group_id)
+            self._suspects.discard(group_id)
+            self._departed.add(group_id)
+            self.teardowns += 1
+        print(f"🧹 已清除群組 {group_id} | {self._format(freed)}")
+        return freed
+
+    def _teardown(self, group_id: str) -> Dict[str, int]:
+        # 先停止排程，避免清除資料期間仍觸發提醒
+        freed = Counter(self.schedule_service.remove_schedule(group_id))
+        freed.update(self.member_service.purge_group(group_id))
+        if self.send_planner is not None:
+            freed["plans"] += self.send_planner.forget(group_id)
+        if self.followup_service is not None:
+            freed["followups"] += int(self.followup_service.acknowledge(group_id))
+        self.freed_total.update(freed)
+        return dict(freed)
+
+    def find_orphans(self) -> Dict[str, Set[str]]:
+        """
+        找出不屬於現存群組的狀態
+
+        Returns:
+            Dict: {"reclaimable": 有證據已不存在且仍有持久化資料的群組,
+                   "unverified": 不在 group_ids 但沒有證據的群組（只回報）,
+                   "jobs": 沒有排程設定的排程任務}
+        """
+        active = set(self.member_service.group_ids)
+        schedules = self.schedule_service.group_schedules
+        scheduled = set(self.schedule_service.group_jobs)
+        dispatcher = self.schedule_service.dispatcher
+        if dispatcher is not None:
+            scheduled |= dispatcher.registered_groups()
+
+        persisted = set(self.member_service.groups) | set(schedules) | set(self.member_service.group_messages)
+        unreachable = {
+            gid for gid, config in schedules.items()
+            if ((config or {}).get("suspended") or {}).get("gave_up")
+        }
+        # 離開後又重新加入（再次出現在 group_ids）的群組不算離開
+        reclaimable = persisted & ((self._departed - active) | unreachable)
+        return {
+            "reclaimable": reclaimable - RESERVED_KEYS,
+            "unverified": persisted - active - reclaimable - RESERVED_KEYS,
+            "jobs": {gid for gid in scheduled if gid not in schedules},
+        }
+
+    def sweep(self) -> Dict[str, Any]:
+        """
+        回收孤兒狀態
+
+        Returns:
+            Dict: 本次回收的群組數（只回報時為可回收的群組）、各項移除數量、待確認與未確認的群組數
+        """
+        started = datetime.now()
+        freed: Counter = Counter()
+        with self._lock:
+            orphans = self.find_orphans()
+            confirmed = orphans["reclaimable"] & self._suspects
+            self._suspects = orphans["reclaimable"] - confirmed
+
+            if self.reclaim:
+                for group_id in sorted(confirmed):
+                    try:
+                        freed.update(self._teardown(group_id))
+                    except Exception as e:
+                        logger.error(f"回收群組 {group_id} 失敗: {e}")
+                    else:
+                        self._suspects.discard(group_id)
+            else:
+                # 只回報：保留在待確認名單，下次掃描仍會列出
+                self._suspects |= confirmed
+
+            for group_id in sorted(orphans["jobs"]):
+                job = self.schedule_service.group_jobs.pop(group_id, None)
+                if job is not None:
+                    job.remove()
+                elif self.schedule_service.dispatcher is not None:
+                    self.schedule_service.dispatcher.unregister(group_id)
+                freed["jobs"] += 1
+            self.freed_total["jobs"] += len(orphans["jobs"])
+
+            self.sweeps += 1
+            self.last_sweep = {
+                "time": started.isoformat(timespec="seconds"),
+                "dry_run": not self.reclaim,
+                "reclaimed_groups": len(confirmed) if self.reclaim else 0,
+                "would_reclaim": sorted(confirmed) if not self.reclaim else [],
+                "freed": dict(+freed),
+                "pending_confirmation": len(self._suspects) - (0 if self.reclaim else len(confirmed)),
+                "unverified_orphans": len(orphans["unverified"]),
+                "duration_ms": round((datetime.now() - started).total_seconds() * 1000, 2),
+            }
+        if self.reclaim and +freed:
+            print(f"🧹 群組狀態回收 | 回收 {len(confirmed)} 個群組 | {self._format(freed)} | "
+                  f"待確認 {self.last_sweep['pending_confirmation']} 個")
+        elif confirmed:
+            print(f"🧹 群組狀態回收（僅回報）| 可回收 {len(confirmed)} 個群組: {', '.join(sorted(confirmed))}")
+        return self.last_sweep
+
+    def schedule_sweep(self, scheduler, minutes: int):
+        """註冊定期回收的排程任務"""
+        return scheduler.add_job(self.sweep, 'interval', minutes=minutes, id="group-sweep", replace_existing=True)
+
+    @staticmethod
+    def _format(freed: Dict[str, int]) -> str:
+        return ", ".join(f"{key} {count}" for key, count in sorted(freed.items()) if count) or "無"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得回收統計"""
+        return {
+            "teardowns": self.teardowns,
+            "sweeps": self.sweeps,
+            "freed_total": dict(self.freed_total),
+            "last_sweep": self.last_sweep,
+        }
@@ -0,0 +1,21 @@
+"""
+延遲統計
+將延遲樣本整理為筆數、平均、p50、p95 與最大值，供 /status 與日誌使用
+"""
+
+from typing import Dict, Iterable
+
+
+def summarize(samples: Iterable[float]) -> Dict[str, float]:
+    """計算延遲樣本的摘要數值"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    count = len(ordered)
+    return {
+        "count": count,
+        "avg": round(sum(ordered) / count, 2),
+        "p50": round(ordered[int(count * 0.50)], 2),
+        "p95": round(ordered[min(count - 1, int(count * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
@@ -0,0 +1,251 @@
+"""
+排程器主節點選舉
+多個副本同時執行時，只有取得租約的主節點執行提醒排程，其他副本只處理 Webhook
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def default_holder_id() -> str:
+    """主機名稱 + PID + 隨機碼，辨識租約持有者"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class FileLease:
+    """
+    本機檔案鎖租約（同一台主機上的多個 worker）
+
+    以 flock 鎖住檔案；持有的行程結束時作業系統自動釋放，其他行程下一次嘗試即可取得。
+    """
+
+    def __init__(self, path: str, holder_id: str):
+        if not FCNTL_AVAILABLE:
+            raise RuntimeError("此平台不支援 fcntl，無法使用檔案鎖選舉")
+        self.path = path
+        self.holder_id = holder_id
+        self._fd = None
+
+    def acquire(self) -> bool:
+        """嘗試取得（或確認仍持有）鎖"""
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, self.holder_id.encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        """釋放鎖"""
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class WorkerSlot:
+    """
+    同一台主機上 worker 的固定編號
+
+    依序以 flock 鎖住 {鎖檔}.worker{n}，取得的最小編號即為此 worker 的編號，本機日誌以編號區分；
+    worker 結束時鎖自動釋放，重新啟動的 worker 取得相同編號並接手該編號的日誌。
+    多個 worker 共用同一份日誌時，壓縮（os.replace）會抹去其他 worker 的紀錄。
+    """
+
+    def __init__(self, lock_path: str, max_slots: int = 64):
+        if not FCNTL_AVAILABLE:
+            raise RuntimeError("此平台不支援 fcntl，無法分配 worker 編號")
+        root, ext = os.path.splitext(lock_path)
+        self.lock_pattern = root + ".worker{}" + ext
+        self.max_slots = max_slots
+        self.slot: Optional[int] = None
+        self._fd = None
+
+    def acquire(self) -> int:
+        """取得最小的可用編號（已取得時直接回傳）"""
+        if self.slot is not None:
+            return self.slot
+        for slot in range(self.max_slots):
+            path = self.lock_pattern.format(slot)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            self._fd, self.slot = fd, slot
+            return slot
+        raise RuntimeError(f"worker 編號已用盡（上限 {self.max_slots}）")
+
+    def path_for(self, path: Optional[str]) -> Optional[str]:
+        """data/timers.jsonl -> data/timers.w{編號}.jsonl"""
+        if not path:
+            return path
+        root, ext = os.path.splitext(path)
+        return f"{root}.w{self.acquire()}{ext}"
+
+    def release(self):
+        """釋放編號"""
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd, self.slot = None, None
+
+
+class FirestoreLease:
+    """
+    Firestore 租約（跨主機的多個副本）
+
+    租約文件記錄持有者與到期時間，主節點定期續約；
+    主節點停止續約後，其他副本在租約到期後即可取得。
+    """
+
+    def __init__(self, firebase_service, holder_id: str, name: str = "scheduler", ttl_seconds: int = 30):
+        self.firebase_service = firebase_service
+        self.holder_id = holder_id
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+
+    def acquire(self) -> bool:
+        """取得或續約租約"""
+        return self.firebase_service.acquire_lease(self.name, self.holder_id, self.ttl_seconds)
+
+    def release(self):
+        """釋放租約"""
+        self.firebase_service.release_lease(self.name, self.holder_id)
+
+
+class LeaderElector:
+    """
+    主節點選舉
+
+    - 背景執行緒每 renew_interval 秒嘗試取得或續約租約
+    - 取得時呼叫 on_elected，失去時呼叫 on_demoted
+    - 主節點停止後，其他副本最慢在「租約到期時間 + renew_interval」內接手
+    """
+
+    def __init__(self, lease, backend: str, on_elected: Callable[[], None],
+                 on_demoted: Callable[[], None], renew_interval: float = 10.0, history: int = 20):
+        """
+        初始化主節點選舉
+
+        Args:
+            lease: FileLease 或 FirestoreLease
+            backend: 選舉方式名稱（顯示用）
+            on_elected: 成為主節點時的回調
+            on_demoted: 失去主節點時的回調
+            renew_interval: 續約間隔（秒），應小於租約有效時間
+            history: 保留最近幾次主節點變更紀錄
+        """
+        self.lease = lease
+        self.backend = backend
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.renew_interval = renew_interval
+        self.is_leader = False
+        self.leader_since: Optional[datetime] = None
+        self._transitions = deque(maxlen=history)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    @property
+    def holder_id(self) -> str:
+        return self.lease.holder_id
+
+    def start(self):
+        """立即嘗試一次選舉，之後由背景執行緒定期續約"""
+        self.tick()
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止選舉並釋放租約"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            if self.is_leader:
+                self._set_leader(False, "shutdown")
+            try:
+                self.lease.release()
+            except Exception as e:
+                logger.warning(f"釋放租約失敗: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.renew_interval):
+            self.tick()
+
+    def tick(self):
+        """取得或續約租約，並在主節點狀態改變時呼叫回調"""
+        with self._lock:
+            try:
+                held = self.lease.acquire()
+                self.last_error = None
+            except Exception as e:
+                # 無法確認租約時視為失去主節點，避免同時有兩個主節點
+                logger.warning(f"租約續約失敗: {e}")
+                self.last_error = str(e)
+                held = False
+
+            if held and not self.is_leader:
+                self._set_leader(True, "elected")
+            elif not held and self.is_leader:
+                self._set_leader(False, "lost lease")
+
+    def _set_leader(self, leader: bool, reason: str):
+        self.is_leader = leader
+        self.leader_since = datetime.now() if leader else None
+        self._transitions.append({"time": datetime.now().isoformat(timespec="seconds"),
+                                  "leader": leader, "reason": reason})
+        if leader:
+            print(f"👑 成為排程主節點 ({self.backend}) | {self.holder_id}")
+        else:
+            print(f"🔕 不再是排程主節點 ({self.backend}, {reason}) | {self.holder_id}")
+        callback = self.on_elected if leader else self.on_demoted
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"主節點切換回調失敗: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得選舉狀態"""
+        return {
+            "backend": self.backend,
+            "holder_id": self.holder_id,
+            "is_leader": self.is_leader,
+            "leader_since": self.leader_since.isoformat(timespec="seconds") if self.leader_since else None,
+            "renew_interval": self.renew_interval,
+            "last_error": self.last_error,
+            "transitions": list(self._transitions),
+        }
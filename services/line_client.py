@@ -0,0 +1,131 @@
+"""
+LINE 訊息客戶端
+以單一事件迴圈執行緒與共用連線池送出推播與回覆，並提供同步介面
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+from linebot.v3.messaging import AsyncApiClient, AsyncMessagingApi, Configuration
+from linebot.v3.messaging.models import PushMessageRequest, ReplyMessageRequest
+
+logger = logging.getLogger(__name__)
+
+
+class LineClient:
+    """
+    非同步 LINE 訊息客戶端
+
+    - 背景執行緒執行 asyncio 事件迴圈，所有請求共用同一個 aiohttp 連線池（keep-alive）
+    - push_message_async / reply_message_async 回傳 Future，可同時有大量請求在途
+    - push_message / reply_message 與 MessagingApi 的同步呼叫方式相同，既有程式碼可直接替換
+    """
+
+    def __init__(self, access_token: str, pool_size: int = 100, timeout: float = 30.0):
+        """
+        初始化 LINE 客戶端
+
+        Args:
+            access_token: Channel access token
+            pool_size: 連線池上限（同時連線數）
+            timeout: 同步介面等待回應的秒數
+        """
+        self.configuration = Configuration(access_token=access_token)
+        self.configuration.connection_pool_maxsize = pool_size
+        self.timeout = timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._api_client = None
+        self._api: Optional[AsyncMessagingApi] = None
+        self._lock = threading.Lock()
+
+        # 統計資料
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._sent = 0
+        self._failed = 0
+
+    def start(self):
+        """啟動事件迴圈執行緒並建立連線池"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name="line-client", daemon=True)
+            self._thread.start()
+            # aiohttp 的 ClientSession 必須在事件迴圈內建立
+            asyncio.run_coroutine_threadsafe(self._create_api(), loop).result()
+            self._loop = loop
+
+    async def _create_api(self):
+        self._api_client = AsyncApiClient(self.configuration)
+        self._api = AsyncMessagingApi(self._api_client)
+
+    def close(self):
+        """關閉連線池並停止事件迴圈"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+        try:
+            asyncio.run_coroutine_threadsafe(self._api_client.close(), loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"關閉 LINE 連線池失敗: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _submit(self, coroutine_factory) -> Future:
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(self._track(coroutine_factory), self._loop)
+
+    async def _track(self, coroutine_factory):
+        """在事件迴圈內執行請求並記錄在途數量"""
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            result = await coroutine_factory()
+            self._sent += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+    # ===== 非同步介面：回傳 Future =====
+
+    def push_message_async(self, push_message_request: PushMessageRequest,
+                           x_line_retry_key: Optional[str] = None) -> Future:
+        """送出推播，不等待回應"""
+        return self._submit(lambda: self._api.push_message(push_message_request, x_line_retry_key=x_line_retry_key))
+
+    def reply_message_async(self, reply_message_request: ReplyMessageRequest) -> Future:
+        """送出回覆，不等待回應"""
+        return self._submit(lambda: self._api.reply_message(reply_message_request))
+
+    # ===== 同步介面：與 MessagingApi 相同 =====
+
+    def push_message(self, push_message_request: PushMessageRequest, x_line_retry_key: Optional[str] = None):
+        """推播訊息並等待回應（失敗時拋出例外）"""
+        return self.push_message_async(push_message_request, x_line_retry_key).result(self.timeout)
+
+    def reply_message(self, reply_message_request: ReplyMessageRequest):
+        """回覆訊息並等待回應（失敗時拋出例外）"""
+        return self.reply_message_async(reply_message_request).result(self.timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得請求統計"""
+        return {
+            "running": self._loop is not None,
+            "pool_size": self.configuration.connection_pool_maxsize,
+            "in_flight": self._in_flight,
+            "max_in_flight": self._max_in_flight,
+            "sent": self._sent,
+            "failed": self._failed,
+        }
@@ -3,8 +3,15 @@
 封裝成員輪值相關的業務邏輯
 """
 
-from datetime import date, timedelta
-from typing import Dict, Any, List, Optional
+import itertools
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pytz
+
+from services.rotation import WEEKDAY_NUMBERS, CompiledRotation, compile_days, compile_rotation
+from services.slot_dispatcher import parse_slots
+from services.state_version import StateVersion
 
 
 class MemberService:
@@ -18,6 +25,11 @@ class MemberService:
     - 成員輪值表摘要
     """
     
+    # @upcoming 最多檢查的觸發次數（約一年份的每日推播）
+    UPCOMING_SCAN_CAP = 400
+    # @upcoming 結果快取的項目上限
+    UPCOMING_CACHE_SIZE = 1024
+    
     def __init__(self, data_manager, schedule_service=None):
         """
         初始化成員服務
@@ -32,6 +44,16 @@ class MemberService:
         self._group_ids = None
         self._group_messages = None
         self._base_date = None
+        self.state_version = StateVersion()
+        # 編譯後的輪值表快取（依狀態版本號判斷是否過期）
+        self._rotations: Dict[str, CompiledRotation] = {}
+        self.rotation_builds = 0
+        # (群組, 成員, 筆數) -> (版本, 結果)
+        self._upcoming: Dict[tuple, tuple] = {}
+    
+    def get_state_version(self, group_id: str = None) -> int:
+        """取得群組資料的狀態版本號（每次變更都會遞增）"""
+        return self.state_version.get(group_id)
     
     @property
     def group_ids(self) -> list:
@@ -43,6 +65,7 @@ class MemberService:
     @group_ids.setter
     def group_ids(self, value: list):
         self._group_ids = value
+        self.state_version.bump()
         
     @property
     def group_messages(self) -> dict:
@@ -54,6 +77,7 @@ class MemberService:
     @group_messages.setter
     def group_messages(self, value: dict):
         self._group_messages = value
+        self.state_version.bump()
     
     @property
     def groups(self) -> dict:
@@ -65,6 +89,7 @@ class MemberService:
     @groups.setter
     def groups(self, value: dict):
         self._groups = value
+        self.state_version.bump()
     
     @property
     def base_date(self) -> Optional[date]:
@@ -109,6 +134,7 @@ class MemberService:
             except ValueError:
                 pass
         self._base_date = value
+        self.state_version.bump()
     
     def reload_data(self):
         """重新載入資料"""
@@ -116,6 +142,35 @@ class MemberService:
         self._group_ids = None
         self._group_messages = None
         self._base_date = None
+        self.state_version.bump()
+    
+    def refresh_data(self) -> Set[str]:
+        """
+        重新讀取資料存儲庫，只讓內容有變更的群組失效
+        
+        多個副本共用資料時使用：其他副本寫入的輪值表與文案在此同步，
+        未變更群組的推播計畫、輪值表與回應快取不受影響
+        
+        Returns:
+            Set[str]: 內容有變更的群組
+        """
+        groups = self.data_manager.load_data('groups', {}) or {}
+        messages = self.data_manager.load_data('group_messages', {}) or {}
+        group_ids = self.data_manager.load_data('group_ids', []) or []
+        # 尚未載入的資料沒有快取，不需要比對
+        old_groups = self._groups if self._groups is not None else groups
+        old_messages = self._group_messages if self._group_messages is not None else messages
+        old_base_date = self.base_date
+        
+        changed = {gid for gid in set(old_groups) | set(groups) if old_groups.get(gid) != groups.get(gid)}
+        changed |= {gid for gid in set(old_messages) | set(messages) if old_messages.get(gid) != messages.get(gid)}
+        self._groups, self._group_messages, self._group_ids = groups, messages, group_ids
+        self._base_date = None
+        for group_id in changed:
+            self.state_version.bump(group_id)
+        if self.base_date != old_base_date:
+            self.state_version.bump()
+        return changed
         
     def add_group(self, group_id: str) -> bool:
         """
@@ -132,6 +187,7 @@ class MemberService:
             current_ids.append(group_id)
             self.data_manager.save_data('group_ids', current_ids)
             self._group_ids = current_ids # 確保內存更新
+            self.state_version.bump(group_id)
             return True
         return False
         
@@ -142,9 +198,37 @@ class MemberService:
             current_ids.remove(group_id)
             self.data_manager.save_data('group_ids', current_ids)
             self._group_ids = current_ids
+            self.state_version.bump(group_id)
             return True
         return False
         
+    def purge_group(self, group_id: str) -> Dict[str, int]:
+        """
+        移除群組的所有成員資料（群組 ID、輪值表、自訂文案）
+        
+        Returns:
+            Dict[str, int]: 各項實際移除的數量
+        """
+        freed = {"group_ids": int(self.remove_group(group_id)), "rotation": 0, "message": 0}
+        
+        groups = self.groups
+        if group_id in groups:
+            del groups[group_id]
+            self._groups = groups
+            self.data_manager.save_data('groups', groups, group_id=group_id)
+            freed["rotation"] = 1
+        
+        messages = self.group_messages
+        if group_id in messages:
+            del messages[group_id]
+            self._group_messages = messages
+            self.data_manager.save_data('group_messages', messages, group_id=group_id)
+            freed["message"] = 1
+        
+        self._rotations.pop(group_id, None)
+        self.state_version.bump(group_id)
+        return freed
+        
     def get_all_groups(self) -> list:
         """取得所有群組 ID"""
         return self.group_ids
@@ -157,8 +241,20 @@ class MemberService:
         """設定群組自訂訊息範本"""
         messages = self.group_messages
         messages[group_id] = message
-        self.data_manager.save_data('group_messages', messages)
+        self.data_manager.save_data('group_messages', messages, group_id=group_id)
         self._group_messages = messages
+        self.state_version.bump(group_id)
+    
+    def clear_group_message_template(self, group_id: str) -> bool:
+        """清除群組自訂訊息範本（恢復預設文案）；原本沒有設定時回傳 False"""
+        messages = self.group_messages
+        if group_id not in messages:
+            return False
+        del messages[group_id]
+        self.data_manager.save_data('group_messages', messages, group_id=group_id)
+        self._group_messages = messages
+        self.state_version.bump(group_id)
+        return True
         
     def clear_all_group_ids(self):
         """清空所有群組 ID"""
@@ -171,124 +267,190 @@ class MemberService:
             "cleared_count": old_count
         }
     
-    def get_current_group(self, group_id: str = None) -> List[str]:
+    def get_current_group(self, group_id: str = None, target_date: date = None) -> List[str]:
         """
         取得當前週的成員群組（基於自然週計算）
         
         Args:
             group_id: 群組ID，如果為None則使用legacy模式
+            target_date: 計算哪一天所在的週，如果為None則使用今天
             
         Returns:
             當前週的成員列表
         """
-        groups = self.groups
-        base_date = self.base_date
+        rotation = self.get_rotation(group_id)
+        if rotation is None:
+            return []
+        return rotation.current_group(target_date or date.today())
+    
+    def get_current_day_member(self, group_id: str, target_date: date = None, group_schedules: dict = None) -> Optional[str]:
+        """
+        取得當前日期對應的輪值成員（支援週內按日輪值）
+        
+        Args:
+            group_id: 群組ID
+            target_date: 目標日期，如果為None則使用今天
+            group_schedules: 群組排程設定（未提供時使用 schedule_service 的設定）
+            
+        Returns:
+            當天負責的成員名稱，如果沒有則回傳None
+        """
+        if target_date is None:
+            target_date = date.today()
+        
+        rotation = self.get_rotation(group_id)
+        if rotation is None:
+            return None
         
+        # 傳入其他排程設定時，以該設定的推播日計算（不快取）
+        if group_schedules is not None and (
+                self.schedule_service is None or group_schedules is not self.schedule_service.group_schedules):
+            day_mask, day_index = compile_days(group_schedules.get(group_id))
+            rotation = CompiledRotation(rotation.members, rotation.weeks, rotation.base_monday,
+                                        day_mask, day_index, rotation.versions)
+        return rotation.duty_member(target_date)
+    
+    def get_rotation(self, group_id: str = None) -> Optional[CompiledRotation]:
+        """
+        取得群組編譯後的輪值表
+        
+        成員資料、基準日期或排程變更時（狀態版本號改變）才重新編譯
+        
+        Args:
+            group_id: 群組ID，如果為None則使用legacy模式（不快取）
+            
+        Returns:
+            CompiledRotation，沒有輪值資料時為 None
+        """
+        if group_id is not None:
+            rotation = self._rotations.get(group_id)
+            if rotation is not None and rotation.versions == self._rotation_versions(group_id):
+                return rotation
+        
+        groups = self.groups
         if not isinstance(groups, dict) or len(groups) == 0:
-            return []
+            return None
         
         # 決定使用哪個群組的資料
         if group_id is None:
             if "legacy" in groups:
                 group_data = groups["legacy"]
-            elif groups:
-                group_data = next(iter(groups.values()))
             else:
-                return []
+                group_data = next(iter(groups.values()))
         else:
             if group_id not in groups:
-                return []
+                return None
             group_data = groups[group_id]
         
         if not isinstance(group_data, dict) or len(group_data) == 0:
-            return []
-        
-        today = date.today()
+            return None
         
         # 檢查並修復 base_date
+        base_date = self.base_date
         if base_date is None or not isinstance(base_date, date):
-            base_date = today
+            base_date = date.today()
             self._save_base_date(base_date)
         
-        # 計算基準日期所在自然週的星期一
-        base_monday = base_date - timedelta(days=base_date.weekday())
-        
-        # 計算今天所在自然週的星期一
-        today_monday = today - timedelta(days=today.weekday())
-        
-        # 計算相差多少個自然週
-        weeks_diff = (today_monday - base_monday).days // 7
-        
-        # 計算當前是第幾週
-        total_weeks = len(group_data)
-        if total_weeks == 0:
-            return []
-        
-        current_week = (weeks_diff % total_weeks) + 1
-        week_key = str(current_week)
-        return group_data.get(week_key, [])
+        schedules = self.schedule_service.group_schedules if self.schedule_service else {}
+        versions = self._rotation_versions(group_id)
+        rotation = compile_rotation(group_data, base_date, schedules.get(group_id), versions)
+        if group_id is not None and rotation is not None:
+            self._rotations[group_id] = rotation
+            self.rotation_builds += 1
+        return rotation
     
-    def get_current_day_member(self, group_id: str, target_date: date = None, group_schedules: dict = None) -> Optional[str]:
+    def forecast_duty(self, start: date, end: date, group_ids: Iterable[str] = None):
         """
-        取得當前日期對應的輪值成員（支援週內按日輪值）
+        預測多個群組在一段日期內每天的負責成員（NumPy 向量運算）
         
         Args:
-            group_id: 群組ID
-            target_date: 目標日期，如果為None則使用今天
-            group_schedules: 群組排程設定
+            start: 開始日期（含）
+            end: 結束日期（含）
+            group_ids: 要預測的群組，None 表示所有有輪值資料的群組
             
         Returns:
-            當天負責的成員名稱，如果沒有則回傳None
+            DutyForecast：matrix[群組, 日期] 為成員索引，-1 表示當天沒有人值日
         """
-        if target_date is None:
-            target_date = date.today()
-        
-        current_members = self.get_current_group(group_id)
-        if not current_members:
-            return None
-        
-        # 如果沒有排程服務或排程設定，返回第一個成員
-        if group_schedules is None:
-             if self.schedule_service:
-                 group_schedules = self.schedule_service.group_schedules
-        
-        if group_schedules is None or group_id not in group_schedules:
-            return current_members[0] if current_members else None
-        
-        schedule = group_schedules[group_id]
-        if 'days' not in schedule:
-            return current_members[0] if current_members else None
-        
-        # 取得推播日列表
-        broadcast_days = schedule['days']
-        if isinstance(broadcast_days, str):
-            broadcast_days = [d.strip() for d in broadcast_days.split(',')]
-        elif not isinstance(broadcast_days, list):
-            return current_members[0] if current_members else None
-        
-        # 星期對應
-        day_mapping = {
-            'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3,
-            'fri': 4, 'sat': 5, 'sun': 6
-        }
+        from services.duty_forecast import forecast
         
-        # 取得今天是星期幾
-        today_weekday = target_date.weekday()
+        group_ids = list(self.groups) if group_ids is None else list(group_ids)
+        return forecast([self.get_rotation(gid) for gid in group_ids], group_ids, start, end)
+    
+    def iter_upcoming_duties(self, group_id: str, name: str = None,
+                             now: datetime = None) -> Iterator[Tuple[datetime, str]]:
+        """
+        依群組實際的推播時間，逐一產生之後的 (觸發時間, 負責成員)
         
-        # 找出今天的星期名
-        today_day_name = None
-        for day_name, day_num in day_mapping.items():
-            if day_num == today_weekday:
-                today_day_name = day_name
-                break
+        排程暫停中的群組不會推播，不產生任何結果；只在讀取時計算下一筆；最多檢查 UPCOMING_SCAN_CAP 次觸發，
+        且連續一整個輪值週期都沒有符合的成員時提前結束（之後也不會再出現）
         
-        if today_day_name not in broadcast_days:
-            return None  # 今天不是推播日
+        Args:
+            group_id: 群組ID
+            name: 只列出此成員的值日（None 表示所有成員）
+            now: 起算時間（預設為現在）
+        """
+        rotation = self.get_rotation(group_id)
+        config = self.schedule_service.group_schedules.get(group_id) if self.schedule_service else None
+        if rotation is None or not config or config.get('suspended'):
+            return
+        
+        tz = pytz.timezone('Asia/Taipei')
+        now = now or datetime.now(tz)
+        fires = sorted(
+            (WEEKDAY_NUMBERS[day], hour, minute)
+            for day, hour, minute in parse_slots(str(config.get('days', '')), config.get('hour', 17), config.get('minute', 10))
+            if day in WEEKDAY_NUMBERS
+        )
+        if not fires:
+            return
+        
+        cycle = len(rotation.weeks) * len(fires)
+        scanned = since_match = 0
+        monday = now.date() - timedelta(days=now.weekday())
+        while True:
+            for weekday, hour, minute in fires:
+                day = monday + timedelta(days=weekday)
+                fire_time = tz.localize(datetime(day.year, day.month, day.day, hour, minute))
+                if fire_time <= now:
+                    continue
+                scanned += 1
+                since_match += 1
+                member = rotation.duty_member(day)
+                if member is not None and (name is None or member == name):
+                    since_match = 0
+                    yield fire_time, member
+                if scanned >= self.UPCOMING_SCAN_CAP or since_match >= cycle:
+                    return
+            monday += timedelta(days=7)
+    
+    def get_upcoming_duties(self, group_id: str, name: str = None, limit: int = 5,
+                            now: datetime = None) -> List[Tuple[datetime, str]]:
+        """
+        取得之後 limit 次的值日（@upcoming 使用）
         
-        # 根據推播日順序分配成員
-        day_index = broadcast_days.index(today_day_name)
-        member_index = day_index % len(current_members)
-        return current_members[member_index]
+        結果快取到群組資料或排程變更、或第一筆的時間已過為止
+        """
+        now = now or datetime.now(pytz.timezone('Asia/Taipei'))
+        key = (group_id, name, limit)
+        versions = self._rotation_versions(group_id)
+        cached = self._upcoming.get(key)
+        if cached is not None and cached[0] == versions and (not cached[1] or cached[1][0][0] > now):
+            return cached[1]
+        
+        results = list(itertools.islice(self.iter_upcoming_duties(group_id, name, now), limit))
+        if len(self._upcoming) >= self.UPCOMING_CACHE_SIZE:
+            self._upcoming.clear()
+        self._upcoming[key] = (versions, results)
+        return results
+    
+    def get_rotation_stats(self) -> Dict[str, int]:
+        """取得輪值表快取統計"""
+        return {"cached": len(self._rotations), "builds": self.rotation_builds}
+    
+    def _rotation_versions(self, group_id: str):
+        """輪值表的快取版本：(成員資料版本, 排程版本)"""
+        schedule_version = self.schedule_service.get_state_version(group_id) if self.schedule_service else 0
+        return (self.get_state_version(group_id), schedule_version)
     
     def get_member_schedule(self, group_id: str = None) -> Dict[str, Any]:
         """
@@ -336,7 +498,8 @@ class MemberService:
             return empty_result
         
         total_weeks = len(group_data)
-        today = date.today()
+        # 與推播排程相同，以台北時間判斷本週
+        today = datetime.now(pytz.timezone('Asia/Taipei')).date()
         
         # 計算當前週
         if base_date is not None and total_weeks > 0:
@@ -413,8 +576,9 @@ class MemberService:
             self._save_base_date(date.today())
         
         # 儲存更新
-        self.groups = groups
-        self.data_manager.save_data('groups', groups)
+        self._groups = groups
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('groups', groups, group_id=target_group_id)
         
         return {
             "success": True,
@@ -452,8 +616,9 @@ class MemberService:
         if self.base_date is None:
             self._save_base_date(date.today())
         
-        self.groups = groups
-        self.data_manager.save_data('groups', groups)
+        self._groups = groups
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('groups', groups, group_id=target_group_id)
         
         return {
             "success": True,
@@ -483,8 +648,9 @@ class MemberService:
         
         groups[target_group_id][week_key].remove(member_name)
         
-        self.groups = groups
-        self.data_manager.save_data('groups', groups)
+        self._groups = groups
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('groups', groups, group_id=target_group_id)
         
         return {
             "success": True,
@@ -535,8 +701,9 @@ class MemberService:
         else:
             groups = {}
         
-        self.groups = groups
-        self.data_manager.save_data('groups', groups)
+        self._groups = groups
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('groups', groups, group_id=group_id)
         self._save_base_date(None)
         
         return {
@@ -561,8 +728,9 @@ class MemberService:
         old_members = groups[target_group_id][week_key].copy()
         del groups[target_group_id][week_key]
         
-        self.groups = groups
-        self.data_manager.save_data('groups', groups)
+        self._groups = groups
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('groups', groups, group_id=target_group_id)
         
         return {
             "success": True,
@@ -572,4 +740,5 @@ class MemberService:
     def _save_base_date(self, new_date: Optional[date]):
         """儲存基準日期"""
         self._base_date = new_date
+        self.state_version.bump()
         self.data_manager.save_data('base_date', new_date)
@@ -4,14 +4,16 @@
 """
 
 import logging
-from typing import Optional, List, Dict
-from datetime import datetime
+from typing import Any, Callable, Optional, List, Dict, Tuple
+from datetime import date, datetime
 import pytz
 import os
 import requests
 from linebot.v3.messaging import MessagingApi, Configuration, ApiClient
 from linebot.v3.messaging.models import PushMessageRequest, TextMessage, ReplyMessageRequest
 
+from services.reminder_ledger import reminder_retry_key
+
 logger = logging.getLogger(__name__)
 
 class NotificationService:
@@ -24,16 +26,37 @@ class NotificationService:
     - 一般訊息推播
     """
     
-    def __init__(self, member_service, schedule_service=None):
+    # 同步等待推播結果的秒數（逾時後推播仍留在佇列中重試）
+    PUSH_WAIT_SECONDS = 30
+    
+    def __init__(self, member_service, schedule_service=None, line_client=None, outbound_queue=None):
+        """
+        初始化通知服務
+        
+        Args:
+            member_service: MemberService 實例
+            schedule_service: ScheduleService 實例
+            line_client: 共用的 LineClient（未提供時自行建立同步 MessagingApi）
+            outbound_queue: OutboundQueue 實例，推播經由佇列限速、重試與持久化
+        """
         self.member_service = member_service
         self.schedule_service = schedule_service
+        self.outbound_queue = outbound_queue
+        # 推播計畫、發送紀錄、追蹤提醒與推播健康度（由 container 注入）
+        self.send_planner = None
+        self.reminder_ledger = None
+        self.followups = None
+        self.delivery_health = None
         self._messaging_api = None
         self._line_channel_access_token = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
-        self._initialize_api()
+        self._initialize_api(line_client)
         
-    def _initialize_api(self):
+    def _initialize_api(self, line_client=None):
         """初始化 LINE Messaging API"""
-        if self._line_channel_access_token:
+        if self._line_channel_access_token and line_client is not None:
+            # 與 Webhook 回覆共用同一個連線池
+            self._messaging_api = line_client
+        elif self._line_channel_access_token:
             configuration = Configuration(access_token=self._line_channel_access_token)
             api_client = ApiClient(configuration)
             self._messaging_api = MessagingApi(api_client)
@@ -44,55 +67,132 @@ class NotificationService:
         """檢查服務是否可用"""
         return self._messaging_api is not None
         
-    def send_group_reminder(self, group_id: str) -> bool:
+    def send_group_reminder(self, group_id: str, scheduled_time: datetime = None,
+                            on_complete: Optional[Callable[[bool], None]] = None) -> Optional[bool]:
         """
         發送特定群組的垃圾收集提醒
         
         Args:
             group_id: 群組ID
+            scheduled_time: 排定的觸發時間，以其日期決定負責人（延遲推播時不會跨日）
+            on_complete: 提供時只排入發送佇列不等待，推播完成後以 on_complete(是否成功) 通知
+                         （提醒分派執行器使用，worker 不會卡在重試退避上）
             
         Returns:
-            bool: 是否發送成功
+            Optional[bool]: 是否發送成功（已發送過的提醒視為成功）；
+            提供 on_complete 且推播仍在佇列中時為 None
+        """
+        today = (scheduled_time or datetime.now(pytz.timezone('Asia/Taipei'))).date()
+        
+        if scheduled_time is None:
+            return self._send_reminder(group_id, today)
+        
+        # 排程觸發的提醒以 (群組, 日期, 時段) 去重，重啟或補發時不會重複推播
+        slot = scheduled_time.strftime('%H:%M')
+        if self.reminder_ledger is not None and not self.reminder_ledger.claim(group_id, today, slot):
+            logger.info(f"群組 {group_id} 的 {today} {slot} 提醒已發送，略過")
+            return True
+        
+        def settled(delivered: bool):
+            self._settle_reminder(group_id, today, slot, delivered)
+            if on_complete is not None:
+                on_complete(delivered)
+        
+        # 固定的 Retry-Key：主節點切換後重送同一個提醒時，LINE 也只會送達一次
+        sent = self._send_reminder(
+            group_id, today, reminder_retry_key(group_id, today, slot), track_health=True,
+            on_complete=settled, wait=on_complete is None,
+        )
+        if sent is None:
+            # 推播仍在佇列中重試：保留佔位，重新觸發或補發都不會再推播，完成時才記錄結果
+            if on_complete is not None:
+                return None
+            logger.warning(f"群組 {group_id} 的 {today} {slot} 提醒尚未送達，完成後再記錄")
+            return False
+        self._settle_reminder(group_id, today, slot, sent)
+        return sent
+    
+    def _settle_reminder(self, group_id: str, target_date: date, slot: str, sent: bool):
+        """記錄排程提醒的最終結果：成功時寫入發送紀錄並安排追蹤提醒，失敗時釋放佔位"""
+        if self.reminder_ledger is not None:
+            if sent:
+                self.reminder_ledger.commit(group_id, target_date, slot)
+            else:
+                self.reminder_ledger.release(group_id, target_date, slot)
+        # 沒有人回報完成時再提醒一次
+        if sent and self.followups is not None:
+            self.followups.arm(group_id, target_date, slot)
+    
+    def _send_reminder(self, group_id: str, today: date, retry_key: str = None, track_health: bool = False,
+                       on_complete: Optional[Callable[[bool], None]] = None, wait: bool = True) -> Optional[bool]:
+        """
+        產生並推播提醒；track_health 時記錄推播結果，持續無法送達的群組會被暫停
+        
+        Returns:
+            Optional[bool]: 是否成功；推播逾時（或 wait=False）仍在佇列中時為 None，完成後以 on_complete(sent) 通知
         """
         try:
-            today = datetime.now(pytz.timezone('Asia/Taipei')).date()
-            
-            # 使用 member_service 取得負責人 (會自動 fallback 到 schedule_service)
-            responsible_member = self.member_service.get_current_day_member(group_id, today)
+            # 優先使用預先產生的推播計畫，觸發時只剩推播
+            if self.send_planner is not None:
+                message_text = self.send_planner.get_text(group_id, today)
+            else:
+                message_text = self.build_reminder_text(group_id, today)
             
-            if not responsible_member:
+            if not message_text:
                 logger.info(f"群組 {group_id} 今天 {today} 沒有設定負責成員")
                 return False
                 
-            # 取得群組設定的文案 (從 MemberService 載入 groups_messages 或類似結構)
-            # 這裡需要注意：原本 group_messages 是在 global，現在應該移入 MemberService 或 GroupService
-            # 暫時假設 MemberService 有方法可以取得，或者我們在這裡直接讀取
-            # 為了保持重構順序，我們先假設 MemberService 會提供 get_group_message_template
-            # 如果還沒實作，我們稍後補上
+            def record(sent: bool, status: Optional[int], body):
+                if track_health and self.delivery_health is not None:
+                    self.delivery_health.record(group_id, sent, status, body)
             
-            # 簡單起見，我們先用預設文案，並標記需要實作的部分
-            custom_message = self.member_service.get_group_message_template(group_id)
+            def completed(sent: bool, status: Optional[int], body):
+                record(sent, status, body)
+                if on_complete is not None:
+                    on_complete(sent)
             
-            weekday_names = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]
-            weekday = weekday_names[today.weekday()]
-            date_str = f"{today.month}/{today.day}"
-            
-            if custom_message:
-                message_text = custom_message.format(
-                    name=responsible_member,
-                    date=date_str,
-                    weekday=weekday
-                )
-            else:
-                message_text = f"🗑️ 今天 {date_str} ({weekday}) 輪到 {responsible_member} 收垃圾！"
-                
-            return self.push_message(group_id, message_text)
+            sent, status, body = self.deliver(group_id, message_text, retry_key=retry_key,
+                                              on_complete=completed, wait=wait)
+            if sent is not None:
+                record(sent, status, body)
+            return sent
             
         except Exception as e:
             logger.error(f"發送群組 {group_id} 提醒失敗: {e}")
             import traceback
             traceback.print_exc()
             return False
+    
+    def build_reminder_text(self, group_id: str, target_date: date) -> Optional[str]:
+        """
+        產生群組在指定日期的提醒文字
+        
+        Args:
+            group_id: 群組ID
+            target_date: 推播日期
+            
+        Returns:
+            Optional[str]: 提醒文字，當天沒有負責成員時為 None
+        """
+        # 使用 member_service 取得負責人 (會自動 fallback 到 schedule_service)
+        responsible_member = self.member_service.get_current_day_member(group_id, target_date)
+        if not responsible_member:
+            return None
+        
+        # 群組自訂文案（未設定時使用預設文案）
+        custom_message = self.member_service.get_group_message_template(group_id)
+        
+        weekday_names = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]
+        weekday = weekday_names[target_date.weekday()]
+        date_str = f"{target_date.month}/{target_date.day}"
+        
+        if custom_message:
+            return custom_message.format(
+                name=responsible_member,
+                date=date_str,
+                weekday=weekday
+            )
+        return f"🗑️ 今天 {date_str} ({weekday}) 輪到 {responsible_member} 收垃圾！"
 
     def send_welcome_message(self, group_id: str):
         """發送歡迎訊息"""
@@ -107,32 +207,101 @@ class NotificationService:
 💡 提示：所有設定都會自動儲存，重啟後不會遺失！"""
         return self.push_message(group_id, welcome_msg)
 
-    def push_message(self, to: str, text: str) -> bool:
+    def push_message(self, to: str, text: str, retry_key: str = None) -> bool:
         """
         推播文字訊息
         
         Args:
             to: 目標 ID (User ID / Group ID)
             text: 訊息內容
+            retry_key: X-Line-Retry-Key（None 時由發送佇列隨機產生）
             
         Returns:
-            bool: 是否成功
+            bool: 是否成功（逾時仍在佇列中重試時為 False）
+        """
+        return bool(self.deliver(to, text, retry_key)[0])
+    
+    def enqueue_push(self, to: str, text: str, retry_key: str = None,
+                     on_complete: Optional[Callable[[bool], None]] = None) -> Optional[bool]:
+        """
+        排入推播但不等待結果（供時間輪等不能被阻塞的執行緒使用）
+        
+        Returns:
+            Optional[bool]: 已排入發送佇列時為 None，完成後以 on_complete(是否成功) 通知；
+            沒有發送佇列時直接送出並回傳結果
+        """
+        callback = (lambda sent, status, body: on_complete(sent)) if on_complete is not None else None
+        return self.deliver(to, text, retry_key, on_complete=callback, wait=False)[0]
+    
+    def deliver(self, to: str, text: str, retry_key: str = None,
+                on_complete: Optional[Callable[[bool, Optional[int], Any], None]] = None,
+                wait: bool = True) -> Tuple[Optional[bool], Optional[int], Any]:
+        """
+        推播文字訊息並回傳失敗的狀態碼與錯誤內容
+        
+        Args:
+            on_complete: 等待逾時時，推播在佇列中完成後以 on_complete(是否成功, 狀態碼, 錯誤內容) 通知
+            wait: False 時排入發送佇列後立即返回 (None, None, None)，結果只經由 on_complete 通知
+        
+        Returns:
+            Tuple: (是否成功, 最後一次失敗的 HTTP 狀態碼（連線錯誤時為 None）, LINE 回傳的錯誤內容)，
+            等待逾時仍在佇列中重試時為 (None, None, None)
         """
         if not self.is_available():
             print(f"[模擬推播] To: {to}, Text: {text}")
-            return False
+            return False, None, None
+        
+        if self.outbound_queue is not None:
+            message = self.outbound_queue.enqueue(to, text, retry_key)
+            result = message.wait(self.PUSH_WAIT_SECONDS) if wait else None
+            if result is None:
+                if wait:
+                    logger.warning(f"推播 To: {to} 尚未完成，將在佇列中繼續重試")
+                if on_complete is not None:
+                    message.add_done_callback(lambda done: on_complete(
+                        done.result == self.outbound_queue.RESULT_SENT, done.error_status, done.error_body))
+                return None, None, None
+            return result == self.outbound_queue.RESULT_SENT, message.error_status, message.error_body
             
         try:
-            req = PushMessageRequest(
-                to=to,
-                messages=[TextMessage(text=text)]
-            )
-            self._messaging_api.push_message(req)
+            self.send_push(to, text, retry_key)
             logger.info(f"推播成功 To: {to}")
-            return True
+            return True, None, None
         except Exception as e:
             logger.error(f"推播失敗: {e}")
-            return False
+            return False, getattr(e, 'status', None), getattr(e, 'body', None)
+    
+    def send_push(self, to: str, text: str, retry_key: str = None):
+        """
+        直接呼叫 LINE 推播 API（失敗時拋出例外，供發送佇列使用）
+        
+        Args:
+            to: 目標 ID
+            text: 訊息內容
+            retry_key: X-Line-Retry-Key，重試時沿用可避免重複送達
+        """
+        req = PushMessageRequest(
+            to=to,
+            messages=[TextMessage(text=text)]
+        )
+        return self._messaging_api.push_message(req, x_line_retry_key=retry_key)
+    
+    def submit_push(self, to: str, text: str, retry_key: str = None):
+        """
+        送出推播但不等待回應（供發送佇列使用）
+        
+        Returns:
+            使用 LineClient 時回傳 Future（結果或例外由 Future 取得）；
+            同步 MessagingApi 時直接送出並回傳結果（失敗時拋出例外）
+        """
+        push_async = getattr(self._messaging_api, 'push_message_async', None)
+        if push_async is None:
+            return self.send_push(to, text, retry_key)
+        req = PushMessageRequest(
+            to=to,
+            messages=[TextMessage(text=text)]
+        )
+        return push_async(req, x_line_retry_key=retry_key)
             
     def reply_message(self, reply_token: str, text: str) -> bool:
         """回覆訊息"""
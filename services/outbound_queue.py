@@ -0,0 +1,408 @@
+"""
+推播發送佇列
+限速、失敗重試（指數退避）並記錄到本機日誌，重啟後繼續發送未完成的推播
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Dict, List, Optional
+
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# 保護完成回調的註冊與觸發（所有推播共用，持有時間極短）
+_callback_lock = threading.Lock()
+
+
+class OutboundMessage:
+    """一則待發送的推播"""
+
+    __slots__ = ('retry_key', 'to', 'text', 'attempts', 'next_attempt_at', 'created_at', 'result',
+                 'error_status', 'error_body', '_done', '_callbacks')
+
+    def __init__(self, to: str, text: str, retry_key: Optional[str] = None,
+                 attempts: int = 0, next_attempt_at: float = 0.0, created_at: Optional[float] = None):
+        # 同一則推播的所有重試都使用相同的 X-Line-Retry-Key，LINE 保證不會重複送達
+        self.retry_key = retry_key or str(uuid.uuid4())
+        self.to = to
+        self.text = text
+        self.attempts = attempts
+        self.next_attempt_at = next_attempt_at
+        self.created_at = created_at if created_at is not None else time.time()
+        self.result: Optional[str] = None
+        # 最後一次失敗的 HTTP 狀態碼（連線錯誤為 None）
+        self.error_status: Optional[int] = None
+        # 最後一次失敗時 LINE 回傳的錯誤內容
+        self.error_body = None
+        self._done = threading.Event()
+        self._callbacks: List[Callable[["OutboundMessage"], None]] = []
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        等待發送結果
+
+        Returns:
+            "sent" / "dropped"，逾時（仍在重試）時為 None
+        """
+        self._done.wait(timeout)
+        return self.result
+
+    def add_done_callback(self, callback: Callable[["OutboundMessage"], None]):
+        """發送完成（成功或丟棄）時呼叫 callback(message)；已完成時立即呼叫"""
+        with _callback_lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self, result: str):
+        self.result = result
+        with _callback_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"推播 {self.to} 完成回調失敗: {e}")
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"retry_key": self.retry_key, "to": self.to, "text": self.text, "created_at": self.created_at}
+
+
+class OutboundQueue:
+    """
+    推播發送佇列
+
+    - Token Bucket 限制每秒呼叫 LINE 推播 API 的次數
+    - sender 回傳 Future 時 worker 不等待回應：送出後立即處理下一則，
+      回應抵達後交回 worker 完成或重試，在途數量只受限速與連線池限制
+    - 429、5xx 與連線錯誤以指數退避重試（429 優先採用 Retry-After）
+    - 其他 4xx 視為無法送達並丟棄；409 表示相同 Retry-Key 已被接受，視為成功
+    - 每則推播寫入本機日誌（JSON Lines），完成時寫入完成紀錄；
+      啟動時重播未完成的推播，並壓縮日誌
+    """
+
+    RESULT_SENT = "sent"
+    RESULT_DROPPED = "dropped"
+
+    def __init__(self, sender: Callable[[str, str, str], Any], journal_path: Optional[str] = None,
+                 rate_per_second: float = 100, workers: int = 4, max_retries: int = 5,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0, compact_every: int = 500):
+        """
+        初始化發送佇列
+
+        Args:
+            sender: 實際發送函數 sender(to, text, retry_key)，失敗時拋出例外；
+                    也可回傳 concurrent.futures.Future，由 Future 的結果決定成功或失敗
+            journal_path: 本機日誌路徑（None 表示不持久化）
+            rate_per_second: 每秒最多呼叫次數
+            workers: 發送 worker 數量
+            max_retries: 最多重試次數，超過後丟棄
+            base_backoff: 第一次重試的等待秒數
+            max_backoff: 重試等待上限
+            compact_every: 累積多少筆完成紀錄後壓縮日誌
+        """
+        self.sender = sender
+        self.journal_path = journal_path
+        self.rate_limiter = TokenBucket(rate_per_second)
+        self.worker_count = max(1, workers)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.compact_every = compact_every
+
+        self._heap: List = []
+        self._sequence = itertools.count()
+        self._pending: Dict[str, OutboundMessage] = {}
+        # 非同步送出後已收到回應、等待 worker 處理的推播：(推播, 例外或 None)
+        self._responses = deque()
+        self._condition = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._finished_since_compact = 0
+        self._workers = []
+        self._running = False
+
+        # 統計資料
+        self._in_flight = 0
+        self._sent = 0
+        self._retries = 0
+        self._dropped = 0
+        self._duplicates = 0
+        self._recovered = 0
+
+    # ===== 生命週期 =====
+
+    def start(self):
+        """載入日誌中未完成的推播並啟動 worker"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._recover()
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._run, name=f"outbound-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: float = 5.0):
+        """停止 worker；未完成的推播保留在日誌中，下次啟動時繼續發送"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    # ===== 發送 =====
+
+    def enqueue(self, to: str, text: str, retry_key: Optional[str] = None) -> OutboundMessage:
+        """
+        排入一則推播（寫入日誌後才會發送）
+
+        Args:
+            to: 目標 ID
+            text: 訊息內容
+            retry_key: 指定 X-Line-Retry-Key（None 時隨機產生）
+
+        Returns:
+            OutboundMessage: 可用 wait() 等待結果
+        """
+        message = OutboundMessage(to, text, retry_key)
+        # 寫入日誌與排入佇列在同一個鎖內，壓縮日誌時不會遺漏
+        with self._journal_lock:
+            self._write_journal({"op": "add", **message.to_record()})
+            self._schedule(message)
+        return message
+
+    def _schedule(self, message: OutboundMessage):
+        with self._condition:
+            self._pending[message.retry_key] = message
+            heapq.heappush(self._heap, (message.next_attempt_at, next(self._sequence), message))
+            self._condition.notify()
+
+    def _next_task(self):
+        """
+        取出下一個工作；停止時回傳 None
+
+        Returns:
+            (推播, None, False)：到期待送出的推播
+            (推播, 例外或 None, True)：已收到回應的非同步推播
+        """
+        with self._condition:
+            while self._running:
+                if self._responses:
+                    message, error = self._responses.popleft()
+                    return message, error, True
+                if self._heap:
+                    wait = self._heap[0][0] - time.time()
+                    if wait <= 0:
+                        _, _, message = heapq.heappop(self._heap)
+                        self._in_flight += 1
+                        return message, None, False
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+            return None
+
+    def _run(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            message, error, responded = task
+            if responded:
+                self._complete(message, error)
+            else:
+                self._attempt(message)
+
+    def _attempt(self, message: OutboundMessage):
+        self.rate_limiter.acquire()
+        message.attempts += 1
+        try:
+            result = self.sender(message.to, message.text, message.retry_key)
+        except Exception as e:
+            self._complete(message, e)
+            return
+        if isinstance(result, Future):
+            result.add_done_callback(lambda future: self._on_response(message, future))
+        else:
+            self._complete(message, None)
+
+    def _on_response(self, message: OutboundMessage, future: Future):
+        """非同步推播收到回應（在事件迴圈執行緒）：交回 worker 處理，避免在事件迴圈內寫入日誌或執行回調"""
+        error = CancelledError() if future.cancelled() else future.exception()
+        with self._condition:
+            self._responses.append((message, error))
+            self._condition.notify()
+
+    def _complete(self, message: OutboundMessage, error: Optional[BaseException]):
+        """依發送結果完成、重試或丟棄推播"""
+        try:
+            if error is None:
+                self._finish(message, self.RESULT_SENT)
+            else:
+                self._handle_error(message, error)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+
+    def _handle_error(self, message: OutboundMessage, e: BaseException):
+        """處理發送失敗：409 視為已送達，可重試的錯誤退避後重新排入，其餘丟棄"""
+        status = getattr(e, 'status', None)
+        message.error_status = status
+        message.error_body = getattr(e, 'body', None)
+        if status == 409:
+            # 相同 Retry-Key 的請求已被接受（例如上次回應逾時），不會重複送達
+            with self._condition:
+                self._duplicates += 1
+            self._finish(message, self.RESULT_SENT)
+        elif self._is_retryable(status) and message.attempts <= self.max_retries:
+            delay = self._backoff(message.attempts, e)
+            logger.warning(f"推播 {message.to} 失敗（{status or e}），{delay:.1f} 秒後第 {message.attempts} 次重試")
+            with self._condition:
+                self._retries += 1
+            message.next_attempt_at = time.time() + delay
+            self._schedule(message)
+        else:
+            logger.error(f"推播 {message.to} 失敗，放棄發送（嘗試 {message.attempts} 次）: {e}")
+            self._finish(message, self.RESULT_DROPPED)
+
+    @staticmethod
+    def _is_retryable(status: Optional[int]) -> bool:
+        """429、5xx 與沒有狀態碼的連線錯誤可以重試"""
+        return status is None or status == 429 or status >= 500
+
+    def _backoff(self, attempts: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.base_backoff * (2 ** (attempts - 1)), self.max_backoff)
+        # 加入抖動，避免同一批重試同時送出
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, message: OutboundMessage, result: str):
+        with self._condition:
+            self._pending.pop(message.retry_key, None)
+            if result == self.RESULT_SENT:
+                self._sent += 1
+            else:
+                self._dropped += 1
+            self._finished_since_compact += 1
+            compact = self._finished_since_compact >= self.compact_every
+            if compact:
+                self._finished_since_compact = 0
+        self._append_journal({"op": "done", "retry_key": message.retry_key, "result": result})
+        message.finish(result)
+        if compact:
+            self._compact()
+
+    # ===== 本機日誌 =====
+
+    def _append_journal(self, record: Dict[str, Any]):
+        with self._journal_lock:
+            self._write_journal(record)
+
+    def _write_journal(self, record: Dict[str, Any]):
+        """寫入一筆日誌（呼叫端需持有 _journal_lock）"""
+        if not self.journal_path:
+            return
+        try:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal.flush()
+        except OSError as e:
+            logger.error(f"寫入推播日誌失敗: {e}")
+
+    def _recover(self):
+        """重播日誌中尚未完成的推播"""
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        pending: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 寫入到一半中斷的最後一行
+                        continue
+                    if record.get("op") == "add":
+                        pending[record["retry_key"]] = record
+                    elif record.get("op") == "done":
+                        pending.pop(record.get("retry_key"), None)
+        except OSError as e:
+            logger.error(f"讀取推播日誌失敗: {e}")
+            return
+
+        for record in pending.values():
+            self._schedule(OutboundMessage(record["to"], record["text"], record["retry_key"],
+                                           created_at=record.get("created_at")))
+        self._recovered += len(pending)
+        if pending:
+            print(f"📮 從日誌恢復 {len(pending)} 則未完成的推播")
+        self._compact()
+
+    def _compact(self):
+        """以目前未完成的推播重寫日誌"""
+        if not self.journal_path:
+            return
+        with self._journal_lock:
+            with self._condition:
+                records = [message.to_record() for message in self._pending.values()]
+            try:
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+                tmp_path = self.journal_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps({"op": "add", **record}, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.journal_path)
+            except OSError as e:
+                logger.error(f"壓縮推播日誌失敗: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得佇列統計"""
+        with self._condition:
+            return {
+                "depth": len(self._pending),
+                "in_flight": self._in_flight,
+                "sent": self._sent,
+                "retries": self._retries,
+                "dropped": self._dropped,
+                "duplicates": self._duplicates,
+                "recovered": self._recovered,
+                "rate_per_second": self.rate_limiter.rate,
+                "journal": self.journal_path,
+            }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """取得 429 回應的 Retry-After 秒數"""
+    headers = getattr(error, 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
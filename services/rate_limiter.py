@@ -0,0 +1,79 @@
+"""
+速率限制
+以 Token Bucket 控制每秒呼叫 LINE API 的次數
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token Bucket 速率限制器（執行緒安全）
+
+    每秒補充 rate 個 token，最多累積 capacity 個；
+    每次呼叫取用一個 token，沒有 token 時等待補充。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        初始化速率限制器
+
+        Args:
+            rate: 每秒補充的 token 數量
+            capacity: 最多累積的 token 數量（預設與 rate 相同，即最多一秒的突發量）
+        """
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(float(capacity if capacity is not None else rate), 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """立即取用 token，不足時回傳 False"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        取用 token，不足時等待
+
+        Args:
+            tokens: 要取用的數量
+            timeout: 最長等待秒數，None 表示一直等待
+
+        Returns:
+            bool: 是否取得
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def available(self) -> float:
+        """目前可用的 token 數量"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
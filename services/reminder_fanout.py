@@ -0,0 +1,202 @@
+"""
+提醒分派執行器
+同一時段的大量群組提醒以固定數量的 worker 並行推播（限速由推播發送佇列負責）
+"""
+
+import inspect
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.latency_stats import summarize
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderWave:
+    """同一個時段觸發的一批提醒"""
+
+    def __init__(self, wave_id: int, label: str, scheduled_time: datetime, total: int):
+        self.wave_id = wave_id
+        self.label = label
+        self.scheduled_time = scheduled_time
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.lag_seconds: List[float] = []
+        self.completed_at: Optional[datetime] = None
+
+    @property
+    def done(self) -> bool:
+        return self.sent + self.failed >= self.total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "wave_id": self.wave_id,
+            "label": self.label,
+            "scheduled_time": self.scheduled_time.isoformat(),
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "completed": self.done,
+            "lag_seconds": summarize(self.lag_seconds),
+        }
+
+
+class ReminderFanout:
+    """
+    提醒分派執行器
+
+    - 依排定時間排序（PriorityQueue），較早的時段先推播
+    - 固定數量的 worker 並行呼叫推播函數；每秒推播上限只由 OutboundQueue 控制，
+      這裡不再另外限速，避免兩層限速疊加
+    - 推播函數接受 on_complete 參數時只排入發送佇列、不等待結果，worker 立即處理下一個群組，
+      推播完成時才記錄成功與延遲；重試退避不會佔住 worker
+    - 記錄每個群組從排定時間到推播成功的延遲，並以批次（wave）彙整
+    """
+
+    def __init__(self, workers: int = 8, wave_history: int = 20):
+        """
+        初始化提醒分派執行器
+
+        Args:
+            workers: 並行推播的 worker 數量
+            wave_history: 保留最近幾批的統計
+        """
+        self.worker_count = max(1, workers)
+        self._queue: "queue.PriorityQueue[Tuple[float, int, Any]]" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._wave_ids = itertools.count(1)
+        self._waves = deque(maxlen=max(1, wave_history))
+        self._lock = threading.Lock()
+        self._workers = []
+        self._running = False
+        # 推播函數是否接受 on_complete（依函數快取）
+        self._async_callbacks: Dict[Any, bool] = {}
+
+    def start(self):
+        """啟動 worker 執行緒"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for i in range(self.worker_count):
+                worker = threading.Thread(target=self._run, name=f"reminder-fanout-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout: float = 5.0):
+        """停止 worker（已排入的提醒會先推播完，每個 worker 最多等待 timeout 秒）"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put((float('inf'), next(self._sequence), None))
+        for worker in workers:
+            worker.join(timeout=timeout)
+
+    def submit(self, targets: Iterable[Tuple[str, Callable]], scheduled_time: datetime, label: str = "") -> ReminderWave:
+        """
+        排入一批提醒
+
+        Args:
+            targets: (群組ID, 推播函數) 列表，推播函數以 callback(group_id, scheduled_time) 呼叫
+            scheduled_time: 排定的觸發時間（含時區）
+            label: 批次名稱（例如時段）
+
+        Returns:
+            ReminderWave: 此批次的統計物件
+        """
+        targets = list(targets)
+        wave = ReminderWave(next(self._wave_ids), label, scheduled_time, len(targets))
+        with self._lock:
+            self._waves.append(wave)
+
+        priority = scheduled_time.timestamp()
+        for group_id, callback in targets:
+            self._queue.put((priority, next(self._sequence), (wave, group_id, callback)))
+        return wave
+
+    def pending(self) -> int:
+        """尚未推播的提醒數量"""
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            _, _, item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._deliver(*item)
+            finally:
+                self._queue.task_done()
+
+    def _accepts_on_complete(self, callback: Callable) -> bool:
+        accepts = self._async_callbacks.get(callback)
+        if accepts is None:
+            try:
+                accepts = "on_complete" in inspect.signature(callback).parameters
+            except (TypeError, ValueError):
+                accepts = False
+            self._async_callbacks[callback] = accepts
+        return accepts
+
+    def _deliver(self, wave: ReminderWave, group_id: str, callback: Callable):
+        try:
+            if self._accepts_on_complete(callback):
+                ok = callback(group_id, wave.scheduled_time,
+                              on_complete=lambda sent: self._record(wave, group_id, sent))
+                if ok is None:
+                    # 已排入發送佇列，完成時才記錄
+                    return
+            else:
+                ok = callback(group_id, wave.scheduled_time)
+        except Exception as e:
+            logger.error(f"群組 {group_id} 提醒推播失敗: {e}")
+            ok = False
+        self._record(wave, group_id, ok)
+
+    def _record(self, wave: ReminderWave, group_id: str, ok: bool):
+        """記錄一個群組的推播結果，整批完成時輸出摘要"""
+        with self._lock:
+            if ok:
+                wave.sent += 1
+                now = datetime.now(wave.scheduled_time.tzinfo)
+                wave.lag_seconds.append((now - wave.scheduled_time).total_seconds())
+            else:
+                wave.failed += 1
+            finished = wave.done and wave.completed_at is None
+            if finished:
+                wave.completed_at = datetime.now(wave.scheduled_time.tzinfo)
+
+        if finished:
+            lag = summarize(wave.lag_seconds)
+            print(f"📨 提醒批次 {wave.label} 完成 | 成功 {wave.sent} | 失敗 {wave.failed} | "
+                  f"延遲 p50 {lag['p50']}s / p95 {lag['p95']}s / max {lag['max']}s")
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已排入的提醒推播完畢（測試與關閉時使用）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得分派統計"""
+        with self._lock:
+            waves = [wave.to_dict() for wave in self._waves]
+        return {
+            "workers": self.worker_count,
+            "pending": self.pending(),
+            "waves": waves,
+        }
+
@@ -0,0 +1,169 @@
+"""
+提醒發送紀錄
+記錄每個群組在每天每個時段是否已發送提醒，避免重啟或補發時重複推播
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (群組ID, 時段 "HH:MM")
+LedgerKey = Tuple[str, str]
+
+
+def reminder_retry_key(group_id: str, target_date: date, slot: str) -> str:
+    """
+    由 (群組, 日期, 時段) 產生固定的 X-Line-Retry-Key
+
+    不同副本或重啟後送出同一個提醒時使用相同的 key，LINE 只會送達一次
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"reminder:{group_id}:{target_date.isoformat()}:{slot}"))
+
+
+class ReminderLedger:
+    """
+    提醒發送紀錄
+
+    - 記憶體中以 {日期: {(群組, 時段)}} 保存，查詢為 O(1)
+    - 每筆成功發送附加一行到本機檔案（JSON Lines），啟動時載入
+    - 發送前先 claim() 佔位，成功後 commit()，失敗時 release()，
+      同一個提醒同時只會有一次推播在進行
+    - 超過保留天數的紀錄在日期變更時自動清除，並壓縮檔案
+    """
+
+    def __init__(self, path: Optional[str] = None, keep_days: int = 7):
+        """
+        初始化發送紀錄
+
+        Args:
+            path: 本機檔案路徑（None 表示只保存在記憶體）
+            keep_days: 保留最近幾天的紀錄
+        """
+        self.path = path
+        self.keep_days = max(1, keep_days)
+        self._sent: Dict[date, Set[LedgerKey]] = {}
+        self._in_flight: Set[Tuple[date, str, str]] = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._pruned_for: Optional[date] = None
+        self.skipped = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        day = date.fromisoformat(record["d"])
+                    except (ValueError, KeyError):
+                        continue
+                    self._sent.setdefault(day, set()).add((record["g"], record["s"]))
+        except OSError as e:
+            logger.error(f"讀取提醒發送紀錄失敗: {e}")
+
+    def was_sent(self, group_id: str, target_date: date, slot: str) -> bool:
+        """提醒是否已發送"""
+        with self._lock:
+            return (group_id, slot) in self._sent.get(target_date, ())
+
+    def claim(self, group_id: str, target_date: date, slot: str) -> bool:
+        """
+        佔用一次發送
+
+        Returns:
+            bool: False 表示已發送過或正在發送，不應再推播
+        """
+        key = (target_date, group_id, slot)
+        with self._lock:
+            if (group_id, slot) in self._sent.get(target_date, ()) or key in self._in_flight:
+                self.skipped += 1
+                return False
+            self._in_flight.add(key)
+            return True
+
+    def commit(self, group_id: str, target_date: date, slot: str):
+        """記錄發送成功"""
+        with self._lock:
+            self._in_flight.discard((target_date, group_id, slot))
+            self._sent.setdefault(target_date, set()).add((group_id, slot))
+            self._prune_if_needed(target_date)
+            self._append({"g": group_id, "d": target_date.isoformat(), "s": slot})
+
+    def release(self, group_id: str, target_date: date, slot: str):
+        """發送失敗，釋放佔用（之後可以重試或補發）"""
+        with self._lock:
+            self._in_flight.discard((target_date, group_id, slot))
+
+    def _append(self, record: Dict[str, str]):
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        except OSError as e:
+            logger.error(f"寫入提醒發送紀錄失敗: {e}")
+
+    def _prune_if_needed(self, today: date):
+        """日期變更時清除過期紀錄（呼叫端需持有鎖）"""
+        if self._pruned_for is not None and today <= self._pruned_for:
+            return
+        self._pruned_for = today
+        cutoff = today - timedelta(days=self.keep_days)
+        expired = [day for day in self._sent if day < cutoff]
+        if not expired:
+            return
+        for day in expired:
+            del self._sent[day]
+        self._rewrite()
+
+    def prune(self, today: date):
+        """清除超過保留天數的紀錄"""
+        with self._lock:
+            self._pruned_for = None
+            self._prune_if_needed(today)
+
+    def _rewrite(self):
+        """以目前保留的紀錄重寫檔案"""
+        if not self.path:
+            return
+        try:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for day in sorted(self._sent):
+                    for group_id, slot in sorted(self._sent[day]):
+                        f.write(json.dumps({"g": group_id, "d": day.isoformat(), "s": slot}, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"壓縮提醒發送紀錄失敗: {e}")
+
+    def close(self):
+        """關閉檔案"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得紀錄統計"""
+        with self._lock:
+            return {
+                "days": {str(day): len(keys) for day, keys in sorted(self._sent.items())},
+                "in_flight": len(self._in_flight),
+                "skipped_duplicates": self.skipped,
+                "path": self.path,
+            }
@@ -0,0 +1,119 @@
+"""
+編譯後的輪值表
+把群組的輪值資料、基準日期與推播日預先整理成緊湊的結構，查詢某天的負責人只需整數運算
+"""
+
+import sys
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+WEEKDAY_NUMBERS = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6}
+
+# 沒有推播日設定時，每天都由當週第一位成員負責
+_NO_SCHEDULE = (0,) * 7
+
+
+class CompiledRotation:
+    """
+    單一群組的輪值表
+
+    - members：去重並 intern 的成員名稱表
+    - weeks：每個輪值週對應的成員索引（週數依 "1".."N" 排列，缺少的週為空）
+    - week_lists：每週的成員列表，查詢時直接回傳，不另外配置
+    - base_monday：基準日期所在週星期一的序數（date.toordinal）
+    - day_mask：推播日的星期位元遮罩（bit 0 = 週一）
+    - day_index：星期 -> 該日在推播日設定中的順序（-1 表示不是推播日）
+    - versions：編譯時的 (成員資料版本, 排程版本)
+    """
+
+    __slots__ = ('members', 'weeks', 'week_lists', 'base_monday', 'day_mask', 'day_index', 'versions')
+
+    def __init__(self, members: Tuple[str, ...], weeks: Tuple[Tuple[int, ...], ...],
+                 base_monday: int, day_mask: int, day_index: Tuple[int, ...], versions: Tuple[int, int]):
+        self.members = members
+        self.weeks = weeks
+        self.week_lists = tuple([members[i] for i in week] for week in weeks)
+        self.base_monday = base_monday
+        self.day_mask = day_mask
+        self.day_index = day_index
+        self.versions = versions
+
+    def week_slot(self, target_date: date) -> int:
+        """目標日期所在自然週對應的輪值週（0 起算）"""
+        target_monday = target_date.toordinal() - target_date.weekday()
+        return (target_monday - self.base_monday) // 7 % len(self.weeks)
+
+    def current_group(self, target_date: date) -> List[str]:
+        """目標日期所在週的成員"""
+        return self.week_lists[self.week_slot(target_date)]
+
+    def is_broadcast_day(self, target_date: date) -> bool:
+        """目標日期是否為推播日"""
+        return bool(self.day_mask >> target_date.weekday() & 1)
+
+    def duty_member(self, target_date: date) -> Optional[str]:
+        """目標日期負責的成員；不是推播日或當週沒有成員時為 None"""
+        members = self.week_lists[self.week_slot(target_date)]
+        if not members:
+            return None
+        position = self.day_index[target_date.weekday()]
+        if position < 0:
+            return None
+        return members[position % len(members)]
+
+
+def compile_days(schedule: Optional[Dict[str, Any]]) -> Tuple[int, Tuple[int, ...]]:
+    """
+    將排程設定的推播日轉為 (位元遮罩, 星期 -> 推播順序)
+
+    與原本的規則相同：沒有設定或格式不正確時每天都回傳當週第一位成員；
+    同一天重複出現時以第一次出現的順序為準
+    """
+    days = schedule.get('days') if schedule else None
+    if isinstance(days, str):
+        days = [d.strip() for d in days.split(',')]
+    elif not isinstance(days, list):
+        return 0b1111111, _NO_SCHEDULE
+
+    day_index = [-1] * 7
+    mask = 0
+    for position, name in enumerate(days):
+        weekday = WEEKDAY_NUMBERS.get(name)
+        if weekday is not None and day_index[weekday] < 0:
+            day_index[weekday] = position
+            mask |= 1 << weekday
+    return mask, tuple(day_index)
+
+
+def compile_rotation(group_data: Dict[str, List[str]], base_date: date,
+                     schedule: Optional[Dict[str, Any]], versions: Tuple[int, int] = (0, 0)) -> Optional[CompiledRotation]:
+    """
+    編譯群組的輪值表
+
+    Args:
+        group_data: {"1": [成員...], "2": [...]} 週數 -> 成員
+        base_date: 基準日期
+        schedule: 群組排程設定（None 表示沒有排程）
+        versions: 編譯時的資料版本
+
+    Returns:
+        CompiledRotation，沒有輪值資料時為 None
+    """
+    if not isinstance(group_data, dict) or not group_data:
+        return None
+
+    member_ids: Dict[str, int] = {}
+    weeks = []
+    # 週數為輪值資料的筆數，第 N 週讀取鍵 "N"（與原本的計算方式相同）
+    for week in range(1, len(group_data) + 1):
+        indexes = []
+        for name in group_data.get(str(week)) or ():
+            if name not in member_ids:
+                member_ids[name] = len(member_ids)
+            indexes.append(member_ids[name])
+        weeks.append(tuple(indexes))
+
+    members = tuple(sys.intern(name) if isinstance(name, str) else name for name in member_ids)
+    day_mask, day_index = compile_days(schedule)
+    base_monday = base_date.toordinal() - base_date.weekday()
+    return CompiledRotation(members, tuple(weeks), base_monday, day_mask, day_index, versions)
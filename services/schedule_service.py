@@ -3,9 +3,12 @@
 封裝推播排程相關的業務邏輯
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 from datetime import datetime
 
+from services.slot_dispatcher import SlotDispatcher
+from services.state_version import StateVersion
+
 
 class ScheduleService:
     """
@@ -25,19 +28,32 @@ class ScheduleService:
     
     VALID_DAYS = {'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'}
     
-    def __init__(self, data_manager, scheduler=None, group_jobs: dict = None):
+    # 追蹤提醒最長間隔（一天）
+    MAX_FOLLOWUP_MINUTES = 24 * 60
+    
+    def __init__(self, data_manager, scheduler=None, group_jobs: dict = None, fanout=None,
+                 misfire_grace_time: int = 300):
         """
         初始化排程服務
         
         Args:
             data_manager: DataManager 實例
             scheduler: APScheduler BackgroundScheduler 實例
-            group_jobs: 群組排程任務字典
+            group_jobs: 群組排程任務字典（值為 SlotHandle）
+            fanout: ReminderFanout 實例，時段觸發時並行推播
+            misfire_grace_time: 排程器延遲多少秒內仍執行時段任務
         """
         self.data_manager = data_manager
         self.scheduler = scheduler
         self.group_jobs = group_jobs if group_jobs is not None else {}
+        # 相同時段的群組共用一個排程任務
+        self.dispatcher = SlotDispatcher(scheduler, fanout=fanout, misfire_grace_time=misfire_grace_time) if scheduler else None
         self._group_schedules = None
+        self.state_version = StateVersion()
+    
+    def get_state_version(self, group_id: str = None) -> int:
+        """取得群組排程的狀態版本號（每次變更都會遞增）"""
+        return self.state_version.get(group_id)
     
     @property
     def group_schedules(self) -> dict:
@@ -49,42 +65,117 @@ class ScheduleService:
     @group_schedules.setter
     def group_schedules(self, value: dict):
         self._group_schedules = value
+        self.state_version.bump()
     
     def reload_data(self):
         """重新載入資料"""
         self._group_schedules = None
+        self.state_version.bump()
     
-    def initialize_jobs(self, reminder_callback):
+    def refresh_jobs(self, reminder_callback) -> Set[str]:
+        """
+        重新讀取排程設定，只讓有變更的群組失效並重新註冊其時段
+        
+        多個副本共用資料時使用：其他副本以 @cron、@time 等變更的排程，
+        以及 @suspended revive 解除的暫停，在主節點上生效
+        
+        Args:
+            reminder_callback: 發送提醒的回調函數
+            
+        Returns:
+            Set[str]: 排程設定有變更的群組
+        """
+        schedules = self.data_manager.load_data('group_schedules', {}) or {}
+        # 尚未載入時沒有快取也沒有註冊，不需要比對
+        old = self._group_schedules if self._group_schedules is not None else schedules
+        changed = {gid for gid in set(old) | set(schedules) if old.get(gid) != schedules.get(gid)}
+        self._group_schedules = schedules
+        for group_id in changed:
+            self.state_version.bump(group_id)
+            if self.dispatcher is None:
+                continue
+            config = schedules.get(group_id)
+            if config and not config.get("suspended"):
+                days = config.get("days", "mon,thu")
+                hour = config.get("hour", 17)
+                minute = config.get("minute", 10)
+                if self._validate_schedule_params(days, hour, minute)["valid"]:
+                    self.group_jobs[group_id] = self.dispatcher.register(group_id, days, hour, minute, reminder_callback)
+                    continue
+            # 已刪除、暫停或設定無效：移除時段
+            job = self.group_jobs.pop(group_id, None)
+            if job is not None:
+                job.remove()
+            else:
+                self.dispatcher.unregister(group_id)
+        return changed
+    
+    def initialize_jobs(self, reminder_callback) -> int:
         """
         初始化所有現有的排程任務
         
+        啟動時使用：直接依已載入的設定註冊時段，不讀取排程資訊也不寫回 Firebase
+        
         Args:
             reminder_callback: 發送提醒的回調函數
+            
+        Returns:
+            int: 註冊的群組數量
         """
-        if not self.group_schedules:
-            return
+        if not self.group_schedules or not self.dispatcher:
+            return 0
             
         print(f"正在初始化 {len(self.group_schedules)} 個群組排程...")
+        registered = 0
+        suspended = 0
         for group_id, config in self.group_schedules.items():
+            # 推播持續失敗而暫停的群組不註冊，由 DeliveryHealth 探測後恢復
+            if config.get("suspended"):
+                suspended += 1
+                continue
             days = config.get("days", "mon,thu")
             hour = config.get("hour", 17)
             minute = config.get("minute", 10)
             
-            # 使用 update_schedule 來重建任務
-            self.update_schedule(group_id, days, hour, minute, reminder_callback)
+            validation_result = self._validate_schedule_params(days, hour, minute)
+            if not validation_result["valid"]:
+                print(f"⚠️ 群組 {group_id} 排程設定無效，略過: {validation_result['message']}")
+                continue
+            
+            self.group_jobs[group_id] = self.dispatcher.register(group_id, days, hour, minute, reminder_callback)
+            registered += 1
+        if suspended:
+            print(f"⏸️ {suspended} 個群組的排程暫停中，未註冊")
+        return registered
             
-    def ensure_default_schedules(self, group_ids: list, reminder_callback):
+    def ensure_default_schedules(self, group_ids: list, reminder_callback) -> int:
         """
         確保所有已知的群組都有預設排程
         
+        只有實際新增預設排程時才寫入 Firebase，且只寫入一次
+        
         Args:
             group_ids: 所有已知群組 ID 列表
             reminder_callback: 發送提醒的回調函數
+            
+        Returns:
+            int: 新增預設排程的群組數量
         """
-        for gid in group_ids:
-            if gid not in self.group_schedules:
-                print(f"為群組 {gid} 設定預設排程")
-                self.update_schedule(gid, "mon,thu", 17, 10, reminder_callback)
+        group_schedules = self.group_schedules
+        missing = [gid for gid in group_ids if gid not in group_schedules]
+        if not missing:
+            return 0
+        
+        for gid in missing:
+            print(f"為群組 {gid} 設定預設排程")
+            group_schedules[gid] = {"days": "mon,thu", "hour": 17, "minute": 10}
+            if self.dispatcher and reminder_callback:
+                self.group_jobs[gid] = self.dispatcher.register(gid, "mon,thu", 17, 10, reminder_callback)
+        
+        self._group_schedules = group_schedules
+        self.state_version.bump()
+        self.data_manager.save_data('group_schedules', group_schedules)
+        return len(missing)
             
     def get_schedule_info(self, group_id: str = None) -> Dict[str, Any]:
         """
@@ -102,10 +193,14 @@ class ScheduleService:
             return self._get_all_schedules_info()
     
     def _get_group_schedule_info(self, group_id: str) -> Dict[str, Any]:
-        """取得特定群組的排程資訊"""
-        job = self.group_jobs.get(group_id)
+        """
+        取得特定群組的排程資訊
+        
+        以排程設定為準：暫停中的群組沒有排程任務，但仍是已設定（suspended 欄位記錄暫停資訊）
+        """
+        schedule_config = self.group_schedules.get(group_id)
         
-        if not job:
+        if not schedule_config:
             return {
                 "is_configured": False,
                 "message": f"群組 {group_id} 排程未設定",
@@ -115,10 +210,15 @@ class ScheduleService:
             }
         
         try:
-            next_run = job.next_run_time
-            next_run_str = next_run.strftime('%Y-%m-%d %H:%M:%S %Z') if next_run else "未知"
-            
-            schedule_config = self.group_schedules.get(group_id, {})
+            suspended = schedule_config.get("suspended")
+            job = self.group_jobs.get(group_id)
+            if suspended:
+                next_run_str = "暫停中"
+            elif job is None:
+                next_run_str = "未註冊"
+            else:
+                next_run = job.next_run_time
+                next_run_str = next_run.strftime('%Y-%m-%d %H:%M:%S %Z') if next_run else "未知"
             
             schedule_details = {
                 "timezone": "Asia/Taipei",
@@ -130,9 +230,10 @@ class ScheduleService:
             
             return {
                 "is_configured": True,
-                "message": f"群組 {group_id} 排程已設定",
+                "message": f"群組 {group_id} 排程已設定" + ("（暫停中）" if suspended else ""),
                 "next_run_time": next_run_str,
                 "schedule_details": schedule_details,
+                "suspended": suspended,
                 "group_id": group_id
             }
             
@@ -171,63 +272,55 @@ class ScheduleService:
             reminder_callback: 發送提醒的回調函數
             
         Returns:
-            操作結果
+            操作結果（暫停中的群組不變更，需先以 @suspended revive 恢復）
         """
         try:
-            # 取得目前設定
-            current_info = self.get_schedule_info(group_id)
+            # 目前設定以排程設定為準（暫停中的群組沒有排程任務）
+            current = self.group_schedules.get(group_id) or {}
+            if current.get("suspended"):
+                return {
+                    "success": False,
+                    "message": "群組因推播持續無法送達而暫停排程，請先使用 @suspended revive 恢復後再調整",
+                }
             
             # 使用提供的參數或保持目前設定
             if days is None:
-                days = current_info["schedule_details"]["days"] if current_info["is_configured"] else "mon,thu"
+                days = current.get("days", "mon,thu")
             if hour is None:
-                hour = current_info["schedule_details"]["hour"] if current_info["is_configured"] else 17
+                hour = current.get("hour", 17)
             if minute is None:
-                minute = current_info["schedule_details"]["minute"] if current_info["is_configured"] else 10
+                minute = current.get("minute", 10)
             
             # 驗證參數
             validation_result = self._validate_schedule_params(days, hour, minute)
             if not validation_result["valid"]:
                 return {"success": False, "message": validation_result["message"]}
             
-            # 移除舊排程
-            if group_id in self.group_jobs:
-                self.group_jobs[group_id].remove()
-                del self.group_jobs[group_id]
-            
-            # 建立新排程
-            if self.scheduler and reminder_callback:
-                import pytz
-                from apscheduler.triggers.cron import CronTrigger
-                
-                job = self.scheduler.add_job(
-                    lambda: reminder_callback(group_id),
-                    CronTrigger(
-                        day_of_week=days,
-                        hour=hour,
-                        minute=minute,
-                        timezone=pytz.timezone('Asia/Taipei')
-                    )
-                )
+            # 建立新排程：註冊到時段分派器（已註冊的群組直接移動時段）
+            if self.dispatcher and reminder_callback:
+                job = self.dispatcher.register(group_id, days, hour, minute, reminder_callback)
                 self.group_jobs[group_id] = job
-                # Debug job object
-                # print(f"DEBUG JOB: {dir(job)}")
-                if hasattr(job, 'next_run_time'):
-                    next_run = job.next_run_time.strftime('%Y-%m-%d %H:%M:%S %Z') if job.next_run_time else "未知"
-                else:
-                    next_run = "無法取得 (屬性缺失)"
+                next_run = job.next_run_time.strftime('%Y-%m-%d %H:%M:%S %Z') if job.next_run_time else "未知"
             else:
+                # 移除舊排程
+                if group_id in self.group_jobs:
+                    self.group_jobs[group_id].remove()
+                    del self.group_jobs[group_id]
                 next_run = "排程器未初始化"
             
             # 儲存排程設定
             group_schedules = self.group_schedules
-            group_schedules[group_id] = {
+            # 保留時段以外的設定（例如追蹤提醒分鐘數）
+            config = dict(group_schedules.get(group_id) or {})
+            config.update({
                 "days": days,
                 "hour": hour,
                 "minute": minute
-            }
-            self.group_schedules = group_schedules
-            self.data_manager.save_data('group_schedules', group_schedules)
+            })
+            group_schedules[group_id] = config
+            self._group_schedules = group_schedules
+            self.state_version.bump(group_id)
+            self.data_manager.save_data('group_schedules', group_schedules, group_id=group_id)
             
             return {
                 "success": True,
@@ -245,6 +338,100 @@ class ScheduleService:
             traceback.print_exc()
             return {"success": False, "message": f"更新排程失敗: {str(e)}", "error": str(e)}
     
+    def remove_schedule(self, group_id: str) -> Dict[str, int]:
+        """
+        移除群組的排程設定與排程任務
+        
+        Returns:
+            Dict[str, int]: 各項實際移除的數量
+        """
+        freed = {"schedule": 0, "jobs": 0}
+        job = self.group_jobs.pop(group_id, None)
+        if job is not None:
+            job.remove()
+            freed["jobs"] = 1
+        elif self.dispatcher and self.dispatcher.unregister(group_id):
+            freed["jobs"] = 1
+        
+        group_schedules = self.group_schedules
+        if group_id in group_schedules:
+            del group_schedules[group_id]
+            self._group_schedules = group_schedules
+            self.state_version.bump(group_id)
+            self.data_manager.save_data('group_schedules', group_schedules, group_id=group_id)
+            freed["schedule"] = 1
+        return freed
+    
+    def register_group(self, group_id: str, reminder_callback) -> bool:
+        """
+        依目前的排程設定註冊群組的排程任務（不寫入設定）
+        
+        Returns:
+            bool: 是否已註冊（沒有設定或排程器未初始化時為 False）
+        """
+        config = self.group_schedules.get(group_id)
+        if not config or not self.dispatcher:
+            return False
+        self.group_jobs[group_id] = self.dispatcher.register(
+            group_id, config.get("days", "mon,thu"), config.get("hour", 17), config.get("minute", 10),
+            reminder_callback,
+        )
+        return True
+    
+    def set_suspension(self, group_id: str, info: Optional[Dict[str, Any]]):
+        """寫入群組的暫停狀態（None 表示解除），不變更排程任務"""
+        group_schedules = self.group_schedules
+        if group_id not in group_schedules:
+            return
+        config = dict(group_schedules[group_id])
+        if info is None:
+            if "suspended" not in config:
+                return
+            config.pop("suspended")
+        else:
+            config["suspended"] = info
+        group_schedules[group_id] = config
+        self._group_schedules = group_schedules
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('group_schedules', group_schedules, group_id=group_id)
+    
+    def suspend_group(self, group_id: str, info: Dict[str, Any]):
+        """暫停群組：移除排程任務並記錄暫停狀態（保留排程設定以便恢復）"""
+        job = self.group_jobs.pop(group_id, None)
+        if job is not None:
+            job.remove()
+        self.set_suspension(group_id, info)
+    
+    def get_followup_minutes(self, group_id: str) -> int:
+        """取得群組的追蹤提醒分鐘數（0 表示停用）"""
+        config = self.group_schedules.get(group_id) or {}
+        return int(config.get("followup_minutes") or 0)
+    
+    def set_followup_minutes(self, group_id: str, minutes: int) -> Dict[str, Any]:
+        """
+        設定群組的追蹤提醒分鐘數
+        
+        Args:
+            group_id: 群組ID
+            minutes: 提醒後幾分鐘沒有人回報完成就再提醒一次（0 表示停用）
+        """
+        if minutes < 0 or minutes > self.MAX_FOLLOWUP_MINUTES:
+            return {"success": False, "message": f"追蹤提醒分鐘數需介於 0-{self.MAX_FOLLOWUP_MINUTES}"}
+        group_schedules = self.group_schedules
+        if group_id not in group_schedules:
+            return {"success": False, "message": "請先使用 @cron 設定推播排程"}
+        
+        config = dict(group_schedules[group_id])
+        if minutes:
+            config["followup_minutes"] = minutes
+        else:
+            config.pop("followup_minutes", None)
+        group_schedules[group_id] = config
+        self._group_schedules = group_schedules
+        self.state_version.bump(group_id)
+        self.data_manager.save_data('group_schedules', group_schedules, group_id=group_id)
+        return {"success": True, "minutes": minutes}
+    
     def _validate_schedule_params(self, days: str, hour: int, minute: int) -> Dict[str, Any]:
         """驗證排程參數"""
         if not isinstance(hour, int) or not (0 <= hour <= 23):
@@ -298,6 +485,8 @@ class ScheduleService:
         time_str = f"{hour:02d}:{minute:02d}"
         
         next_run = info.get("next_run_time", "未知")
+        suspended = (self.group_schedules.get(group_id) or {}).get("suspended")
+        status = "⏸️ 排程狀態: 暫停中（推播持續無法送達）" if suspended else "✅ 排程狀態: 已啟動"
         
         return f"""📅 群組垃圾輪值排程
 
@@ -305,7 +494,7 @@ class ScheduleService:
 📆 執行星期: {days_chinese}
 ⏰ 下次執行: {next_run}
 
-✅ 排程狀態: 已啟動"""
+{status}"""
     
     def _get_all_schedules_summary(self) -> str:
         """取得所有群組的排程摘要"""
@@ -0,0 +1,196 @@
+"""
+推播計畫
+在每天開始前預先產生當天所有群組的 (群組, 觸發時間, 提醒文字)，觸發時只需推播
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+class PlanEntry:
+    """計畫中的一筆推播"""
+
+    __slots__ = ('group_id', 'fire_time', 'text', 'versions')
+
+    def __init__(self, group_id: str, fire_time: datetime, text: Optional[str], versions: Tuple[int, int]):
+        self.group_id = group_id
+        self.fire_time = fire_time
+        self.text = text
+        # (成員資料版本, 排程版本)，任一變更即視為過期
+        self.versions = versions
+
+
+class SendPlanner:
+    """
+    推播計畫產生器
+
+    - 每天開始前（預設 23:50）產生隔天所有推播日群組的計畫，啟動時產生當天的計畫
+    - 每筆計畫記錄產生時的成員資料與排程版本；輪值表、排程或文案變更後，
+      該群組下次被讀取時才重新產生，不需重建整份計畫
+    """
+
+    def __init__(self, member_service, schedule_service, render: Callable[[str, date], Optional[str]],
+                 timezone: str = 'Asia/Taipei', keep_days: int = 2):
+        """
+        初始化推播計畫產生器
+
+        Args:
+            member_service: MemberService 實例
+            schedule_service: ScheduleService 實例
+            render: 產生提醒文字的函數 render(group_id, target_date)
+            timezone: 時區
+            keep_days: 保留最近幾天的計畫
+        """
+        self.member_service = member_service
+        self.schedule_service = schedule_service
+        self.render = render
+        self.timezone = pytz.timezone(timezone)
+        self.keep_days = keep_days
+        self._plans: Dict[date, Dict[str, PlanEntry]] = {}
+        self._lock = threading.RLock()
+
+        # 統計資料
+        self.hits = 0
+        self.misses = 0
+        self.rebuilt = 0
+        self.last_build_ms = 0.0
+
+    def schedule_daily(self, scheduler, hour: int = 23, minute: int = 50):
+        """註冊每天產生隔天計畫的排程任務"""
+        from apscheduler.triggers.cron import CronTrigger
+
+        return scheduler.add_job(
+            lambda: self.build(self.today() + timedelta(days=1)),
+            CronTrigger(hour=hour, minute=minute, timezone=self.timezone),
+            id="send-plan",
+            replace_existing=True,
+        )
+
+    def today(self) -> date:
+        return datetime.now(self.timezone).date()
+
+    def _versions(self, group_id: str) -> Tuple[int, int]:
+        return (self.member_service.get_state_version(group_id),
+                self.schedule_service.get_state_version(group_id))
+
+    def _fire_time(self, group_id: str, target_date: date) -> Optional[datetime]:
+        """群組在指定日期的觸發時間；不是推播日時為 None"""
+        config = self.schedule_service.group_schedules.get(group_id)
+        if not config:
+            return None
+        days = [d.strip() for d in str(config.get('days', '')).split(',')]
+        if WEEKDAY_NAMES[target_date.weekday()] not in days:
+            return None
+        naive = datetime(target_date.year, target_date.month, target_date.day,
+                         config.get('hour', 17), config.get('minute', 10))
+        return self.timezone.localize(naive)
+
+    def _materialize(self, group_id: str, target_date: date) -> Optional[PlanEntry]:
+        versions = self._versions(group_id)
+        fire_time = self._fire_time(group_id, target_date)
+        if fire_time is None:
+            return None
+        return PlanEntry(group_id, fire_time, self.render(group_id, target_date), versions)
+
+    def build(self, target_date: date) -> int:
+        """
+        產生指定日期的完整計畫
+
+        Returns:
+            int: 計畫中的群組數量
+        """
+        started = datetime.now()
+        plan: Dict[str, PlanEntry] = {}
+        for group_id in list(self.schedule_service.group_schedules):
+            try:
+                entry = self._materialize(group_id, target_date)
+            except Exception as e:
+                logger.error(f"產生群組 {group_id} 的推播計畫失敗: {e}")
+                continue
+            if entry is not None:
+                plan[group_id] = entry
+
+        with self._lock:
+            self._plans[target_date] = plan
+            for old_date in sorted(self._plans)[:-self.keep_days]:
+                del self._plans[old_date]
+        self.last_build_ms = (datetime.now() - started).total_seconds() * 1000
+        print(f"🗓️ 已產生 {target_date} 推播計畫 | {len(plan)} 個群組 | {self.last_build_ms:.1f}ms")
+        return len(plan)
+
+    def get_entry(self, group_id: str, target_date: date) -> Optional[PlanEntry]:
+        """取得群組的計畫；過期或不存在時重新產生該群組"""
+        with self._lock:
+            plan = self._plans.get(target_date)
+            entry = plan.get(group_id) if plan is not None else None
+            if entry is not None and entry.versions == self._versions(group_id):
+                self.hits += 1
+                return entry
+
+        entry = self._materialize(group_id, target_date)
+        with self._lock:
+            self.misses += 1
+            plan = self._plans.get(target_date)
+            if plan is not None:
+                self.rebuilt += 1
+                if entry is not None:
+                    plan[group_id] = entry
+                else:
+                    plan.pop(group_id, None)
+        return entry
+
+    def get_text(self, group_id: str, target_date: date) -> Optional[str]:
+        """取得群組在指定日期的提醒文字"""
+        entry = self.get_entry(group_id, target_date)
+        if entry is None:
+            # 計畫中不是推播日（例如手動觸發），直接產生
+            return self.render(group_id, target_date)
+        return entry.text
+
+    def forget(self, group_id: str) -> int:
+        """
+        從所有計畫中移除群組（群組離開時）
+
+        Returns:
+            int: 移除的計畫筆數
+        """
+        with self._lock:
+            return sum(plan.pop(group_id, None) is not None for plan in self._plans.values())
+
+    def describe(self, group_id: Optional[str] = None, target_date: Optional[date] = None) -> str:
+        """產生計畫摘要（@plan 指令使用）"""
+        target_date = target_date or self.today()
+        with self._lock:
+            plan = self._plans.get(target_date)
+            planned = len(plan) if plan is not None else 0
+
+        lines = [f"🗓️ {target_date} 推播計畫", f"📦 已產生: {planned} 個群組" if plan is not None else "📦 尚未產生"]
+        if group_id:
+            entry = self.get_entry(group_id, target_date)
+            if entry is None:
+                lines.append("📭 本群組今天不是推播日")
+            else:
+                lines.append(f"⏰ 觸發時間: {entry.fire_time.strftime('%H:%M')}")
+                lines.append(f"💬 提醒內容: {entry.text or '（沒有負責成員，不推播）'}")
+        lines.append(f"📊 命中 {self.hits} | 重新產生 {self.misses}")
+        return "\n".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得計畫統計"""
+        with self._lock:
+            plans = {str(d): len(plan) for d, plan in self._plans.items()}
+        return {
+            "plans": plans,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilt": self.rebuilt,
+            "last_build_ms": round(self.last_build_ms, 2),
+        }
@@ -0,0 +1,299 @@
+"""
+時段分派器
+相同推播時段的群組共用一個排程任務，時段觸發時再分派給該時段的所有群組
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# (星期, 小時, 分鐘)
+Slot = Tuple[str, int, int]
+
+WEEKDAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# 排程器可能比排定時間略早觸發，推算排定時間時容許的誤差
+FIRE_EARLY_TOLERANCE = timedelta(minutes=1)
+
+
+def parse_slots(days: str, hour: int, minute: int) -> Tuple[Slot, ...]:
+    """將 "mon,thu" 17:10 展開為各星期的時段"""
+    return tuple(dict.fromkeys((day.strip(), hour, minute) for day in days.split(',') if day.strip()))
+
+
+class SlotHandle:
+    """
+    群組在分派器中的註冊
+
+    提供與 APScheduler Job 相同的 next_run_time / remove()，
+    讓 group_jobs 與既有程式碼不需更動。
+    """
+
+    __slots__ = ('dispatcher', 'group_id')
+
+    def __init__(self, dispatcher: "SlotDispatcher", group_id: str):
+        self.dispatcher = dispatcher
+        self.group_id = group_id
+
+    @property
+    def next_run_time(self):
+        """群組所有時段中最近的下次執行時間"""
+        return self.dispatcher.next_run_time(self.group_id)
+
+    def remove(self):
+        """從分派器移除此群組"""
+        self.dispatcher.unregister(self.group_id)
+
+
+class SlotDispatcher:
+    """
+    時段分派器
+
+    - 每個不同的 (星期, 小時, 分鐘) 只有一個 CronTrigger 任務
+    - 時段 -> 群組集合 的索引，新增、移動、移除群組只更新索引
+    - 時段沒有群組時才移除任務，第一個群組加入時才建立任務
+    - 設定 fanout 時，觸發的群組交由 ReminderFanout 並行推播
+    - 排程器延遲觸發時在 misfire_grace_time 內仍會執行（多次合併為一次）；
+      停機期間錯過的時段由 catch_up() 在啟動時補發
+    """
+
+    def __init__(self, scheduler, timezone: str = 'Asia/Taipei', fanout=None, misfire_grace_time: int = 300):
+        """
+        初始化時段分派器
+
+        Args:
+            scheduler: APScheduler BackgroundScheduler 實例
+            timezone: 排程時區
+            fanout: ReminderFanout 實例（None 表示在排程執行緒中依序呼叫）
+            misfire_grace_time: 排程器延遲多少秒內仍執行時段任務
+        """
+        self.scheduler = scheduler
+        self.fanout = fanout
+        self.misfire_grace_time = misfire_grace_time
+        self.timezone = pytz.timezone(timezone)
+        self._slot_groups: Dict[Slot, Set[str]] = {}
+        self._group_slots: Dict[str, Tuple[Slot, ...]] = {}
+        self._callbacks: Dict[str, Callable[[str], None]] = {}
+        self._jobs: Dict[Slot, object] = {}
+        self._lock = threading.RLock()
+        self.fired_slots = 0
+        self.dispatched = 0
+
+    def register(self, group_id: str, days: str, hour: int, minute: int,
+                 callback: Callable[[str], None]) -> SlotHandle:
+        """
+        註冊（或移動）群組的推播時段
+
+        Args:
+            group_id: 群組ID
+            days: 星期設定，例如 "mon,thu"
+            hour: 小時
+            minute: 分鐘
+            callback: 時段觸發時呼叫 callback(group_id, scheduled_time)
+
+        Returns:
+            SlotHandle: 群組的註冊
+        """
+        new_slots = parse_slots(days, hour, minute)
+        with self._lock:
+            old_slots = self._group_slots.get(group_id, ())
+            for slot in old_slots:
+                if slot not in new_slots:
+                    self._leave_slot(slot, group_id)
+            for slot in new_slots:
+                if slot not in old_slots:
+                    self._join_slot(slot, group_id)
+            self._group_slots[group_id] = new_slots
+            self._callbacks[group_id] = callback
+        return SlotHandle(self, group_id)
+
+    def unregister(self, group_id: str) -> bool:
+        """移除群組的所有時段"""
+        with self._lock:
+            slots = self._group_slots.pop(group_id, None)
+            self._callbacks.pop(group_id, None)
+            if slots is None:
+                return False
+            for slot in slots:
+                self._leave_slot(slot, group_id)
+            return True
+
+    def registered_groups(self) -> Set[str]:
+        """取得已註冊時段的群組"""
+        with self._lock:
+            return set(self._group_slots)
+
+    def groups_for_slot(self, slot: Slot) -> Set[str]:
+        """取得時段內的群組"""
+        with self._lock:
+            return set(self._slot_groups.get(slot, ()))
+
+    def next_run_time(self, group_id: str):
+        """取得群組最近的下次執行時間（排程器尚未啟動時為 None）"""
+        with self._lock:
+            times = [
+                getattr(self._jobs.get(slot), 'next_run_time', None)
+                for slot in self._group_slots.get(group_id, ())
+            ]
+        times = [t for t in times if t is not None]
+        return min(times) if times else None
+
+    def _join_slot(self, slot: Slot, group_id: str):
+        groups = self._slot_groups.get(slot)
+        if groups is None:
+            groups = self._slot_groups[slot] = set()
+            self._jobs[slot] = self._add_slot_job(slot)
+        groups.add(group_id)
+
+    def _leave_slot(self, slot: Slot, group_id: str):
+        groups = self._slot_groups.get(slot)
+        if groups is None:
+            return
+        groups.discard(group_id)
+        if not groups:
+            del self._slot_groups[slot]
+            job = self._jobs.pop(slot, None)
+            if job is not None:
+                try:
+                    job.remove()
+                except Exception as e:
+                    logger.warning(f"移除時段任務 {slot} 失敗: {e}")
+
+    def _add_slot_job(self, slot: Slot):
+        from apscheduler.triggers.cron import CronTrigger
+
+        day, hour, minute = slot
+        return self.scheduler.add_job(
+            self._fire,
+            CronTrigger(day_of_week=day, hour=hour, minute=minute, timezone=self.timezone),
+            args=[slot],
+            id=f"slot-{day}-{hour:02d}{minute:02d}",
+            replace_existing=True,
+            misfire_grace_time=self.misfire_grace_time,
+            coalesce=True,
+        )
+
+    def _fire(self, slot: Slot, now: Optional[datetime] = None):
+        """
+        時段觸發：分派給該時段的所有群組
+
+        排定的觸發時間由時段推算（最近一次不晚於目前時間的觸發），
+        延遲執行跨過午夜時日期仍是原本的時段，而不是執行當天
+        """
+        with self._lock:
+            targets = [
+                (gid, self._callbacks[gid])
+                for gid in sorted(self._slot_groups.get(slot, ()))
+                if gid in self._callbacks
+            ]
+            self.fired_slots += 1
+
+        day, hour, minute = slot
+        now = now or datetime.now(self.timezone)
+        scheduled_time = self._last_fire_before(slot, now + FIRE_EARLY_TOLERANCE)
+        label = f"{day} {hour:02d}:{minute:02d}"
+        print(f"⏰ 時段 {label} 觸發，分派 {len(targets)} 個群組")
+        self._dispatch(targets, scheduled_time, label)
+
+    def _dispatch(self, targets, scheduled_time: datetime, label: str):
+        """將一批群組交給 fanout，或在目前執行緒依序呼叫"""
+        if self.fanout is not None:
+            self.fanout.submit(targets, scheduled_time, label)
+            self.dispatched += len(targets)
+            return
+
+        for group_id, callback in targets:
+            try:
+                callback(group_id, scheduled_time)
+                self.dispatched += 1
+            except Exception as e:
+                logger.error(f"群組 {group_id} 提醒分派失敗: {e}")
+                print(f"❌ 群組 {group_id} 提醒分派失敗: {e}")
+
+    def _last_fire_before(self, slot: Slot, now: datetime) -> datetime:
+        """時段在 now 之前最近一次的觸發時間"""
+        day, hour, minute = slot
+        days_back = (now.weekday() - WEEKDAY_NAMES.index(day)) % 7
+        fire_date = (now - timedelta(days=days_back)).date()
+        fire_time = self.timezone.localize(datetime(fire_date.year, fire_date.month, fire_date.day, hour, minute))
+        if fire_time >= now:
+            fire_time = self.timezone.localize(datetime.combine(fire_date - timedelta(days=7), fire_time.time()))
+        return fire_time
+
+    def catch_up(self, grace_seconds: int, max_groups: int,
+                 was_sent: Optional[Callable[[str, Any, str], bool]] = None,
+                 now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        補發停機期間錯過的提醒
+
+        - 只補發 grace_seconds 內錯過的時段，更早的視為過期
+        - 同一群組錯過多次時只補發最近一次
+        - 已記錄為發送過的提醒（was_sent）不補發
+        - 最多補發 max_groups 個群組（優先最近錯過的），經由一般的分派路徑限速推播
+
+        Args:
+            grace_seconds: 補發時間窗（秒），0 表示停用
+            max_groups: 補發群組數上限
+            was_sent: 查詢是否已發送 was_sent(group_id, date, "HH:MM")
+            now: 目前時間（測試用）
+
+        Returns:
+            Dict[str, int]: missed / already_sent / dispatched / skipped_over_limit
+        """
+        result = {"missed": 0, "already_sent": 0, "dispatched": 0, "skipped_over_limit": 0}
+        if grace_seconds <= 0:
+            return result
+        now = now or datetime.now(self.timezone)
+        window_start = now - timedelta(seconds=grace_seconds)
+
+        # 每個群組只保留最近一次錯過的觸發
+        latest: Dict[str, datetime] = {}
+        with self._lock:
+            for slot, groups in self._slot_groups.items():
+                fire_time = self._last_fire_before(slot, now)
+                if fire_time < window_start:
+                    continue
+                for group_id in groups:
+                    if group_id not in latest or fire_time > latest[group_id]:
+                        latest[group_id] = fire_time
+            callbacks = dict(self._callbacks)
+
+        missed = []
+        for group_id, fire_time in latest.items():
+            if was_sent is not None and was_sent(group_id, fire_time.date(), fire_time.strftime('%H:%M')):
+                result["already_sent"] += 1
+            elif group_id in callbacks:
+                missed.append((fire_time, group_id))
+        result["missed"] = len(missed)
+
+        missed.sort(reverse=True)
+        selected, result["skipped_over_limit"] = missed[:max_groups], max(0, len(missed) - max_groups)
+
+        waves: Dict[datetime, list] = {}
+        for fire_time, group_id in selected:
+            waves.setdefault(fire_time, []).append((group_id, callbacks[group_id]))
+        for fire_time in sorted(waves):
+            targets = sorted(waves[fire_time])
+            self._dispatch(targets, fire_time, f"catch-up {fire_time.strftime('%a %H:%M').lower()}")
+            result["dispatched"] += len(targets)
+
+        if result["missed"] or result["already_sent"]:
+            print(f"🔁 補發錯過的提醒 | 錯過 {result['missed']} | 已發送 {result['already_sent']} | "
+                  f"補發 {result['dispatched']} | 超過上限略過 {result['skipped_over_limit']}")
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        """取得分派統計"""
+        with self._lock:
+            return {
+                "slots": len(self._slot_groups),
+                "groups": len(self._group_slots),
+                "jobs": len(self._jobs),
+                "fired_slots": self.fired_slots,
+                "dispatched": self.dispatched,
+            }
@@ -0,0 +1,100 @@
+"""
+多副本狀態同步
+每個副本各自保有群組資料與排程註冊的記憶體副本，定期重新讀取共用資料存儲庫，
+讓其他副本寫入的變更（例如在非主節點上執行的 @cron、@week、@message）生效
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StateSync:
+    """
+    多副本狀態同步
+
+    - 背景執行緒每 interval 秒呼叫一次 refresh()，只讓有變更的群組失效
+    - 成為主節點時先呼叫 sync_now()，以最新的資料恢復排程
+    """
+
+    def __init__(self, refresh: Callable[[], Dict[str, int]], interval: float = 60.0):
+        """
+        初始化狀態同步
+
+        Args:
+            refresh: 重新讀取資料的函數，回傳各類資料有變更的群組數
+            interval: 同步間隔（秒）
+        """
+        self.refresh = refresh
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # 統計資料
+        self.syncs = 0
+        self.failures = 0
+        self.last_sync: Optional[str] = None
+        self.last_changes: Dict[str, int] = {}
+        self.last_error: Optional[str] = None
+        self.last_duration_ms = 0.0
+
+    def start(self):
+        """啟動背景同步"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="state-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景同步"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sync_now()
+
+    def sync_now(self) -> bool:
+        """
+        立即同步一次
+
+        Returns:
+            bool: 是否成功（失敗時保留原本的記憶體資料，下次再試）
+        """
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                changes = self.refresh()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error(f"同步共用狀態失敗: {e}")
+                return False
+            self.syncs += 1
+            self.last_sync = datetime.now().isoformat(timespec="seconds")
+            self.last_changes = dict(changes)
+            self.last_error = None
+            self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        if any(changes.values()):
+            print("🔄 同步共用狀態 | " + " | ".join(f"{name} {count}" for name, count in changes.items()))
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得同步統計"""
+        return {
+            "interval_seconds": self.interval,
+            "syncs": self.syncs,
+            "failures": self.failures,
+            "last_sync": self.last_sync,
+            "last_changes": self.last_changes,
+            "last_error": self.last_error,
+            "last_duration_ms": self.last_duration_ms,
+        }
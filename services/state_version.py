@@ -0,0 +1,48 @@
+"""
+狀態版本號
+Service 每次變更資料時遞增，供快取判斷資料是否過期
+"""
+
+import itertools
+import threading
+from typing import Dict, Optional
+
+
+class StateVersion:
+    """
+    單調遞增的狀態版本號
+
+    - 群組層級的變更只更新該群組的版本
+    - 影響所有群組的變更（整批覆寫、重新載入、基準日期）更新全域版本
+    - 群組的有效版本為 max(全域版本, 群組版本)，任何變更都會讓它變大
+    """
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+        self._global = 0
+        self._groups: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, group_id: Optional[str] = None) -> int:
+        """
+        遞增版本號
+
+        Args:
+            group_id: 變更的群組，None 表示影響所有群組
+
+        Returns:
+            int: 新的版本號
+        """
+        with self._lock:
+            version = next(self._counter)
+            if group_id is None:
+                self._global = version
+            else:
+                self._groups[group_id] = version
+            return version
+
+    def get(self, group_id: Optional[str] = None) -> int:
+        """取得群組（或全域）目前的版本號"""
+        if group_id is None:
+            return self._global
+        return max(self._global, self._groups.get(group_id, 0))
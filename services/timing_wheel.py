@@ -0,0 +1,278 @@
+"""
+時間輪計時器
+以雜湊時間輪管理大量一次性計時器（例如追蹤提醒），不需為每個計時器建立排程任務
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """時間輪中的一個計時器"""
+
+    __slots__ = ('timer_id', 'kind', 'payload', 'due_at', 'due_tick')
+
+    def __init__(self, timer_id: str, kind: str, payload: Dict[str, Any], due_at: float, due_tick: int):
+        self.timer_id = timer_id
+        self.kind = kind
+        self.payload = payload
+        self.due_at = due_at
+        self.due_tick = due_tick
+
+
+class TimingWheel:
+    """
+    雜湊時間輪
+
+    - wheel_size 個槽，每 tick_seconds 前進一格；計時器依到期 tick 放入對應的槽，
+      超過一圈的計時器留在槽中，直到到期的那一圈才觸發
+    - 新增與取消皆為 O(1)（以 timer_id 索引），只有一個背景執行緒推進
+    - 計時器以 (kind, payload) 描述，觸發時交給 register_handler() 註冊的處理函數，
+      因此可以寫入本機日誌（JSON Lines），重啟後還原尚未觸發的計時器
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, wheel_size: int = 3600,
+                 journal_path: Optional[str] = None, compact_every: int = 500):
+        """
+        初始化時間輪
+
+        Args:
+            tick_seconds: 每格的時間長度（秒），即觸發精度
+            wheel_size: 槽數，一圈為 tick_seconds * wheel_size 秒
+            journal_path: 本機日誌路徑（None 表示不保存）
+            compact_every: 累積多少筆刪除紀錄後壓縮日誌
+        """
+        self.tick_seconds = tick_seconds
+        self.wheel_size = wheel_size
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self._slots: List[Dict[str, Timer]] = [{} for _ in range(wheel_size)]
+        self._timers: Dict[str, Timer] = {}
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._tick = self._tick_at(time.time())
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._journal_deletes = 0
+
+        # 統計資料
+        self.scheduled = 0
+        self.cancelled = 0
+        self.fired = 0
+        self.failed = 0
+        self.recovered = 0
+
+        self._recover()
+
+    def _tick_at(self, timestamp: float) -> int:
+        return int(timestamp // self.tick_seconds)
+
+    def register_handler(self, kind: str, handler: Callable[[Dict[str, Any]], None]):
+        """註冊某種計時器的處理函數 handler(payload)"""
+        self._handlers[kind] = handler
+
+    # ===== 新增與取消 =====
+
+    def schedule(self, timer_id: str, delay_seconds: float, kind: str, payload: Dict[str, Any]) -> Timer:
+        """
+        新增計時器（相同 timer_id 的舊計時器會被取代）
+
+        Args:
+            timer_id: 計時器 ID
+            delay_seconds: 幾秒後觸發
+            kind: 計時器種類（對應處理函數）
+            payload: 觸發時傳給處理函數的資料（需可序列化為 JSON）
+        """
+        with self._lock:
+            timer = self._insert(timer_id, kind, payload, time.time() + delay_seconds)
+            self.scheduled += 1
+            self._write({"op": "add", "id": timer_id, "kind": kind, "payload": payload, "due_at": timer.due_at})
+        return timer
+
+    def cancel(self, timer_id: str) -> bool:
+        """
+        取消計時器
+
+        Returns:
+            bool: 計時器是否存在（尚未觸發）
+        """
+        with self._lock:
+            if self._remove(timer_id) is None:
+                return False
+            self.cancelled += 1
+            self._write({"op": "del", "id": timer_id})
+            return True
+
+    def get(self, timer_id: str) -> Optional[Timer]:
+        """取得尚未觸發的計時器"""
+        with self._lock:
+            return self._timers.get(timer_id)
+
+    def _insert(self, timer_id: str, kind: str, payload: Dict[str, Any], due_at: float) -> Timer:
+        """放入對應的槽（呼叫端需持有鎖）；已到期的計時器在下一格觸發"""
+        self._remove(timer_id)
+        due_tick = max(math.ceil(due_at / self.tick_seconds), self._tick + 1)
+        timer = Timer(timer_id, kind, payload, due_at, due_tick)
+        self._slots[due_tick % self.wheel_size][timer_id] = timer
+        self._timers[timer_id] = timer
+        return timer
+
+    def _remove(self, timer_id: str) -> Optional[Timer]:
+        timer = self._timers.pop(timer_id, None)
+        if timer is not None:
+            del self._slots[timer.due_tick % self.wheel_size][timer_id]
+        return timer
+
+    # ===== 推進 =====
+
+    def start(self):
+        """啟動背景執行緒"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="timing-wheel", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景執行緒並關閉日誌"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _run(self):
+        while not self._stop.wait(self.tick_seconds):
+            self.advance()
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        推進到指定時間並觸發到期的計時器
+
+        Returns:
+            int: 觸發的計時器數量
+        """
+        target = self._tick_at(time.time() if now is None else now)
+        due: List[Timer] = []
+        with self._lock:
+            # 落後超過一圈時（例如系統休眠）每個槽只需檢查一次
+            steps = min(target - self._tick, self.wheel_size)
+            for tick in range(target - steps + 1, target + 1):
+                slot = self._slots[tick % self.wheel_size]
+                if not slot:
+                    continue
+                for timer_id in [tid for tid, timer in slot.items() if timer.due_tick <= target]:
+                    due.append(self._remove(timer_id))
+            self._tick = max(self._tick, target)
+            for timer in due:
+                self._write({"op": "del", "id": timer.timer_id})
+
+        for timer in sorted(due, key=lambda t: t.due_at):
+            self._fire(timer)
+        return len(due)
+
+    def _fire(self, timer: Timer):
+        handler = self._handlers.get(timer.kind)
+        if handler is None:
+            logger.warning(f"計時器 {timer.timer_id} 沒有對應的處理函數: {timer.kind}")
+            self.failed += 1
+            return
+        try:
+            handler(timer.payload)
+            self.fired += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"計時器 {timer.timer_id} 執行失敗: {e}")
+
+    # ===== 日誌 =====
+
+    def _write(self, record: Dict[str, Any]):
+        """寫入日誌（呼叫端需持有鎖）"""
+        if not self.journal_path:
+            return
+        try:
+            if self._journal is None:
+                os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal.flush()
+        except OSError as e:
+            logger.error(f"寫入計時器日誌失敗: {e}")
+            return
+        if record["op"] == "del":
+            self._journal_deletes += 1
+            if self._journal_deletes >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        """只保留尚未觸發的計時器，重寫日誌（呼叫端需持有鎖）"""
+        self._journal_deletes = 0
+        try:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for timer in self._timers.values():
+                    f.write(json.dumps({"op": "add", "id": timer.timer_id, "kind": timer.kind,
+                                        "payload": timer.payload, "due_at": timer.due_at},
+                                       ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.journal_path)
+        except OSError as e:
+            logger.error(f"壓縮計時器日誌失敗: {e}")
+
+    def _recover(self):
+        """從日誌還原尚未觸發的計時器；停機期間已到期的會在第一格觸發"""
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        pending: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("op") == "add":
+                        pending[record["id"]] = record
+                    elif record.get("op") == "del":
+                        pending.pop(record.get("id"), None)
+        except OSError as e:
+            logger.error(f"讀取計時器日誌失敗: {e}")
+            return
+
+        with self._lock:
+            for record in pending.values():
+                self._insert(record["id"], record["kind"], record.get("payload") or {}, record["due_at"])
+            self.recovered = len(pending)
+            self._compact()
+        if pending:
+            print(f"⏳ 已還原 {len(pending)} 個計時器")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得時間輪統計"""
+        with self._lock:
+            pending = len(self._timers)
+            next_due = min((t.due_at for t in self._timers.values()), default=None)
+        return {
+            "pending": pending,
+            "next_due_in_seconds": round(next_due - time.time(), 1) if next_due is not None else None,
+            "tick_seconds": self.tick_seconds,
+            "wheel_size": self.wheel_size,
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "fired": self.fired,
+            "failed": self.failed,
+            "recovered": self.recovered,
+        }
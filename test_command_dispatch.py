@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+指令分派測試 - 註冊器查找與別名標準化
+無需 LINE 或 Firebase 連接
+"""
+
+import random
+import threading
+from datetime import date, datetime
+from difflib import SequenceMatcher
+from unittest import mock
+
+import pytz
+
+import config
+from commands.handler import initialize_commands, create_command_context, handle_command, get_context_dependencies
+from commands import command_registry, suggestion_index, members_command
+from handlers.message_handler import normalize_command, reload_aliases, suggest_commands
+from services.member_service import MemberService
+
+
+def test_registry_token_lookup():
+    """以第一個 token 查找，不受註冊順序影響"""
+    initialize_commands()
+    cases = {
+        "@help": "@help",
+        "@help examples": "@help",
+        "@clear_week 2": "@clear_week",
+        "@clear_members": "@clear_members",
+        "@重置": "@reset_all",
+        "@重置日期": "@reset_date",
+        "@clear": None,
+        "@helpx": None,
+        "hello": None,
+    }
+    for text, expected in cases.items():
+        command = command_registry.get_command(text)
+        assert (command.name if command else None) == expected, text
+    print("✅ 指令雜湊查找正確")
+
+
+def test_registry_cjk_prefix():
+    """中文別名可直接接參數，取最長前綴"""
+    initialize_commands()
+    assert command_registry.get_command("@幫助排程").name == "@help"
+    assert command_registry.get_command("@查看成員表").name == "@members"
+    assert command_registry.get_command("@設定成員1 小明").name == "@week"
+    print("✅ 中文別名前綴查找正確")
+
+
+def test_normalize_longest_alias():
+    """別名取最長匹配，包含命令類別上的別名"""
+    assert normalize_command("  @重置日期 ") == "@reset_date"
+    assert normalize_command("@重置") == "@reset_all"
+    assert normalize_command("@文案 今天輪到{name}") == "@message 今天輪到{name}"
+    assert normalize_command("@幫助排程") == "@help 排程"
+    assert normalize_command("@week 1 Alice") == "@week 1 Alice"
+    assert normalize_command("早安") == "早安"
+    print("✅ 別名最長匹配正確")
+
+
+def test_reload_aliases():
+    """修改別名設定後重新編譯即生效"""
+    config.COMMAND_ALIASES["@輪值表"] = "@members"
+    try:
+        assert normalize_command("@輪值表") == "@輪值表"
+        reload_aliases()
+        assert normalize_command("@輪值表") == "@members"
+    finally:
+        del config.COMMAND_ALIASES["@輪值表"]
+        reload_aliases()
+    print("✅ 別名表重新載入正確")
+
+
+def _legacy_suggest(input_command, max_suggestions=3):
+    """舊版逐一計算 SequenceMatcher 的建議（對照組）"""
+    similarities = []
+    for cmd in [c.name for c in command_registry.get_all_commands()]:
+        similarities.append((cmd, SequenceMatcher(None, input_command.lower(), cmd.lower()).ratio()))
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    top = similarities[:max_suggestions]
+    if not top or top[0][1] < 0.2:
+        return "💡 試試看：@help 查看所有可用指令"
+    suggestions = "💡 您是不是要輸入：\n"
+    for cmd, ratio in top:
+        if ratio > 0.2:
+            suggestions += f"  • {cmd}\n"
+    return suggestions.rstrip()
+
+
+def test_suggestions_match_legacy():
+    """索引建議與逐一計算的結果一致，重複輸入命中快取"""
+    initialize_commands()
+    rng = random.Random(42)
+    alphabet = "@abcdeghilmnorstuwy_設定成員"
+    queries = ["@shedule", "@memebers", "@hepl", "@x", "@clear", "@設定", "@weak"]
+    queries += ["@" + "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(300)]
+    for query in queries:
+        for k in (1, 3, 5):
+            assert suggest_commands(query, k) == _legacy_suggest(query, k), (query, k)
+
+    suggest_commands("@shedule")
+    hits = suggestion_index.get_stats()["hits"]
+    suggest_commands("@shedule")
+    assert suggestion_index.get_stats()["hits"] == hits + 1
+    print("✅ 指令建議與舊版一致")
+
+
+class _CountingMemberService:
+    """記錄資料存取次數的假 MemberService"""
+
+    def __init__(self):
+        self.loads = 0
+        self.summaries = 0
+        self.version = 1
+
+    def get_state_version(self, group_id=None):
+        return self.version
+
+    @property
+    def groups(self):
+        self.loads += 1
+        return {"G1": {"1": ["Alice"]}}
+
+    def get_member_schedule_summary(self, group_id=None):
+        self.summaries += 1
+        return f"summary {group_id}"
+
+
+def test_lazy_command_context():
+    """上下文延遲解析資料，並記錄命令讀取的欄位"""
+    initialize_commands()
+    service = _CountingMemberService()
+
+    context = create_command_context(event=None, group_id="G1", member_service=service)
+    assert handle_command("@help", context).startswith("📖")
+    assert service.loads == 0
+    assert get_context_dependencies()["@help"] == []
+
+    context = create_command_context(event=None, group_id="G1", member_service=service)
+    assert handle_command("@members", context) == "summary G1"
+    assert get_context_dependencies()["@members"] == ["group_id", "member_service"]
+
+    context = create_command_context(event=None, group_id="G1", member_service=service)
+    assert context.get("groups") == {"G1": {"1": ["Alice"]}}
+    assert context["groups"] is not None and service.loads == 1
+    assert context.get("unknown", "x") == "x" and "groups" in context
+    print("✅ 命令上下文延遲解析正確")
+
+
+def test_context_dependencies_read_while_updated():
+    """webhook worker 並行執行指令時，讀取依賴欄位不會因集合變動而失敗"""
+    initialize_commands()
+    service = _CountingMemberService()
+    stop = threading.Event()
+    errors = []
+
+    def run_commands():
+        while not stop.is_set():
+            context = create_command_context(event=None, group_id="G1", member_service=service)
+            handle_command("@members", context)
+
+    workers = [threading.Thread(target=run_commands) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    try:
+        for _ in range(500):
+            try:
+                get_context_dependencies()
+            except RuntimeError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    assert errors == []
+    assert get_context_dependencies()["@members"] == ["group_id", "member_service"]
+    print("✅ 依賴欄位可在並行更新時讀取")
+
+
+def test_response_cache_versioned():
+    """唯讀指令依狀態版本快取，版本遞增後重新產生"""
+    initialize_commands()
+    service = _CountingMemberService()
+
+    def members():
+        context = create_command_context(event=None, group_id="G_cache", member_service=service)
+        return handle_command("@members", context)
+
+    assert members() == members() == "summary G_cache"
+    assert service.summaries == 1
+    service.version += 1
+    members()
+    assert service.summaries == 2
+    print("✅ 回應快取依版本失效")
+
+
+class _RecordingRepository:
+    """記錄每次儲存的群組 ID"""
+
+    def __init__(self, data):
+        self.data = data
+        self.saves = []
+
+    def load_data(self, data_type, default_value=None):
+        return self.data.get(data_type, default_value)
+
+    def save_data(self, data_type, data, group_id=None):
+        self.data[data_type] = data
+        self.saves.append((data_type, group_id))
+        return True
+
+
+def test_message_command_updates_single_group():
+    """@message 只儲存並失效該群組，不影響其他群組的版本"""
+    initialize_commands()
+    repository = _RecordingRepository({"group_messages": {"G2": "other {name}"}})
+    service = MemberService(repository)
+    before = (service.get_state_version(), service.get_state_version("G2"))
+
+    context = create_command_context(event=None, group_id="G1", member_service=service)
+    assert handle_command("@message 輪到 {name}", context).startswith("✅")
+    assert service.get_group_message_template("G1") == "輪到 {name}"
+    assert repository.saves == [("group_messages", "G1")]
+    assert (service.get_state_version(), service.get_state_version("G2")) == before
+    assert service.get_state_version("G1") > before[0]
+
+    context = create_command_context(event=None, group_id="G1", member_service=service)
+    assert handle_command("@message reset", context).startswith("✅")
+    assert service.get_group_message_template("G1") is None
+    assert repository.saves[-1] == ("group_messages", "G1")
+    assert repository.data["group_messages"] == {"G2": "other {name}"}
+    assert (service.get_state_version(), service.get_state_version("G2")) == before
+    print("✅ @message 只更新單一群組")
+
+
+def test_members_cache_key_uses_taipei_date():
+    """成員表快取鍵以台北日期換日，不受伺服器時區影響"""
+    service = _CountingMemberService()
+    context = create_command_context(event=None, group_id="G1", member_service=service)
+    utc_evening = datetime(2026, 1, 1, 17, 0, tzinfo=pytz.utc)
+
+    with mock.patch("commands.members_command.datetime") as fake_datetime:
+        fake_datetime.now.side_effect = lambda tz=None: utc_evening.astimezone(tz)
+        key = members_command.cache_key("@members", context)
+    assert key[-1] == date(2026, 1, 2)
+    print("✅ 成員表快取鍵使用台北日期")
+
+
+if __name__ == "__main__":
+    test_registry_token_lookup()
+    test_registry_cjk_prefix()
+    test_normalize_longest_alias()
+    test_reload_aliases()
+    test_suggestions_match_legacy()
+    test_lazy_command_context()
+    test_context_dependencies_read_while_updated()
+    test_response_cache_versioned()
+    test_members_cache_key_uses_taipei_date()
+    test_message_command_updates_single_group()
+    print("✅ 所有指令分派測試完成！")
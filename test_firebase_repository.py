@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Firebase 存儲庫測試 - 部分更新與延遲寫入
+以假的 firebase_service 記錄呼叫，無需 Firebase 連接
+"""
+
+import threading
+import time
+
+from repositories.firebase_repository import FirebaseRepository
+from repositories.write_behind import WriteBehindBuffer
+
+
+class _FakeFirebaseService:
+    """記錄寫入呼叫的假 Firebase 服務"""
+
+    def __init__(self, fail_updates=False, migration=None):
+        self.calls = []
+        self.fail_updates = fail_updates
+        self.migration = migration or {"completed": True, "migrated": 0}
+
+    def is_available(self):
+        return True
+
+    def load_groups(self):
+        return {"G1": {"1": ["Alice"], "2": ["Bob"]}}
+
+    def load_group_ids(self):
+        return ["G1"]
+
+    def load_group_documents(self):
+        return {"G1": {"rotation": {"1": ["Alice"]}}}
+
+    def save_groups(self, data):
+        self.calls.append(("set", "groups"))
+        return True
+
+    def save_group_ids(self, data):
+        self.calls.append(("set", "group_ids"))
+        return True
+
+    def save_group_document(self, group_id, fields):
+        self.calls.append(("set", group_id))
+        return True
+
+    def update_document_fields(self, collection, document, updates, deletes=()):
+        self.calls.append(("update", document, dict(updates), list(deletes)))
+        return not self.fail_updates
+
+    def update_group_ids(self, added, removed):
+        self.calls.append(("ids", added, removed))
+        return not self.fail_updates
+
+    def migrate_to_group_documents(self):
+        return self.migration
+
+
+def _repository(layout="legacy", **kwargs):
+    repository = FirebaseRepository(layout=layout)
+    repository.firebase_service = _FakeFirebaseService(**kwargs)
+    return repository
+
+
+def test_partial_update_sends_only_changed_fields():
+    """只送出變更的欄位，未變更時不寫入"""
+    repository = _repository()
+    groups = repository.load_data("groups")
+    groups["G1"]["2"] = ["Carol"]
+    del groups["G1"]["1"]
+
+    assert repository.save_data("groups", groups)
+    assert repository.save_data("groups", groups)
+
+    calls = repository.firebase_service.calls
+    assert calls == [("update", "groups", {("groups", "G1", "2"): ["Carol"]}, [("groups", "G1", "1")])]
+    assert repository.get_write_stats()["skipped_writes"] == 1
+
+
+def test_group_ids_use_array_transforms():
+    """群組 ID 以增減方式更新"""
+    repository = _repository()
+    repository.load_data("group_ids")
+    assert repository.save_data("group_ids", ["G2"])
+    assert repository.firebase_service.calls == [("ids", ["G2"], ["G1"])]
+
+
+def test_falls_back_to_full_write():
+    """沒有快照或部分更新失敗時整份寫入"""
+    repository = _repository(fail_updates=True)
+    assert repository.save_data("group_ids", ["G1"])
+    groups = repository.load_data("groups")
+    groups["G1"]["3"] = ["Dave"]
+    assert repository.save_data("groups", groups)
+
+    kinds = [call[0] for call in repository.firebase_service.calls]
+    assert kinds == ["set", "update", "set"]
+
+
+def test_per_group_documents_diff_inside_field():
+    """群組文件只更新變更的子欄位，新群組整份寫入"""
+    repository = _repository(layout="per_group")
+    groups = repository.load_data("groups")
+    groups["G1"]["1"] = ["Eve"]
+    groups["G2"] = {"1": ["Frank"]}
+
+    assert repository.save_data("groups", groups)
+    calls = sorted(repository.firebase_service.calls, key=str)
+    assert ("set", "G2") in calls
+    assert ("update", "G1", {("rotation", "1"): ["Eve"]}, []) in calls
+
+
+def test_write_behind_coalesces_writes():
+    """延遲寫入將多次變更合併為一次"""
+    repository = _repository()
+    repository.enable_write_behind(debounce_seconds=60)
+    groups = repository.load_data("groups")
+    for name in ("A", "B", "C"):
+        groups["G1"]["1"] = [name]
+        repository.save_data("groups", groups)
+
+    assert repository.firebase_service.calls == []
+    assert repository.flush() == 1
+    assert repository.firebase_service.calls == [("update", "groups", {("groups", "G1", "1"): ["C"]}, [])]
+    repository.write_behind.stop()
+
+
+def test_incomplete_migration_stays_on_legacy():
+    """群組文件遷移未完成時沿用 bot_config，完成後才切換"""
+    repository = _repository(layout="per_group", migration={"completed": False, "migrated": 1})
+    repository.migrate_layout_if_needed()
+    assert repository.layout == "legacy"
+    assert repository.load_data("groups") == {"G1": {"1": ["Alice"], "2": ["Bob"]}}
+    assert not repository.uses_group_documents("groups")
+
+    repository = _repository(layout="per_group")
+    repository.migrate_layout_if_needed()
+    assert repository.layout == "per_group"
+    assert repository.load_data("groups") == {"G1": {"1": ["Alice"]}}
+
+
+def test_write_behind_retries_failed_writes():
+    """寫入失敗的項目重新標記並以退避重試，較新的值優先，超過次數才放棄"""
+    written = []
+    retried = threading.Event()
+
+    def flaky_writer(data_type, data, group_id):
+        if not written and not retried.is_set():
+            retried.set()
+            return False
+        written.append(data)
+        return True
+
+    buffer = WriteBehindBuffer(flaky_writer, debounce_seconds=0.01, retry_base_seconds=0.05)
+    buffer.start()
+    buffer.mark("A", "groups", 1)
+    for _ in range(100):
+        if written:
+            break
+        time.sleep(0.02)
+    buffer.stop()
+    assert written == [1]
+    assert buffer.get_stats()["retried"] == 1
+
+    # 寫入期間有新的變更：失敗的舊值不重試，只寫入新值
+    written = []
+
+    def racing_writer(data_type, data, group_id):
+        if data == 1:
+            buffer.mark("A", "groups", 2)
+            return False
+        written.append(data)
+        return True
+
+    buffer = WriteBehindBuffer(racing_writer, debounce_seconds=60)
+    buffer.mark("A", "groups", 1)
+    assert buffer.flush() == 0
+    assert buffer.flush() == 1
+    assert written == [2] and not buffer.has_pending()
+
+    # 持續失敗：達到上限後放棄
+    buffer = WriteBehindBuffer(lambda *args: False, debounce_seconds=60, max_retries=3)
+    buffer.mark("B", "groups", 1)
+    for _ in range(3):
+        buffer.flush()
+    stats = buffer.get_stats()
+    assert not buffer.has_pending()
+    assert stats["failed"] == 3 and stats["retried"] == 2 and stats["dropped"] == 1
+    print("✅ 延遲寫入失敗後重試")
+
+
+if __name__ == "__main__":
+    test_partial_update_sends_only_changed_fields()
+    test_group_ids_use_array_transforms()
+    test_falls_back_to_full_write()
+    test_per_group_documents_diff_inside_field()
+    test_write_behind_coalesces_writes()
+    test_incomplete_migration_stays_on_legacy()
+    test_write_behind_retries_failed_writes()
+    print("✅ 所有存儲庫測試通過")
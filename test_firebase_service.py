@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Firebase 服務測試 - 群組文件遷移與排程租約
+以記憶體中的假 Firestore 執行，無需 Firebase 連接
+"""
+
+import copy
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from firebase_admin import firestore
+
+from firebase_service import FirebaseService
+
+
+class _FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class _FakeDocument:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        return _FakeSnapshot(self.id, self.db.data[self.collection].get(self.id))
+
+    def set(self, data, merge=False):
+        self.db.check_write(self.collection)
+        current = dict(self.db.data[self.collection].get(self.id) or {}) if merge else {}
+        for key, value in data.items():
+            if value is firestore.DELETE_FIELD:
+                current.pop(key, None)
+            else:
+                current[key] = copy.deepcopy(value)
+        self.db.data[self.collection][self.id] = current
+
+    def delete(self):
+        self.db.check_write(self.collection)
+        self.db.data[self.collection].pop(self.id, None)
+
+
+class _FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return _FakeDocument(self.db, self.name, doc_id)
+
+    def stream(self):
+        return [_FakeSnapshot(doc_id, data) for doc_id, data in list(self.db.data[self.name].items())]
+
+
+class _FakeTransaction:
+    """暫存交易中的寫入，commit 時才套用"""
+
+    def __init__(self):
+        self.operations = []
+
+    def set(self, doc_ref, data):
+        self.operations.append(lambda: doc_ref.set(data))
+
+    def delete(self, doc_ref):
+        self.operations.append(doc_ref.delete)
+
+    def commit(self):
+        for operation in self.operations:
+            operation()
+
+
+def _fake_transactional(function):
+    """取代 firestore.transactional：執行交易函數後提交"""
+    def run(transaction):
+        result = function(transaction)
+        transaction.commit()
+        return result
+    return run
+
+
+class _FakeFirestore:
+    """記憶體中的 Firestore，可設定 groups 集合寫入幾次後失敗"""
+
+    def __init__(self):
+        self.data = defaultdict(dict)
+        self.group_writes_left = None
+        self.transactions = 0
+
+    def collection(self, name):
+        return _FakeCollection(self, name)
+
+    def transaction(self):
+        self.transactions += 1
+        return _FakeTransaction()
+
+    def check_write(self, collection):
+        if collection != "groups" or self.group_writes_left is None:
+            return
+        if self.group_writes_left <= 0:
+            raise RuntimeError("deadline exceeded")
+        self.group_writes_left -= 1
+
+
+def _service(db):
+    service = FirebaseService.__new__(FirebaseService)
+    service.db = db
+    service.initialized = True
+    return service
+
+
+def test_migration_resumes_from_legacy_data():
+    """中斷後重跑以 bot_config 為準：更新已變更的群組、刪除已移除的群組"""
+    db = _FakeFirestore()
+    db.data["bot_config"]["groups"] = {"groups": {
+        "G1": {"1": ["Alice"]}, "G2": {"1": ["Bob"]}, "G3": {"1": ["Carol"]},
+    }}
+    service = _service(db)
+
+    db.group_writes_left = 2
+    result = service.migrate_to_group_documents()
+    assert result["completed"] is False and result["migrated"] == 2
+    first, second = sorted(db.data["groups"])
+    (remaining,) = {"G1", "G2", "G3"} - {first, second}
+
+    # 遷移未完成期間服務仍寫入 bot_config
+    legacy = db.data["bot_config"]["groups"]["groups"]
+    legacy[first] = {"1": ["Dave"]}
+    del legacy[second]
+
+    db.group_writes_left = None
+    result = service.migrate_to_group_documents()
+    assert result["completed"] is True
+    assert db.data["groups"][first]["rotation"] == {"1": ["Dave"]}
+    assert second not in db.data["groups"]
+    assert db.data["groups"][remaining]["legacy_migrated"] is True
+    assert db.data["bot_config"]["group_documents_migration"]["completed"] is True
+
+    assert service.migrate_to_group_documents() == {"completed": True, "migrated": 0, "skipped": 0}
+    print("✅ 群組文件遷移可中斷後續跑")
+
+
+def test_migration_skips_unchanged_documents():
+    """已搬移且內容相同的群組不重寫"""
+    db = _FakeFirestore()
+    db.data["bot_config"]["groups"] = {"groups": {"G1": {"1": ["Alice"]}}}
+    db.data["bot_config"]["group_schedules"] = {"schedules": {"G1": {"days": "mon", "hour": 9, "minute": 0}}}
+    db.data["groups"]["G1"] = {
+        "rotation": {"1": ["Alice"]}, "schedule": {"days": "mon", "hour": 9, "minute": 0}, "legacy_migrated": True,
+    }
+    db.group_writes_left = 0
+
+    result = _service(db).migrate_to_group_documents()
+    assert result == {"completed": True, "migrated": 0, "skipped": 1}
+    print("✅ 未變更的群組文件不重寫")
+
+
+def test_lease_single_holder_until_expiry():
+    """租約同時只有一個持有者；到期後可由其他副本取得，只有持有者能釋放"""
+    db = _FakeFirestore()
+    service = _service(db)
+    with mock.patch.object(firestore, "transactional", _fake_transactional):
+        assert service.acquire_lease("scheduler", "A", 30)
+        assert not service.acquire_lease("scheduler", "B", 30)
+        assert service.acquire_lease("scheduler", "A", 30)
+        assert db.data["bot_config"]["lease_scheduler"]["holder"] == "A"
+
+        assert not service.release_lease("scheduler", "B")
+        assert "lease_scheduler" in db.data["bot_config"]
+
+        # A 停止續約，租約到期
+        db.data["bot_config"]["lease_scheduler"]["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        assert service.acquire_lease("scheduler", "B", 30)
+        assert db.data["bot_config"]["lease_scheduler"]["holder"] == "B"
+        assert not service.acquire_lease("scheduler", "A", 30)
+
+        assert not service.release_lease("scheduler", "A")
+        assert service.release_lease("scheduler", "B")
+        assert "lease_scheduler" not in db.data["bot_config"]
+        assert db.transactions == 8
+    print("✅ 租約同時只有一個持有者")
+
+
+def test_lease_errors_mean_not_held():
+    """交易失敗時視為沒有持有租約"""
+    db = _FakeFirestore()
+    db.transaction = mock.Mock(side_effect=RuntimeError("unavailable"))
+    service = _service(db)
+    with mock.patch.object(firestore, "transactional", _fake_transactional):
+        assert service.acquire_lease("scheduler", "A", 30) is False
+        assert service.release_lease("scheduler", "A") is False
+    print("✅ 交易失敗時不持有租約")
+
+
+if __name__ == "__main__":
+    test_migration_resumes_from_legacy_data()
+    test_migration_skips_unchanged_documents()
+    test_lease_single_holder_until_expiry()
+    test_lease_errors_mean_not_held()
+    print("✅ 所有 Firebase 服務測試完成！")
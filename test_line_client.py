@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+LINE 客戶端測試 - 事件迴圈、同步介面與關閉
+以假的 AsyncApiClient / AsyncMessagingApi 取代 aiohttp，無需 LINE 連接
+"""
+
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from linebot.v3.messaging import ApiException
+from linebot.v3.messaging.models import PushMessageRequest, ReplyMessageRequest, TextMessage
+
+from services.line_client import LineClient
+
+
+class _FakeApiClient:
+    """記錄是否在事件迴圈內關閉的假連線池"""
+
+    def __init__(self, configuration):
+        self.configuration = configuration
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+
+    async def close(self):
+        assert asyncio.get_running_loop() is self.loop
+        self.closed = True
+
+
+class _FakeMessagingApi:
+    """推播給 "bad" 時回傳 400，其餘成功；可暫停以觀察在途數量"""
+
+    def __init__(self, api_client):
+        self.api_client = api_client
+        self.calls = []
+        self.gate = None
+
+    async def push_message(self, request, x_line_retry_key=None):
+        self.calls.append(("push", request.to, x_line_retry_key, threading.current_thread().name))
+        if self.gate is not None:
+            while not self.gate.is_set():
+                await asyncio.sleep(0.01)
+        if request.to == "bad":
+            raise ApiException(status=400, reason="Bad Request")
+        return {"sentMessages": [{"id": "1"}]}
+
+    async def reply_message(self, request):
+        self.calls.append(("reply", request.reply_token, None, threading.current_thread().name))
+        return {}
+
+
+def _client():
+    patches = [
+        mock.patch("services.line_client.AsyncApiClient", _FakeApiClient),
+        mock.patch("services.line_client.AsyncMessagingApi", _FakeMessagingApi),
+    ]
+    for patch in patches:
+        patch.start()
+    return LineClient("token", pool_size=4, timeout=5), patches
+
+
+def _push(to):
+    return PushMessageRequest(to=to, messages=[TextMessage(text="hi")])
+
+
+def test_sync_calls_run_on_loop_thread():
+    """同步介面在事件迴圈執行緒送出請求，並帶入 Retry-Key"""
+    client, patches = _client()
+    try:
+        assert client.push_message(_push("G1"), x_line_retry_key="k1") == {"sentMessages": [{"id": "1"}]}
+        client.reply_message(ReplyMessageRequest(replyToken="r1", messages=[TextMessage(text="ok")]))
+
+        calls = client._api.calls
+        assert [call[:3] for call in calls] == [("push", "G1", "k1"), ("reply", "r1", None)]
+        assert {call[3] for call in calls} == {"line-client"}
+        stats = client.get_stats()
+        assert (stats["running"], stats["sent"], stats["failed"], stats["pool_size"]) == (True, 2, 0, 4)
+    finally:
+        client.close()
+        for patch in patches:
+            patch.stop()
+    print("✅ 同步介面經由事件迴圈送出")
+
+
+def test_errors_propagate_to_caller():
+    """LINE 回傳錯誤時由呼叫端收到原本的 ApiException"""
+    client, patches = _client()
+    try:
+        try:
+            client.push_message(_push("bad"))
+            assert False, "應該拋出 ApiException"
+        except ApiException as e:
+            assert e.status == 400
+        assert client.get_stats()["failed"] == 1
+    finally:
+        client.close()
+        for patch in patches:
+            patch.stop()
+    print("✅ 推播錯誤傳回呼叫端")
+
+
+def test_concurrent_requests_and_close():
+    """多個請求同時在途；關閉時在事件迴圈內關閉連線池並停止執行緒"""
+    client, patches = _client()
+    try:
+        client.start()
+        gate = threading.Event()
+        client._api.gate = gate
+        futures = [client.push_message_async(_push(f"G{i}")) for i in range(5)]
+        for _ in range(100):
+            if client.get_stats()["in_flight"] == 5:
+                break
+            time.sleep(0.01)
+        gate.set()
+        assert all(future.result(5) for future in futures)
+        assert client.get_stats()["max_in_flight"] == 5
+
+        thread = client._thread
+        api_client = client._api_client
+        client.close()
+        assert api_client.closed
+        assert not thread.is_alive()
+        assert client.get_stats()["running"] is False
+        client.close()  # 重複關閉不報錯
+    finally:
+        for patch in patches:
+            patch.stop()
+    print("✅ 並行請求與關閉正確")
+
+
+if __name__ == "__main__":
+    test_sync_calls_run_on_loop_thread()
+    test_errors_propagate_to_caller()
+    test_concurrent_requests_and_close()
+    print("✅ 所有 LINE 客戶端測試完成！")
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+推播測試 - 發送佇列的重試與本機日誌
+以假的發送函數模擬 LINE 回應，無需 LINE 連接
+"""
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from datetime import date, datetime
+
+import pytz
+
+from services.notification_service import NotificationService
+from services.outbound_queue import OutboundQueue
+from services.reminder_fanout import ReminderFanout
+from services.reminder_ledger import ReminderLedger
+
+
+class _ApiError(Exception):
+    """模擬 LINE ApiException"""
+
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers
+
+
+class _FlakySender:
+    """依序回傳指定結果的發送函數"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def __call__(self, to, text, retry_key):
+        self.calls.append((to, retry_key))
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome is not None:
+            raise outcome
+
+
+def _queue(sender, journal_path=None):
+    return OutboundQueue(sender, journal_path=journal_path, rate_per_second=1000,
+                         workers=1, max_retries=2, base_backoff=0.01, max_backoff=0.05)
+
+
+def test_retries_reuse_retry_key():
+    """429 / 5xx 重試時沿用同一個 Retry-Key，409 視為已送達"""
+    sender = _FlakySender([_ApiError(429, {"Retry-After": "0"}), _ApiError(500), _ApiError(409)])
+    queue = _queue(sender)
+    queue.start()
+    try:
+        assert queue.enqueue("G1", "hi").wait(5) == OutboundQueue.RESULT_SENT
+        assert len({key for _, key in sender.calls}) == 1
+        stats = queue.get_stats()
+        assert (stats["retries"], stats["duplicates"], stats["depth"]) == (2, 1, 0)
+    finally:
+        queue.stop()
+
+
+def test_client_errors_and_exhausted_retries_drop():
+    """400 不重試；重試次數用盡時丟棄"""
+    queue = _queue(_FlakySender([_ApiError(400), _ApiError(503), _ApiError(503), _ApiError(503)]))
+    queue.start()
+    try:
+        assert queue.enqueue("G1", "bad").wait(5) == OutboundQueue.RESULT_DROPPED
+        assert queue.enqueue("G2", "down").wait(5) == OutboundQueue.RESULT_DROPPED
+        assert queue.get_stats()["dropped"] == 2
+    finally:
+        queue.stop()
+
+
+def test_journal_resumes_after_restart():
+    """重啟後繼續發送日誌中未完成的推播"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "outbound.jsonl")
+        first = _queue(_FlakySender([]), journal_path=path)
+        # 未啟動 worker 就停止，模擬發送途中重啟
+        pending = first.enqueue("G1", "resume me")
+        first.stop()
+
+        sender = _FlakySender([])
+        second = _queue(sender, journal_path=path)
+        second.start()
+        try:
+            for _ in range(200):
+                if second.get_stats()["sent"] == 1:
+                    break
+                time.sleep(0.01)
+            assert second.get_stats()["sent"] == 1
+            assert sender.calls == [("G1", pending.retry_key)]
+            assert second.get_stats()["recovered"] == 1
+        finally:
+            second.stop()
+
+        third = _queue(_FlakySender([]), journal_path=path)
+        third.start()
+        third.stop()
+        assert third.get_stats()["recovered"] == 0
+
+
+def test_ledger_dedupes_across_restarts():
+    """已發送的提醒在重啟後仍會略過；失敗的提醒可以重試；過期紀錄會清除"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.jsonl")
+        day = date(2024, 1, 4)
+        ledger = ReminderLedger(path, keep_days=3)
+        assert ledger.claim("G1", day, "17:10")
+        assert not ledger.claim("G1", day, "17:10")
+        ledger.commit("G1", day, "17:10")
+        assert ledger.claim("G2", day, "17:10")
+        ledger.release("G2", day, "17:10")
+        ledger.close()
+
+        restarted = ReminderLedger(path, keep_days=3)
+        assert restarted.was_sent("G1", day, "17:10")
+        assert not restarted.claim("G1", day, "17:10")
+        assert restarted.claim("G2", day, "17:10")
+
+        restarted.prune(date(2024, 1, 10))
+        restarted.close()
+        assert ReminderLedger(path).get_stats()["days"] == {}
+
+
+def test_async_sender_keeps_many_pushes_in_flight():
+    """sender 回傳 Future 時 worker 不等待回應，回應後才完成或重試"""
+    futures = []
+
+    def async_sender(to, text, retry_key):
+        future = Future()
+        futures.append((to, retry_key, future))
+        return future
+
+    queue = _queue(async_sender)
+    queue.start()
+    try:
+        messages = [queue.enqueue(f"G{i}", "hi") for i in range(5)]
+        for _ in range(200):
+            if len(futures) == 5:
+                break
+            time.sleep(0.01)
+        # 單一 worker 也能同時有 5 則推播在途
+        assert len(futures) == 5 and queue.get_stats()["in_flight"] == 5
+
+        first_key = futures[0][1]
+        futures[0][2].set_exception(_ApiError(500))
+        for _, _, future in futures[1:]:
+            future.set_result({})
+        for _ in range(200):
+            if len(futures) == 6:
+                break
+            time.sleep(0.01)
+        assert futures[5][:2] == ("G0", first_key)
+        futures[5][2].set_result({})
+
+        assert all(message.wait(2) == "sent" for message in messages)
+        stats = queue.get_stats()
+        assert (stats["sent"], stats["retries"], stats["in_flight"]) == (5, 1, 0)
+    finally:
+        queue.stop()
+
+
+class _DutyMembers:
+    """每天都由 Alice 負責的成員服務"""
+
+    def get_current_day_member(self, group_id, target_date):
+        return "Alice"
+
+    def get_group_message_template(self, group_id):
+        return None
+
+
+def test_queued_reminder_keeps_claim_until_sent():
+    """推播等待逾時仍在佇列中時保留佔位，完成後才寫入發送紀錄"""
+    gate = threading.Event()
+    sender = _FlakySender([])
+
+    def slow_sender(to, text, retry_key):
+        gate.wait(5)
+        sender(to, text, retry_key)
+
+    queue = _queue(slow_sender)
+    queue.start()
+    ledger = ReminderLedger()
+    service = NotificationService(_DutyMembers(), outbound_queue=queue)
+    service._messaging_api = object()
+    service.reminder_ledger = ledger
+    service.PUSH_WAIT_SECONDS = 0.05
+    fire_time = pytz.timezone('Asia/Taipei').localize(datetime(2024, 1, 4, 17, 10))
+    try:
+        assert service.send_group_reminder("G1", fire_time) is False
+        # 重新觸發或補發時不會再排入第二則推播
+        assert service.send_group_reminder("G1", fire_time) is True
+        assert not ledger.was_sent("G1", date(2024, 1, 4), "17:10")
+
+        gate.set()
+        for _ in range(200):
+            if ledger.was_sent("G1", date(2024, 1, 4), "17:10"):
+                break
+            time.sleep(0.01)
+        assert ledger.was_sent("G1", date(2024, 1, 4), "17:10")
+        assert len(sender.calls) == 1
+        assert ledger.get_stats()["in_flight"] == 0
+    finally:
+        queue.stop()
+
+
+def test_fanout_does_not_wait_for_queued_pushes():
+    """提醒分派只排入發送佇列不等待，推播完成時才記錄成功與延遲"""
+    gate = threading.Event()
+    sender = _FlakySender([])
+
+    def slow_sender(to, text, retry_key):
+        gate.wait(5)
+        sender(to, text, retry_key)
+
+    queue = _queue(slow_sender)
+    queue.start()
+    service = NotificationService(_DutyMembers(), outbound_queue=queue)
+    service._messaging_api = object()
+    service.reminder_ledger = ReminderLedger()
+    fanout = ReminderFanout(workers=1)
+    fanout.start()
+    fire_time = pytz.timezone('Asia/Taipei').localize(datetime(2024, 1, 4, 17, 10))
+    try:
+        started = time.monotonic()
+        wave = fanout.submit([(f"G{i}", service.send_group_reminder) for i in range(5)], fire_time, "17:10")
+        # 單一 worker 也不會卡在第一則推播上
+        assert fanout.join(timeout=2)
+        assert time.monotonic() - started < service.PUSH_WAIT_SECONDS
+        assert (wave.sent, wave.failed) == (0, 0)
+
+        gate.set()
+        for _ in range(200):
+            if wave.done:
+                break
+            time.sleep(0.01)
+        assert (wave.sent, wave.failed) == (5, 0)
+        assert len(wave.lag_seconds) == 5 and len(sender.calls) == 5
+        assert service.reminder_ledger.was_sent("G4", date(2024, 1, 4), "17:10")
+    finally:
+        fanout.stop()
+        queue.stop()
+
+
+if __name__ == "__main__":
+    test_retries_reuse_retry_key()
+    test_client_errors_and_exhausted_retries_drop()
+    test_journal_resumes_after_restart()
+    test_ledger_dedupes_across_restarts()
+    test_async_sender_keeps_many_pushes_in_flight()
+    test_queued_reminder_keeps_claim_until_sent()
+    test_fanout_does_not_wait_for_queued_pushes()
+    print("✅ 所有推播測試通過")
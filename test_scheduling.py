@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+"""
+排程測試 - 時段分派器
+使用暫停中的 BackgroundScheduler，無需 LINE 或 Firebase 連接
+"""
+
+import copy
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import pytz
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from services.delivery_health import DeliveryHealth, classify_status
+from services.followup_service import FollowUpService
+from services.group_lifecycle import GroupLifecycle
+from services.leader_election import FileLease, LeaderElector, WorkerSlot
+from services.member_service import MemberService
+from services.reminder_fanout import ReminderFanout
+from services.rotation import CompiledRotation
+from services.send_plan import SendPlanner
+from services.schedule_service import ScheduleService
+from services.state_sync import StateSync
+from services.timing_wheel import TimingWheel
+
+
+class _MemoryRepository:
+    """只存在記憶體的資料存儲庫"""
+
+    def __init__(self, data=None):
+        self.data = data or {}
+        self.writes = 0
+
+    def load_data(self, data_type, default_value=None):
+        return self.data.get(data_type, default_value)
+
+    def save_data(self, data_type, data, group_id=None):
+        self.data[data_type] = data
+        self.writes += 1
+        return True
+
+
+def _noop(group_id, scheduled_time=None):
+    return True
+
+
+def _schedule_service(data=None):
+    scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Taipei'))
+    scheduler.start(paused=True)
+    return scheduler, ScheduleService(_MemoryRepository(data), scheduler, {})
+
+
+def test_groups_share_slot_jobs():
+    """相同時段的群組共用任務，時段觸發時分派給所有群組"""
+    scheduler, service = _schedule_service()
+    fired = []
+    try:
+        for i in range(50):
+            service.update_schedule(f"G{i}", "mon,thu", 17, 10, lambda gid, scheduled_time: fired.append(gid))
+        service.update_schedule("G_other", "fri", 8, 0, lambda gid, scheduled_time: fired.append(gid))
+
+        assert len(scheduler.get_jobs()) == 3
+        assert len(service.group_jobs) == 51
+        assert service.group_jobs["G0"].next_run_time is not None
+
+        service.dispatcher._fire(("mon", 17, 10))
+        assert sorted(fired) == sorted(f"G{i}" for i in range(50))
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_move_and_remove_update_index():
+    """移動或移除群組只更新索引，時段清空時才移除任務"""
+    scheduler, service = _schedule_service()
+    try:
+        service.update_schedule("G1", "mon", 17, 10, _noop)
+        service.update_schedule("G2", "mon", 17, 10, _noop)
+        service.update_schedule("G1", "tue", 9, 30, _noop)
+
+        assert service.dispatcher.groups_for_slot(("mon", 17, 10)) == {"G2"}
+        assert service.dispatcher.groups_for_slot(("tue", 9, 30)) == {"G1"}
+        assert len(scheduler.get_jobs()) == 2
+
+        service.group_jobs.pop("G2").remove()
+        assert len(scheduler.get_jobs()) == 1
+        assert service.group_schedules["G1"] == {"days": "tue", "hour": 9, "minute": 30}
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_startup_registration_writes_once():
+    """啟動時只註冊任務；有新增預設排程時才寫入一次"""
+    schedules = {f"G{i}": {"days": "mon,thu", "hour": 17, "minute": 10} for i in range(20)}
+    scheduler, service = _schedule_service({"group_schedules": schedules})
+    try:
+        assert service.initialize_jobs(_noop) == 20
+        assert service.ensure_default_schedules([f"G{i}" for i in range(20)], _noop) == 0
+        assert service.data_manager.writes == 0
+
+        assert service.ensure_default_schedules(["G0", "N1", "N2"], _noop) == 2
+        assert service.data_manager.writes == 1
+        assert len(service.group_jobs) == 22
+        assert len(scheduler.get_jobs()) == 2
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_fanout_orders_by_schedule_and_tracks_lag():
+    """提醒依排定時間排序推播，並記錄每批的延遲"""
+    tz = pytz.timezone('Asia/Taipei')
+    now = datetime.now(tz)
+    sent = []
+    lock = threading.Lock()
+
+    def push(group_id, scheduled_time):
+        with lock:
+            sent.append(group_id)
+        return group_id != "bad"
+
+    fanout = ReminderFanout(workers=1)
+    later = fanout.submit([(f"L{i}", push) for i in range(3)], now, "later")
+    earlier = fanout.submit([("E1", push), ("bad", push)], now - timedelta(minutes=5), "earlier")
+    fanout.start()
+    assert fanout.join(timeout=5)
+    fanout.stop()
+
+    assert set(sent[:2]) == {"E1", "bad"}
+    assert (earlier.sent, earlier.failed, later.sent) == (1, 1, 3)
+    stats = fanout.get_stats()["waves"]
+    assert stats[1]["lag_seconds"]["max"] >= 300
+    assert stats[0]["completed"] and stats[1]["completed"]
+
+
+def test_late_fire_keeps_scheduled_date():
+    """時段延遲到隔天才執行時，排定時間仍是原本的日期與時間"""
+    tz = pytz.timezone('Asia/Taipei')
+    scheduler, service = _schedule_service()
+    fired = []
+    try:
+        service.update_schedule("G1", "mon", 23, 59, lambda gid, scheduled_time: fired.append(scheduled_time))
+        # 2026-01-05 是星期一，排程器延遲到星期二 00:02 才執行
+        service.dispatcher._fire(("mon", 23, 59), now=tz.localize(datetime(2026, 1, 6, 0, 2)))
+        # 提早幾秒觸發仍對應本次時段
+        service.dispatcher._fire(("mon", 23, 59), now=tz.localize(datetime(2026, 1, 5, 23, 58, 59)))
+    finally:
+        scheduler.shutdown(wait=False)
+
+    expected = tz.localize(datetime(2026, 1, 5, 23, 59))
+    assert fired == [expected, expected]
+    print("✅ 延遲觸發保留排定日期")
+
+def test_send_plan_invalidates_changed_groups():
+    """推播計畫預先產生文字，群組資料變更後只重新產生該群組"""
+    monday = date(2024, 1, 1)
+    data = {
+        "group_schedules": {"G1": {"days": "mon,thu", "hour": 17, "minute": 10},
+                            "G2": {"days": "tue", "hour": 8, "minute": 0}},
+        "groups": {"G1": {"1": ["Alice", "Bob"]}},
+        "base_date": monday,
+    }
+    scheduler, service = _schedule_service(data)
+    members = MemberService(service.data_manager, service)
+    rendered = []
+
+    def render(group_id, target_date):
+        rendered.append(group_id)
+        member = members.get_current_day_member(group_id, target_date)
+        return f"{group_id}:{member}" if member else None
+
+    try:
+        planner = SendPlanner(members, service, render)
+        assert planner.build(monday) == 1
+        assert planner.get_text("G1", monday) == "G1:Alice"
+        assert planner.get_entry("G1", monday).fire_time.strftime("%H:%M") == "17:10"
+        assert rendered == ["G1"]
+
+        members.update_member_schedule(1, ["Carol"], "G1")
+        assert planner.get_text("G1", monday) == "G1:Carol"
+        assert rendered == ["G1", "G1"]
+        assert planner.get_stats()["hits"] == 2
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_catch_up_coalesces_and_bounds_missed_fires():
+    """啟動時補發時間窗內錯過的提醒：每群組一次、略過已發送、有數量上限"""
+    scheduler, service = _schedule_service()
+    fired = []
+    try:
+        callback = lambda gid, scheduled_time: fired.append((gid, scheduled_time.strftime("%H:%M")))
+        for gid in ("G1", "G2", "G3"):
+            service.update_schedule(gid, "thu", 17, 10, callback)
+        service.update_schedule("G1", "thu", 17, 40, callback)
+        service.update_schedule("G4", "thu", 17, 40, callback)
+        service.update_schedule("G5", "wed", 17, 10, callback)
+
+        # 2024-01-04 是週四
+        now = pytz.timezone('Asia/Taipei').localize(datetime(2024, 1, 4, 17, 45))
+        sent = {("G2", "17:10")}
+        result = service.dispatcher.catch_up(
+            3600, 2, was_sent=lambda gid, day, slot: (gid, slot) in sent, now=now)
+
+        assert result == {"missed": 3, "already_sent": 1, "dispatched": 2, "skipped_over_limit": 1}
+        assert sorted(fired) == [("G1", "17:40"), ("G4", "17:40")]
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_file_lease_elects_single_leader_and_fails_over():
+    """同一台主機上只有一個 worker 成為主節點，主節點停止後另一個接手"""
+    events = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scheduler.lock")
+        electors = [
+            LeaderElector(FileLease(path, name), "file",
+                          on_elected=lambda name=name: events.append((name, "elected")),
+                          on_demoted=lambda name=name: events.append((name, "demoted")),
+                          renew_interval=60)
+            for name in ("A", "B")
+        ]
+        first, second = electors
+        first.tick()
+        second.tick()
+        assert first.is_leader and not second.is_leader
+
+        first.stop()
+        second.tick()
+        assert second.is_leader
+        assert events == [("A", "elected"), ("A", "demoted"), ("B", "elected")]
+        second.stop()
+        assert second.get_stats()["transitions"][-1]["reason"] == "shutdown"
+
+
+class _SharedStore(_MemoryRepository):
+    """多個副本共用的資料存儲庫：每次讀寫都複製，模擬各副本各自的記憶體資料"""
+
+    def load_data(self, data_type, default_value=None):
+        return copy.deepcopy(self.data.get(data_type, default_value))
+
+    def save_data(self, data_type, data, group_id=None):
+        return super().save_data(data_type, copy.deepcopy(data), group_id)
+
+
+def test_state_sync_applies_follower_changes_on_leader():
+    """非主節點寫入的排程、輪值表與文案在主節點同步後生效，未變更的群組不失效"""
+    store = _SharedStore({"groups": {"G1": {"1": ["A"]}, "G2": {"1": ["B"]}}})
+    replicas = []
+    for _ in range(2):
+        scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Taipei'))
+        scheduler.start(paused=True)
+        schedules = ScheduleService(store, scheduler, {})
+        replicas.append((scheduler, MemberService(store, schedules), schedules))
+    (leader_scheduler, leader_members, leader_schedules), (follower_scheduler, follower_members, follower_schedules) = replicas
+    try:
+        for gid in ("G1", "G2"):
+            leader_schedules.update_schedule(gid, "mon", 17, 10, _noop)
+        follower_schedules.reload_data()
+        assert leader_members.get_current_group("G1") == ["A"]
+        g2_versions = (leader_members.get_state_version("G2"), leader_schedules.get_state_version("G2"))
+
+        # 在非主節點上執行 @time、@week、@message
+        follower_schedules.update_schedule("G1", "fri", 8, 30, _noop)
+        follower_members.reload_data()
+        follower_members.add_member_to_week(1, "C", "G1")
+        follower_members.set_group_message_template("G1", "輪到 {name}")
+        assert leader_schedules.dispatcher.groups_for_slot(("fri", 8, 30)) == set()
+
+        sync = StateSync(lambda: {
+            "groups": len(leader_members.refresh_data()),
+            "schedules": len(leader_schedules.refresh_jobs(_noop)),
+        })
+        assert sync.sync_now()
+        assert sync.last_changes == {"groups": 1, "schedules": 1}
+        assert leader_schedules.dispatcher.groups_for_slot(("fri", 8, 30)) == {"G1"}
+        assert leader_schedules.dispatcher.groups_for_slot(("mon", 17, 10)) == {"G2"}
+        assert leader_members.groups["G1"]["1"] == ["A", "C"]
+        assert leader_members.get_group_message_template("G1") == "輪到 {name}"
+        assert (leader_members.get_state_version("G2"), leader_schedules.get_state_version("G2")) == g2_versions
+
+        # 沒有變更時不失效任何群組
+        assert sync.sync_now() and sync.last_changes == {"groups": 0, "schedules": 0}
+
+        # 其他副本刪除排程或暫停時移除時段
+        follower_schedules.suspend_group("G1", {"probes": 1})
+        leader_schedules.refresh_jobs(_noop)
+        assert "G1" not in leader_schedules.dispatcher.registered_groups()
+        assert "G1" not in leader_schedules.group_jobs
+    finally:
+        leader_scheduler.shutdown(wait=False)
+        follower_scheduler.shutdown(wait=False)
+
+
+def test_worker_slots_are_unique_and_reused():
+    """同一台主機的 worker 取得不同編號，結束後重新啟動的 worker 沿用同一編號的日誌"""
+    with tempfile.TemporaryDirectory() as tmp:
+        lock_path = os.path.join(tmp, "scheduler.lock")
+        first, second = WorkerSlot(lock_path), WorkerSlot(lock_path)
+        journal = os.path.join(tmp, "timers.jsonl")
+        assert first.path_for(journal) == os.path.join(tmp, "timers.w0.jsonl")
+        assert second.path_for(journal) == os.path.join(tmp, "timers.w1.jsonl")
+        assert first.path_for(None) is None
+
+        first.release()
+        restarted = WorkerSlot(lock_path)
+        assert restarted.acquire() == 0
+        restarted.release()
+        second.release()
+    print("✅ worker 編號不重複且可接手")
+
+
+def test_timing_wheel_fires_cancels_and_recovers():
+    """時間輪：到期觸發、取消不觸發、超過一圈的計時器等到該圈，重啟後還原"""
+    fired = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "timers.jsonl")
+        wheel = TimingWheel(tick_seconds=1, wheel_size=8, journal_path=path)
+        wheel.register_handler("note", lambda payload: fired.append(payload["n"]))
+        start = datetime.now().timestamp()
+        wheel.schedule("a", 3, "note", {"n": "a"})
+        wheel.schedule("b", 3, "note", {"n": "b"})
+        wheel.schedule("c", 20, "note", {"n": "c"})
+        assert wheel.cancel("b") and not wheel.cancel("b")
+
+        wheel.advance(start + 10)
+        assert fired == ["a"]
+        wheel.stop()
+
+        restored = TimingWheel(tick_seconds=1, wheel_size=8, journal_path=path)
+        restored.register_handler("note", lambda payload: fired.append(payload["n"]))
+        assert restored.recovered == 1
+        assert restored.advance(start + 30) == 1
+        assert fired == ["a", "c"]
+        restored.stop()
+
+
+def test_followup_is_sent_unless_acknowledged():
+    """提醒後未回報完成才發送追蹤提醒；@done 取消"""
+    scheduler, service = _schedule_service({"group_schedules": {
+        "G1": {"days": "thu", "hour": 17, "minute": 10},
+        "G2": {"days": "thu", "hour": 17, "minute": 10},
+    }})
+    pushed = []
+
+    def enqueue(gid, text, retry_key=None, on_complete=None):
+        # 排入發送佇列，不在時間輪執行緒等待結果
+        pushed.append((gid, on_complete))
+        return None
+
+    try:
+        wheel = TimingWheel(tick_seconds=1, wheel_size=60)
+        members = MemberService(_MemoryRepository())
+        followups = FollowUpService(wheel, service, members, enqueue)
+        assert service.set_followup_minutes("G1", 30)["success"]
+        assert service.set_followup_minutes("G2", 30)["success"]
+        service.update_schedule("G1", "mon", 9, 0)
+        assert service.get_followup_minutes("G1") == 30
+
+        day = date(2024, 1, 4)
+        assert followups.arm("G1", day, "17:10") and followups.arm("G2", day, "17:10")
+        assert followups.acknowledge("G2")
+        wheel.advance(datetime.now().timestamp() + 31 * 60)
+        assert [gid for gid, _ in pushed] == ["G1"]
+        assert followups.get_stats()["sent"] == 0
+        pushed[0][1](True)
+        assert followups.get_stats()["sent"] == 1
+
+        # 只列出當天的負責成員，不是整週的成員
+        members = MemberService(_MemoryRepository({"groups": {"G2": {"1": ["A", "B"]}},
+                                                   "base_date": date(2024, 1, 1)}), service)
+        followups.member_service = members
+        assert members.get_current_day_member("G2", day) == "A"
+        assert "👤 負責：A\n" in followups.build_text("G2", day)
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_suspended_group_keeps_schedule_info_and_refuses_changes():
+    """暫停中的群組仍顯示排程設定；調整時間前需先恢復，恢復後沿用原本的星期"""
+    scheduler, service = _schedule_service()
+    try:
+        wheel = TimingWheel(tick_seconds=1, wheel_size=60)
+        health = DeliveryHealth(service, wheel, _noop, threshold=1)
+        service.update_schedule("G1", "tue,fri", 17, 10, _noop)
+        health.record("G1", False, 404)
+        assert "G1" not in service.group_jobs
+
+        info = service.get_schedule_info("G1")
+        assert info["is_configured"] and info["suspended"]
+        assert info["schedule_details"]["days"] == "tue,fri"
+        assert "暫停中" in service.get_schedule_summary("G1")
+
+        result = service.update_schedule("G1", hour=18, minute=0, reminder_callback=_noop)
+        assert not result["success"] and "@suspended revive" in result["message"]
+        assert service.group_schedules["G1"]["hour"] == 17
+        assert "G1" not in service.dispatcher.registered_groups()
+
+        assert health.revive("G1")
+        assert service.update_schedule("G1", hour=18, minute=0, reminder_callback=_noop)["success"]
+        config = service.group_schedules["G1"]
+        assert (config["days"], config["hour"], config["minute"]) == ("tue,fri", 18, 0)
+        assert "suspended" not in config
+        assert service.dispatcher.groups_for_slot(("fri", 18, 0)) == {"G1"}
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_bad_request_only_counts_when_recipient_is_invalid():
+    """400 只有在錯誤內容指出收件者無效時才計入無法送達，其他 400 視為訊息被拒"""
+    invalid_to = b'{"message":"The request body has 1 error(s)","details":[{"message":"invalid","property":"to"}]}'
+    bad_text = b'{"message":"The request body has 1 error(s)","details":[{"message":"too long","property":"messages[0].text"}]}'
+    assert classify_status(400, invalid_to) == "unreachable"
+    assert classify_status(400, "{\"message\":\"The property, 'to', in the request body is invalid\"}") == "unreachable"
+    assert classify_status(400, bad_text) == "rejected"
+    assert classify_status(400, b"not json") == "rejected"
+    assert classify_status(400) == "rejected"
+    assert classify_status(403) == classify_status(404) == "unreachable"
+
+    scheduler, service = _schedule_service()
+    try:
+        wheel = TimingWheel(tick_seconds=1, wheel_size=60)
+        health = DeliveryHealth(service, wheel, _noop, threshold=2)
+        service.update_schedule("G1", "thu", 17, 10, _noop)
+
+        for _ in range(3):
+            health.record("G1", False, 400, bad_text)
+        assert "G1" in service.dispatcher.registered_groups()
+        health.record("G1", False, 400, invalid_to)
+        health.record("G1", False, 400, invalid_to)
+        assert "G1" not in service.dispatcher.registered_groups()
+        assert health.get_stats()["failures_by_class"] == {"rejected": 3, "unreachable": 2}
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_leave_tears_down_group_and_sweep_reclaims_orphans():
+    """離開群組時清除所有狀態；定期回收只處理有證據的群組，需連續兩次確認才刪除"""
+    data = {
+        "group_ids": ["G1", "G2", "G4"],
+        "groups": {"G1": {"1": ["A"]}, "G2": {"1": ["B"]}, "G4": {"1": ["C"]}, "legacy": {"1": ["D"]}},
+        "group_messages": {"G1": "hi {name}", "G4": "bye"},
+    }
+    scheduler, service = _schedule_service(data)
+    try:
+        members = MemberService(service.data_manager)
+        lifecycle = GroupLifecycle(members, service, reclaim=True)
+        for gid in ("G1", "G2", "G4"):
+            service.update_schedule(gid, "thu", 17, 10, _noop)
+
+        freed = lifecycle.teardown("G1")
+        assert freed == {"schedule": 1, "jobs": 1, "group_ids": 1, "rotation": 1, "message": 1}
+        assert "G1" not in service.group_jobs and "G1" not in service.dispatcher.registered_groups()
+        assert "G1" not in members.groups and "G1" not in members.group_messages
+
+        # G4 探測後判定無法送達；排程任務沒有對應的排程設定時立即移除
+        service.suspend_group("G4", {"probes": 4, "gave_up": True})
+        service.dispatcher.register("G9", "mon", 8, 0, _noop)
+        first = lifecycle.sweep()
+        assert first["reclaimed_groups"] == 0 and first["freed"] == {"jobs": 1}
+        assert first["pending_confirmation"] == 1 and first["dry_run"] is False
+
+        second = lifecycle.sweep()
+        assert second["reclaimed_groups"] == 1
+        assert "G4" not in members.groups and "G4" not in service.group_schedules
+        assert set(members.groups) == {"G2", "legacy"}
+        assert service.dispatcher.registered_groups() == {"G2"}
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_sweep_keeps_unregistered_active_groups():
+    """不在 group_ids 的群組（例如早於 group_ids 建立的群組）有輪值表與排程時不會被回收"""
+    data = {"group_ids": ["G1"], "groups": {"G1": {"1": ["A"]}, "G3": {"1": ["C"]}}}
+    scheduler, service = _schedule_service(data)
+    try:
+        members = MemberService(service.data_manager)
+        for gid in ("G1", "G3"):
+            service.update_schedule(gid, "thu", 17, 10, _noop)
+
+        for reclaim in (True, False):
+            lifecycle = GroupLifecycle(members, service, reclaim=reclaim)
+            for _ in range(2):
+                result = lifecycle.sweep()
+                assert result["reclaimed_groups"] == 0 and result["would_reclaim"] == []
+                assert result["unverified_orphans"] == 1
+        assert members.groups["G3"] == {"1": ["C"]}
+        assert "G3" in service.group_schedules
+        assert service.dispatcher.registered_groups() == {"G1", "G3"}
+
+        # 預設只回報：有證據的群組也不刪除
+        service.suspend_group("G3", {"probes": 4, "gave_up": True})
+        dry_run = GroupLifecycle(members, service)
+        dry_run.sweep()
+        result = dry_run.sweep()
+        assert result["dry_run"] is True and result["would_reclaim"] == ["G3"]
+        assert "G3" in members.groups and "G3" in service.group_schedules
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_unreachable_group_is_suspended_probed_and_revived():
+    """連續無法送達時暫停排程，探測失敗加倍間隔，手動恢復後重新註冊"""
+    scheduler, service = _schedule_service()
+    try:
+        wheel = TimingWheel(tick_seconds=1, wheel_size=60)
+        health = DeliveryHealth(service, wheel, _noop, threshold=2, probe_base_seconds=10, max_probes=3)
+        service.update_schedule("G1", "thu", 17, 10, _noop)
+
+        health.record("G1", False, 429)
+        health.record("G1", False, 500)
+        health.record("G1", False, 404)
+        assert "G1" in service.dispatcher.registered_groups()
+        health.record("G1", False, 404)
+        assert "G1" not in service.dispatcher.registered_groups()
+        assert [info["group_id"] for info in health.list_suspended()] == ["G1"]
+        assert service.initialize_jobs(_noop) == 0
+
+        # 探測：重新註冊排程，下一次提醒仍失敗則再暫停並加倍間隔
+        now = datetime.now().timestamp()
+        wheel.advance(now + 11)
+        assert "G1" in service.dispatcher.registered_groups()
+        health.record("G1", False, 403)
+        assert "G1" not in service.dispatcher.registered_groups()
+        assert health.list_suspended()[0]["probes"] == 1
+        assert wheel.advance(now + 15) == 0
+
+        assert health.revive("G1") and not health.revive("G1")
+        assert "G1" in service.dispatcher.registered_groups()
+        assert "suspended" not in service.group_schedules["G1"]
+        assert wheel.get("probe:G1") is None
+        assert health.get_stats()["failures_by_class"] == {"transient": 2, "unreachable": 3}
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_suspended_command_is_scoped_to_calling_group():
+    """@suspended 只顯示與恢復目前的群組，其他群組的暫停狀態不外洩"""
+    from commands.system_command import suspended_command
+
+    scheduler, service = _schedule_service()
+    try:
+        wheel = TimingWheel(tick_seconds=1, wheel_size=60)
+        health = DeliveryHealth(service, wheel, _noop, threshold=1)
+        for group_id in ("G1", "G2"):
+            service.update_schedule(group_id, "thu", 17, 10, _noop)
+        health.record("G2", False, 404)
+
+        context = {"group_id": "G1", "delivery_health": health}
+        reply = suspended_command.execute(None, "@suspended", context)
+        assert "沒有被暫停" in reply and "G2" not in reply
+        assert "只能恢復目前群組" in suspended_command.execute(None, "@suspended revive G2", context)
+        assert [info["group_id"] for info in health.list_suspended()] == ["G2"]
+        assert "只能在群組中" in suspended_command.execute(None, "@suspended", {"delivery_health": health})
+
+        context["group_id"] = "G2"
+        assert "暫停" in suspended_command.execute(None, "@suspended", context)
+        assert "已恢復" in suspended_command.execute(None, "@suspended revive", context)
+        assert health.list_suspended() == []
+        assert "G2" in service.dispatcher.registered_groups()
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def _reference_duty(groups, base_date, schedule, group_id, target_date):
+    """原本逐次計算的負責人規則（對照用）"""
+    group_data = groups[group_id]
+    base_monday = base_date - timedelta(days=base_date.weekday())
+    target_monday = target_date - timedelta(days=target_date.weekday())
+    members = group_data.get(str((target_monday - base_monday).days // 7 % len(group_data) + 1), [])
+    if not members:
+        return None
+    if not schedule or "days" not in schedule:
+        return members[0]
+    days = [d.strip() for d in schedule["days"].split(",")]
+    name = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")[target_date.weekday()]
+    return members[days.index(name) % len(members)] if name in days else None
+
+
+def test_compiled_rotation_matches_reference_and_rebuilds_on_change():
+    """編譯後的輪值表與原本的計算結果相同，只在資料變更時重新編譯"""
+    groups = {
+        "G1": {"1": ["A", "B"], "2": ["C"], "4": ["D"]},
+        "G2": {"1": ["E", "F", "G"]},
+        "G3": {"1": ["H"], "2": []},
+    }
+    schedules = {"G1": {"days": "thu, mon,thu", "hour": 17, "minute": 10}, "G2": {"hour": 9}}
+    base = date(2024, 1, 10)
+    scheduler, service = _schedule_service({"group_schedules": schedules})
+    try:
+        members = MemberService(_MemoryRepository({"groups": groups, "base_date": base}), service)
+        for offset in range(-30, 120):
+            target = base + timedelta(days=offset)
+            for gid in groups:
+                expected = _reference_duty(groups, base, schedules.get(gid), gid, target)
+                assert members.get_current_day_member(gid, target) == expected, (gid, target)
+        assert members.rotation_builds == 3
+
+        members.add_member_to_week(2, "Z", "G1")
+        service.update_schedule("G2", "fri", 9, 0)
+        assert members.get_current_day_member("G1", base + timedelta(days=8)) == "C"
+        assert members.get_current_day_member("G2", date(2024, 1, 12)) == "E"
+        assert members.get_current_day_member("G2", date(2024, 1, 11)) is None
+        assert members.rotation_builds == 5
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_duty_forecast_matches_daily_lookup():
+    """向量運算的值日預測與逐日查詢結果相同"""
+    groups = {
+        "G1": {"1": ["A", "B"], "2": ["C"], "4": ["D"]},
+        "G2": {"1": ["E", "F", "G"]},
+    }
+    schedules = {"G1": {"days": "thu,mon", "hour": 17, "minute": 10}}
+    scheduler, service = _schedule_service({"group_schedules": schedules})
+    try:
+        members = MemberService(_MemoryRepository({"groups": groups, "base_date": date(2024, 1, 10)}), service)
+        start, end = date(2023, 12, 1), date(2024, 3, 31)
+        result = members.forecast_duty(start, end, ["G1", "G2", "missing"])
+
+        assert result.matrix.shape == (3, (end - start).days + 1)
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            for gid in ("G1", "G2"):
+                assert result.member(gid, day) == members.get_current_day_member(gid, day), (gid, day)
+            assert result.member("missing", day) is None
+        assert result.to_dict()["G1"]["2024-01-11"] == "A"
+
+        # 範圍外的日期與群組不會取到其他格子的結果
+        for day in (start - timedelta(days=1), end + timedelta(days=1)):
+            try:
+                result.member("G1", day)
+                assert False, "應該拋出 ValueError"
+            except ValueError:
+                pass
+        try:
+            result.member("G9", start)
+            assert False, "應該拋出 KeyError"
+        except KeyError:
+            pass
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_upcoming_duties_stream_and_cache():
+    """@upcoming 依實際推播時間列出之後的值日，找不到成員時在一個輪值週期內結束"""
+    from commands.members_command import upcoming_command
+
+    groups = {"G1": {"1": ["A", "B"], "2": ["C"], "3": ["A"]}}
+    schedules = {"G1": {"days": "mon,thu", "hour": 17, "minute": 10}}
+    scheduler, service = _schedule_service({"group_schedules": schedules})
+    try:
+        members = MemberService(_MemoryRepository({"groups": groups, "base_date": date(2024, 1, 1)}), service)
+        tz = pytz.timezone('Asia/Taipei')
+        # 2024-01-04 週四 17:10 之後開始
+        now = tz.localize(datetime(2024, 1, 4, 18, 0))
+
+        duties = members.get_upcoming_duties("G1", None, 4, now=now)
+        assert [(t.strftime("%m/%d %H:%M"), m) for t, m in duties] == [
+            ("01/08 17:10", "C"), ("01/11 17:10", "C"), ("01/15 17:10", "A"), ("01/18 17:10", "A"),
+        ]
+        assert [t.strftime("%m/%d") for t, _ in members.get_upcoming_duties("G1", "B", 2, now=now)] == ["01/25", "02/15"]
+        assert members.get_upcoming_duties("G1", None, 4, now=now) is duties
+
+        # 不存在的成員：檢查一個輪值週期（3 週 × 2 個推播日）後結束
+        scanned = []
+        original = CompiledRotation.duty_member
+        with mock.patch.object(CompiledRotation, "duty_member",
+                               lambda self, day: scanned.append(day) or original(self, day)):
+            assert list(members.iter_upcoming_duties("G1", "nobody", now=now)) == []
+        assert len(scanned) == 3 * 2
+
+        members.add_member_to_week(1, "D", "G1")
+        assert members.get_upcoming_duties("G1", None, 4, now=now) is not duties
+
+        context = {"group_id": "G1", "member_service": members, "schedule_service": service}
+        assert "接下來的值日" in upcoming_command.execute(None, "@upcoming A 2", context)
+
+        # 排程暫停中的群組不會推播，不列出值日
+        service.suspend_group("G1", {"probes": 1})
+        assert members.get_upcoming_duties("G1", None, 4, now=now) == []
+        assert "暫停" in upcoming_command.execute(None, "@upcoming", context)
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    test_groups_share_slot_jobs()
+    test_move_and_remove_update_index()
+    test_startup_registration_writes_once()
+    test_fanout_orders_by_schedule_and_tracks_lag()
+    test_late_fire_keeps_scheduled_date()
+    test_send_plan_invalidates_changed_groups()
+    test_catch_up_coalesces_and_bounds_missed_fires()
+    test_file_lease_elects_single_leader_and_fails_over()
+    test_worker_slots_are_unique_and_reused()
+    test_state_sync_applies_follower_changes_on_leader()
+    test_timing_wheel_fires_cancels_and_recovers()
+    test_followup_is_sent_unless_acknowledged()
+    test_leave_tears_down_group_and_sweep_reclaims_orphans()
+    test_sweep_keeps_unregistered_active_groups()
+    test_unreachable_group_is_suspended_probed_and_revived()
+    test_suspended_group_keeps_schedule_info_and_refuses_changes()
+    test_bad_request_only_counts_when_recipient_is_invalid()
+    test_compiled_rotation_matches_reference_and_rebuilds_on_change()
+    test_duty_forecast_matches_daily_lookup()
+    test_upcoming_duties_stream_and_cache()
+    test_suspended_command_is_scoped_to_calling_group()
+    print("✅ 所有排程測試通過")
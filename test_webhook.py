@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Webhook 前處理測試 - 預先過濾
+無需 LINE 或 Firebase 連接
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+
+from handlers.webhook_prefilter import WebhookPrefilter
+from handlers.message_handler import normalize_command
+
+SECRET = "test_secret"
+
+
+def _text_event(text):
+    return {
+        "type": "message", "mode": "active", "timestamp": 1, "webhookEventId": "e",
+        "deliveryContext": {"isRedelivery": False}, "replyToken": "r",
+        "source": {"type": "group", "groupId": "G1", "userId": "U1"},
+        "message": {"type": "text", "id": "1", "text": text, "quoteToken": "q"},
+    }
+
+
+def _sign(body):
+    return base64.b64encode(hmac.new(SECRET.encode(), body.encode(), hashlib.sha256).digest()).decode()
+
+
+def test_prefilter_short_circuits_chatter():
+    """一般聊天不建立模型，指令與中文別名照常分派"""
+    prefilter = WebhookPrefilter(SECRET, normalize_command)
+    body = json.dumps({"destination": "x", "events": [
+        _text_event("早安"), _text_event("  @幫助"), _text_event("@members"),
+        {"type": "message", "message": {"type": "sticker"}},
+    ]})
+
+    events = prefilter.parse(body, _sign(body))
+    assert [e.message.text for e in events] == ["  @幫助", "@members"]
+
+    stats = prefilter.get_stats()
+    assert stats["events"] == 4
+    assert stats["short_circuited_events"] == 2
+    assert stats["skipped_requests"] == 0
+    print("✅ 預先過濾略過非指令事件")
+
+
+def test_prefilter_registers_groups_of_skipped_events():
+    """一般聊天被略過，但來源群組仍會登記；Bot 離開的事件不登記"""
+    seen = []
+    prefilter = WebhookPrefilter(SECRET, normalize_command, on_group_seen=seen.append)
+    chat = _text_event("早安")
+    other = dict(_text_event("hi"), source={"type": "group", "groupId": "G2", "userId": "U2"})
+    user = dict(_text_event("hi"), source={"type": "user", "userId": "U3"})
+    leave = {"type": "leave", "mode": "active", "timestamp": 1, "webhookEventId": "l",
+             "deliveryContext": {"isRedelivery": False}, "source": {"type": "group", "groupId": "G3"}}
+    body = json.dumps({"events": [chat, chat, other, user, leave]})
+
+    events = prefilter.parse(body, _sign(body))
+    assert [e.type for e in events] == ["leave"]
+    assert sorted(seen) == ["G1", "G2"]
+    print("✅ 略過的聊天仍登記群組")
+
+
+def test_prefilter_rejects_bad_signature():
+    """簽章錯誤仍然拒絕"""
+    from linebot.v3.exceptions import InvalidSignatureError
+
+    prefilter = WebhookPrefilter(SECRET, normalize_command)
+    body = json.dumps({"events": [_text_event("hi")]})
+    try:
+        prefilter.parse(body, "bad")
+        assert False, "應該拋出 InvalidSignatureError"
+    except InvalidSignatureError:
+        pass
+    assert prefilter.get_stats()["requests"] == 0
+    print("✅ 簽章錯誤被拒絕")
+
+
+if __name__ == "__main__":
+    test_prefilter_short_circuits_chatter()
+    test_prefilter_registers_groups_of_skipped_events()
+    test_prefilter_rejects_bad_signature()
+    print("✅ 所有 Webhook 測試完成！")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Webhook 事件佇列測試 - 滿載策略、停止與延遲統計
+無需 LINE 或 Firebase 連接
+"""
+
+import threading
+import time
+
+from handlers.webhook_queue import WebhookEventQueue
+
+
+def _blocked_queue(full_policy):
+    """建立容量 1 的佇列，worker 取走第一個事件後卡住直到 gate 打開"""
+    gate = threading.Event()
+    processed = []
+
+    def process(event):
+        gate.wait(2)
+        processed.append(event)
+
+    event_queue = WebhookEventQueue(process, maxsize=1, workers=1, full_policy=full_policy)
+    event_queue.start()
+    event_queue.submit([1])
+    time.sleep(0.05)  # worker 取走 1 並卡在 gate
+    return event_queue, gate, processed
+
+
+def test_queue_drop_newest_when_full():
+    """佇列滿時丟棄新進事件，並統計延遲"""
+    event_queue, gate, processed = _blocked_queue("drop_newest")
+    accepted = event_queue.submit([2, 3])
+    gate.set()
+    event_queue.stop()
+
+    stats = event_queue.get_stats()
+    assert accepted == 1
+    assert processed == [1, 2]
+    assert stats["dropped"] == 1
+    assert stats["process_ms"]["count"] == 2
+    print("✅ drop_newest 策略與延遲統計正確")
+
+
+def test_queue_drop_oldest_when_full():
+    """佇列滿時丟棄最舊的待處理事件"""
+    event_queue, gate, processed = _blocked_queue("drop_oldest")
+    accepted = event_queue.submit([2, 3])
+    gate.set()
+    event_queue.stop()
+
+    assert accepted == 2
+    assert processed == [1, 3]
+    assert event_queue.get_stats()["dropped"] == 1
+    print("✅ drop_oldest 策略正確")
+
+
+def test_queue_inline_when_full():
+    """inline 策略在呼叫端執行緒直接處理"""
+    event_queue, gate, processed = _blocked_queue("inline")
+    gate.set()
+    accepted = event_queue.submit([2, 3])
+    event_queue.stop()
+
+    stats = event_queue.get_stats()
+    assert accepted == 2
+    assert sorted(processed) == [1, 2, 3]
+    assert stats["dropped"] == 0
+    print("✅ inline 策略正確")
+
+
+def test_queue_stop_drains_pending_events():
+    """停止時等待已排入的事件處理完成，失敗的事件只計數"""
+    processed = []
+
+    def process(event):
+        if event == "bad":
+            raise ValueError(event)
+        processed.append(event)
+
+    event_queue = WebhookEventQueue(process, maxsize=10, workers=2)
+    event_queue.start()
+    event_queue.submit(["a", "bad", "b"])
+    event_queue.stop()
+
+    stats = event_queue.get_stats()
+    assert sorted(processed) == ["a", "b"]
+    assert stats["processed"] == 2
+    assert stats["failed"] == 1
+    assert stats["running"] is False
+    print("✅ 停止時處理完剩餘事件")
+
+
+if __name__ == "__main__":
+    test_queue_drop_newest_when_full()
+    test_queue_drop_oldest_when_full()
+    test_queue_inline_when_full()
+    test_queue_stop_drains_pending_events()
+    print("✅ 所有 Webhook 佇列測試完成！")